@@ -31,7 +31,6 @@ from modules.ssh_manager import SSHManager
 from modules.wifi_manager import WifiManager
 # from modules.vision import VisionManager # Lazy load to prevent CV2 segfaults
 from modules.file_manager import FileManager
-from modules.cast_manager import CastManager
 from modules.utils import load_json_data
 from modules.mqtt_manager import MQTTManager
 from modules.ai_engine import AIEngine
@@ -40,9 +39,12 @@ from modules.intent_manager import IntentManager
 from modules.keyword_router import KeywordRouter
 from modules.chat import ChatManager
 from modules.biometrics_manager import BiometricsManager
-from modules.mango_manager import MangoManager # MANGO T5
 from modules.health_manager import HealthManager # Self-Healing
 from modules.bluetooth_manager import BluetoothManager
+from modules.lazy_loader import ServiceRegistry, is_loaded
+from modules.tracing import tracer
+from modules.timeseries import get_store
+from modules.metrics import registry
 import threading
 import time
 
@@ -113,42 +115,53 @@ class NeoCore:
         self.config_manager = ConfigManager()
         self.config = self.config_manager.get_all()
 
+        # --- Arranque perezoso ---
+        # Los gestores pesados (Gemma, MANGO, Chroma, Cast, MQTT...) son proxies que se
+        # cargan al primer uso o en el warm-up en segundo plano, una vez Neo ya escucha.
+        self.services = ServiceRegistry()
+        self.startup_config = self.config.get('startup', {})
+        self.lazy_loading = self.startup_config.get('lazy_loading', True)
+
         self.event_queue = queue.Queue()
         # --- Fix for Distrobox/Jack Segfaults ---
         jack_no_start = self.config.get('audio', {}).get('jack_no_start_server', '1')
         os.environ["JACK_NO_START_SERVER"] = str(jack_no_start)
         # --- Audio Output (Speaker) ---
-        try:
-            self.speaker = Speaker(self.event_queue)
-            self.audio_output_enabled = True
-            self.app_logger.info("✅ Audio Output (Speaker) initialized successfully.")
-        except Exception as e:
-            self.app_logger.error(f"❌ Failed to initialize Speaker: {e}. Using Mock.")
-            self.speaker = type('MockSpeaker', (object,), {'speak': lambda self, t: self.app_logger.info(f"[MOCK SPEAK]: {t}"), 'play_random_filler': lambda self: None, 'is_busy': False})()
-            self.audio_output_enabled = False
+        with self.services.phase('speaker'):
+            try:
+                self.speaker = Speaker(self.event_queue)
+                self.audio_output_enabled = True
+                self.app_logger.info("✅ Audio Output (Speaker) initialized successfully.")
+            except Exception as e:
+                self.app_logger.error(f"❌ Failed to initialize Speaker: {e}. Using Mock.")
+                self.speaker = type('MockSpeaker', (object,), {'speak': lambda self, t, trace_id=None: app_logger.info(f"[MOCK SPEAK]: {t}"), 'play_random_filler': lambda self: None, 'stop': lambda self: None, 'is_busy': False})()
+                self.audio_output_enabled = False
         
         # --- Alias para compatibilidad con Skills ---
         self.skills_config = self.config.get('skills', {})
         
         # --- AI & Core Managers ---
-        model_path = self.config.get('ai_model_path')
-        self.ai_engine = AIEngine(model_path=model_path) 
-        self.intent_manager = IntentManager(self.config_manager)
-        self.keyword_router = KeywordRouter(self)
+        with self.services.phase('core'):
+            model_path = self.config.get('ai_model_path')
+            self.ai_engine = self.services.lazy('ai_engine', lambda: AIEngine(model_path=model_path), priority=10)
+            self.intent_manager = IntentManager(self.config_manager)
+            self.keyword_router = KeywordRouter(self)
         # --- Audio Input (VoiceManager) ---
-        try:
-            self.voice_manager = VoiceManager(
-                self.config_manager, 
-                self.speaker, 
-                self.on_voice_command,
-                update_face
-            )
-            self.audio_input_enabled = True
-            self.app_logger.info("✅ Audio Input (VoiceManager) initialized successfully.")
-        except Exception as e:
-            self.app_logger.error(f"❌ Failed to initialize VoiceManager: {e}. Using Mock.")
-            self.voice_manager = type('MockVoice', (object,), {'start_listening': lambda self, i: None, 'stop_listening': lambda self: None, 'set_processing': lambda self, p: None, 'is_listening': False})()
-            self.audio_input_enabled = False
+        with self.services.phase('voice'):
+            try:
+                self.voice_manager = VoiceManager(
+                    self.config_manager, 
+                    self.speaker, 
+                    self.on_voice_command,
+                    update_face,
+                    on_barge_in=self.on_barge_in
+                )
+                self.audio_input_enabled = True
+                self.app_logger.info("✅ Audio Input (VoiceManager) initialized successfully.")
+            except Exception as e:
+                self.app_logger.error(f"❌ Failed to initialize VoiceManager: {e}. Using Mock.")
+                self.voice_manager = type('MockVoice', (object,), {'start_listening': lambda self, i: None, 'stop_listening': lambda self: None, 'set_processing': lambda self, p: None, 'open_command_window': lambda self, s=None: None, 'is_listening': False})()
+                self.audio_input_enabled = False
         
         # Update Web Admin Status
         if WEB_ADMIN_DISPONIBLE:
@@ -158,13 +171,14 @@ class NeoCore:
             self.web_server = None
             
         self.chat_manager = ChatManager(self.ai_engine)
+        self.services.add(self.chat_manager.knowledge_base, priority=30)
         self.biometrics_manager = BiometricsManager(self.config_manager)
-        self.mango_manager = MangoManager() # Initialize MANGO T5
+        self.mango_manager = self.services.lazy('mango', self._load_mango, priority=20) # MANGO T5 (torch)
         self.health_manager = HealthManager(self.config_manager)
         
-        # Start RAG Ingestion in background
-        self._rag_thread = threading.Thread(target=self.chat_manager.knowledge_base.ingest_docs, daemon=True, name="RAG_Ingest")
-        self._rag_thread.start()
+        # RAG Ingestion (warm-up, después de cargar los modelos)
+        self.services.schedule('rag_ingest', lambda: self.chat_manager.knowledge_base.ingest_docs(), priority=80)
+        self.services.mark('managers')
 
         # --- Legacy Managers ---
         self.calendar_manager = CalendarManager()
@@ -189,8 +203,9 @@ class NeoCore:
             self.vision_manager = None
             self.app_logger.info("VisionManager deshabilitado por configuración (evita Segfaults).")
         self.file_manager = FileManager()
-        self.cast_manager = CastManager()
-        self.cast_manager.start_discovery() # Start looking for TVs/Speakers
+        self.cast_manager = self.services.lazy('cast', self._load_cast_manager)
+        # Discovery is a blocking network scan: warm-up only
+        self.services.schedule('cast_discovery', lambda: self.cast_manager.start_discovery(), priority=70)
         
         # --- AI Engine (Gemma 2B) ---
         # self.ai_engine already initialized above
@@ -215,12 +230,10 @@ class NeoCore:
         self.sherlock = Sherlock(self.event_queue) if Sherlock else None
         
         # --- MQTT (Network Bros) ---
-        self.mqtt_manager = MQTTManager(self.event_queue)
-        self.mqtt_manager.start() # Non-blocking, fails gracefully if no broker
+        self.mqtt_manager = self.services.lazy('mqtt', self._start_mqtt, priority=40)
         
         # --- Bluetooth (Fallback) ---
-        self.bluetooth_manager = BluetoothManager(self.event_queue)
-        self.bluetooth_manager.start() # Non-blocking
+        self.bluetooth_manager = self.services.lazy('bluetooth', self._start_bluetooth, priority=45)
         
         # --- Skills ---
         self.skills_system = SystemSkill(self)
@@ -230,13 +243,16 @@ class NeoCore:
         self.skills_content = ContentSkill(self)
         self.skills_organizer = OrganizerSkill(self)
         self.skills_ssh = SSHSkill(self)
-        self.skills_files = FilesSkill(self)
+        self.skills_files = FilesSkill(self, scan_on_start=False)
+        self.services.schedule('files_index', self.skills_files.run_indexing, priority=90)
         self.skills_docker = DockerSkill(self)
         self.skills_docker = DockerSkill(self)
         self.skills_diagnosis = DiagnosisSkill(self)
         self.skills_finder = FinderSkill(self)
         
         self.vlc_instance, self.player = self.setup_vlc()
+        self.services.mark('skills')
+        self._register_metrics()
         
         # --- Variables de estado ---
         self.consecutive_failures = 0
@@ -277,6 +293,21 @@ class NeoCore:
         except KeyboardInterrupt:
             self.on_closing()
 
+    def _register_metrics(self):
+        """Métricas calculadas al hacer scrape de /metrics (coste cero en el camino caliente)."""
+        registry.gauge('neo_event_queue_depth', 'Pending events in the NeoCore event queue.',
+                       callback=self.event_queue.qsize)
+        registry.gauge('neo_speaker_queue_depth', 'Sentences waiting in the Speaker queue.',
+                       callback=lambda: self.speaker.speak_queue.qsize() if hasattr(self.speaker, 'speak_queue') else None)
+        registry.counter('neo_intent_cache_total', 'IntentManager.find_best_intent cache lookups.', ['result'],
+                         callback=self._intent_cache_stats)
+        registry.gauge('neo_lazy_service_loaded', 'Lazy services: 1 once loaded, 0 while pending or failed.', ['service'],
+                       callback=lambda: {name: int(is_loaded(proxy)) for name, proxy in self.services.proxies.items()})
+
+    def _intent_cache_stats(self):
+        info = type(self.intent_manager).find_best_intent.cache_info()
+        return {'hit': info.hits, 'miss': info.misses}
+
     def _watchdog_check(self):
         """Monitor critical threads and restart them if necessary."""
         # 1. Event Queue Thread
@@ -296,8 +327,18 @@ class NeoCore:
 
     def start_background_tasks(self):
         """Inicia los hilos en segundo plano."""
+        if not self.lazy_loading:
+            # Arranque clásico: todo cargado antes de escuchar
+            with self.services.phase('eager_load'):
+                self.services.warm_up(background=False)
+
         # 1. Escucha de voz
         self.voice_manager.start_listening(self.intent_manager.intents)
+        self.services.mark('listening')
+
+        # 1b. Warm-up priorizado (LLM, MANGO, RAG, MQTT, Cast, índice de ficheros...)
+        if self.lazy_loading:
+            self.services.warm_up(delay=self.startup_config.get('warmup_delay', 2))
         
         # 2. Procesamiento de eventos (hablar, acciones)
         self._thread_events = threading.Thread(target=self.process_event_queue, daemon=True, name="Events_Loop")
@@ -325,7 +366,8 @@ class NeoCore:
 
     def speak(self, text):
         """Pone un mensaje en la cola de eventos para que el Speaker lo diga."""
-        self.event_queue.put({'type': 'speak', 'text': text})
+        # La traza del comando en curso acompaña al mensaje hasta el Speaker
+        self.event_queue.put({'type': 'speak', 'text': text, 'trace_id': tracer.current()})
 
     def log_to_inbox(self, command_text):
         """Log unrecognized command to inbox for future aliasing."""
@@ -363,23 +405,45 @@ class NeoCore:
             app_logger.error(f"Error logging to inbox: {e}")
 
     def setup_vlc(self):
-        """Inicializa la instancia de VLC para reproducción de radio."""
+        """Prepara VLC para la radio. La instancia se crea al primer uso o en el warm-up."""
         if vlc:
-            instance = vlc.Instance()
-            return instance, instance.media_player_new()
+            instance = self.services.lazy('vlc', vlc.Instance, priority=50)
+            player = self.services.lazy('vlc_player', lambda: instance.media_player_new(), priority=51)
+            return instance, player
         return None, None
 
+    # --- Factorías de los servicios perezosos ---
+
+    def _load_mango(self):
+        from modules.mango_manager import MangoManager # Importa torch/transformers
+        return MangoManager()
+
+    def _load_cast_manager(self):
+        from modules.cast_manager import CastManager
+        return CastManager()
+
+    def _start_mqtt(self):
+        manager = MQTTManager(self.event_queue)
+        manager.start() # Non-blocking, fails gracefully if no broker
+        return manager
+
+    def _start_bluetooth(self):
+        manager = BluetoothManager(self.event_queue)
+        manager.start() # Non-blocking
+        return manager
+
     def on_closing(self):
         """Limpieza al cerrar."""
         app_logger.info("Cerrando Neo Core...")
         self.voice_manager.stop_listening()
-        if self.player:
+        # Solo lo que llegó a cargarse (no forzar la carga al cerrar)
+        if is_loaded(self.player):
             self.player.stop()
         if self.vision_manager:
             self.vision_manager.stop()
-        if self.mqtt_manager:
+        if is_loaded(self.mqtt_manager):
             self.mqtt_manager.stop()
-        if self.bluetooth_manager:
+        if is_loaded(self.bluetooth_manager):
             self.bluetooth_manager.stop()
         if self.health_manager:
             self.health_manager.stop()
@@ -394,25 +458,39 @@ class NeoCore:
         is_active_listening = time.time() < self.active_listening_end_time
         
         # Wake Word Check OR Active Listening
-        # FORCE ENABLE: Bypassing strict wake word check to unblock user
-        if True: # is_active_listening or wake_word in command_lower:
-             if update_face: update_face('thinking')
-             self.is_processing_command = True
-             self.voice_manager.set_processing(True)
-             
-             # --- Filler Word (Zero Latency Feel) ---
-             # Play a random "thinking" sound immediately
-             self.speaker.play_random_filler()
-             
-             # Remove wake word from command if present
-             command_clean = command_lower.replace(wake_word, "").strip() if wake_word in command_lower else command_lower
-             
-             # Extend active listening for follow-up
-             self.active_listening_end_time = time.time() + 8
-             
-             self.handle_command(command_clean)
-             
-             self.voice_manager.set_processing(False)
+        # (VoiceManager pasa la wake word del spotter o la detectada en el texto; None si no la hubo)
+        if not (is_active_listening or wake_word):
+            app_logger.info("Comando ignorado: sin wake word y fuera de la ventana de escucha activa.")
+            return
+
+        if update_face: update_face('thinking')
+        self.is_processing_command = True
+        self.voice_manager.set_processing(True)
+        
+        # --- Filler Word (Zero Latency Feel) ---
+        # Play a random "thinking" sound immediately
+        self.speaker.play_random_filler()
+        
+        # Remove wake word from command if present
+        command_clean = command_lower.replace(wake_word, "").strip() if wake_word and wake_word in command_lower else command_lower
+        
+        # Extend active listening for follow-up
+        self.active_listening_end_time = time.time() + 8
+        
+        self.handle_command(command_clean)
+        
+        self.voice_manager.set_processing(False)
+
+    def on_barge_in(self, wake_word):
+        """Callback cuando el usuario interrumpe una respuesta con la wake word."""
+        app_logger.info(f"✋ BARGE-IN ({wake_word}): cortando la respuesta en curso.")
+        if is_loaded(self.ai_engine):
+            self.ai_engine.cancel()
+        self.speaker.stop()
+        self.is_processing_command = False
+        self.active_listening_end_time = time.time() + 8
+        self.voice_manager.open_command_window(8)
+        if update_face: update_face('listening')
 
     def handle_command(self, command_text):
         """Procesa el comando de texto."""
@@ -506,7 +584,8 @@ class NeoCore:
 
                 # --- 1. SKILLS (IntentManager) - PRIORITY 1 ---
                 # Check this FIRST to protect critical systems (System, SSH, Alarms)
-                best_intent = self.intent_manager.find_best_intent(command_text)
+                with tracer.span('intent'):
+                    best_intent = self.intent_manager.find_best_intent(command_text)
                 
                 if best_intent and best_intent.get('confidence') == 'high':
                      app_logger.info(f"SKILL HIGH CONFIDENCE: '{best_intent['name']}' ({best_intent.get('score', 0)}%)")
@@ -565,7 +644,8 @@ class NeoCore:
                 repair_prompt = None
                 
                 # First attempt: Infer from original prompt
-                mango_cmd, mango_conf = self.mango_manager.infer(mango_prompt)
+                with tracer.span('mango'):
+                    mango_cmd, mango_conf = self.mango_manager.infer(mango_prompt)
                 
                 if mango_cmd and mango_conf > 0.85:
                     command_to_run = mango_cmd
@@ -589,16 +669,6 @@ class NeoCore:
                          # Validate flags before even asking for permission or executing
                          is_valid_cmd, val_msg = self.sysadmin_manager.validate_command_flags(command_to_run)
                          
-                         if not is_valid_cmd:
-                             app_logger.warning(f"MANGO Validation Failed: {val_msg}")
-                             # Treat as failure to trigger self-correction
-                             success = False
-                             output = f"Command validation failed: {val_msg}"
-                             # Skip execution, fall through to correction logic
-                         # 0. Flag Validation (RAG for Manuals)
-                         # Validate flags before even asking for permission or executing
-                         is_valid_cmd, val_msg = self.sysadmin_manager.validate_command_flags(command_to_run)
-                         
                          if not is_valid_cmd:
                              app_logger.warning(f"MANGO Validation Failed: {val_msg}")
                              # Treat as failure to trigger self-correction
@@ -655,7 +725,8 @@ class NeoCore:
                                  app_logger.info(f"MANGO Repair Prompt: {repair_prompt}")
                                  
                                  # Ask MANGO to fix
-                                 fixed_cmd, fixed_conf = self.mango_manager.infer(repair_prompt)
+                                 with tracer.span('mango', repair=True):
+                                     fixed_cmd, fixed_conf = self.mango_manager.infer(repair_prompt)
                                  if fixed_cmd:
                                      command_to_run = fixed_cmd
                                      self.speak(f"Detecté un error en el comando. Corrigiendo...")
@@ -669,7 +740,8 @@ class NeoCore:
                                  return
 
                 # --- Keyword Router (Legacy Function Calling) ---
-                router_result = self.keyword_router.process(command_text)
+                with tracer.span('router'):
+                    router_result = self.keyword_router.process(command_text)
                 if router_result:
                     app_logger.info(f"Keyword Router Action Result: {router_result}")
                     # Use Gemma to generate a natural response based on the result
@@ -810,6 +882,8 @@ class NeoCore:
                 stream = self.chat_manager.get_response_stream(command_text, system_context=result_text)
                 buffer = ""
                 for chunk in stream:
+                    if self.ai_engine.is_cancelled:
+                        return
                     buffer += chunk
                     import re
                     parts = re.split(r'([.!?\n])', buffer)
@@ -820,7 +894,7 @@ class NeoCore:
                             if sentence:
                                 self.speak(sentence)
                         buffer = "".join(parts)
-                if buffer.strip():
+                if buffer.strip() and not self.ai_engine.is_cancelled:
                     self.speak(buffer)
             except Exception as e:
                 app_logger.error(f"Error streaming action result: {e}")
@@ -835,6 +909,8 @@ class NeoCore:
             self.consecutive_failures = 0
             
             for chunk in stream:
+                if self.ai_engine.is_cancelled:
+                    return
                 buffer += chunk
                 
                 # Check for sentence delimiters
@@ -859,7 +935,7 @@ class NeoCore:
                     buffer = "".join(parts)
             
             # Speak remaining buffer
-            if buffer.strip():
+            if buffer.strip() and not self.ai_engine.is_cancelled:
                 app_logger.info(f"Stream Final: {buffer}")
                 self.speak(buffer)
                 
@@ -879,12 +955,13 @@ class NeoCore:
                     self.is_processing_command = True
                     if update_face: update_face('speaking')
                     self.last_spoken_text = action['text']
-                    self.speaker.speak(action['text'])
+                    self.speaker.speak(action['text'], trace_id=action.get('trace_id'))
                 elif action_type == 'speaker_status':
                     if action['status'] == 'idle':
                         self.is_processing_command = False
                         # Activar ventana de escucha activa (8 segundos)
                         self.active_listening_end_time = time.time() + 8
+                        self.voice_manager.open_command_window(8)
                         if update_face: update_face('listening') # Mantener cara de escucha
                         app_logger.info("Ventana de escucha activa iniciada (8s).") 
                 
@@ -899,6 +976,9 @@ class NeoCore:
                     # Datos de telemetría -> Actualizar UI (Pop-up)
                     agent = action.get('agent')
                     data = action.get('data')
+                    # Histórico: cada valor numérico como serie agent.<host>.<clave>
+                    if isinstance(data, dict):
+                        get_store().record_many(data, prefix=f"agent.{agent}")
                     # Solo mostramos pop-up si es un mensaje de "estado" o cada X tiempo
                     # Para cumplir el requisito de "aviso pop up deslizante avisando de la conexion",
                     # podemos asumir que si recibimos telemetría, está conectado.
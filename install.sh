@@ -373,6 +373,12 @@ if [ -f "database/brain.db" ]; then
 else
     echo "ADVERTENCIA: No se pudo verificar database/brain.db"
 fi
+
+# Índice de flags de comandos (validación de comandos Mango sin lanzar --help)
+if [ -f "resources/tools/build_flag_index.py" ]; then
+    echo "Indexando flags de las herramientas de sistema..."
+    $VENV_DIR/bin/python resources/tools/build_flag_index.py > /dev/null || echo "ADVERTENCIA: No se pudo generar data/flag_index.json (se generará bajo demanda)"
+fi
 echo ""
 
 # --- 4. DESCARGA Y CONFIGURACIÓN DEL MODELO DE VOZ (VOSK) ---
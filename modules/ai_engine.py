@@ -1,6 +1,13 @@
 import logging
 import os
+import threading
+import time
 from modules.logger import app_logger
+from modules.tracing import tracer
+from modules.metrics import registry
+
+LLM_TOKENS = registry.counter('neo_llm_tokens_total', 'Tokens generated by the LLM.', ['mode'])
+LLM_REQUESTS = registry.counter('neo_llm_requests_total', 'LLM generations by outcome.', ['mode', 'outcome'])
 
 try:
     from llama_cpp import Llama
@@ -29,6 +36,7 @@ class AIEngine:
 
         self.llm = None
         self.is_ready = False
+        self.cancel_event = threading.Event() # Barge-in: corta el stream en curso
         
         if LLAMA_AVAILABLE:
             self.load_model()
@@ -72,25 +80,30 @@ class AIEngine:
             return "Lo siento, mi cerebro de IA no está disponible en este momento."
 
         try:
-            # Usamos raw completion
-            output = self.llm(
-                prompt,
-                max_tokens=max_tokens,
-                stop=["<end_of_turn>"], # Gemma 2 stop token
-                echo=False,
-                temperature=0.7,
-                top_p=0.9,
-                repeat_penalty=1.1
-            )
+            # Usamos raw completion (prompt-eval + generación en un solo span)
+            with tracer.span('llm_generate', blocking=True):
+                output = self.llm(
+                    prompt,
+                    max_tokens=max_tokens,
+                    stop=["<end_of_turn>"], # Gemma 2 stop token
+                    echo=False,
+                    temperature=0.7,
+                    top_p=0.9,
+                    repeat_penalty=1.1
+                )
             
             response = output['choices'][0]['text'].strip()
+            LLM_TOKENS.inc(output.get('usage', {}).get('completion_tokens', 0), mode='blocking')
+            LLM_REQUESTS.inc(mode='blocking', outcome='ok')
             return response
         except Exception as e:
+            LLM_REQUESTS.inc(mode='blocking', outcome='error')
             app_logger.error(f"Error generando respuesta: {e}")
             return "Tuve un error al pensar la respuesta."
 
     def generate_response_stream(self, prompt, max_tokens=150):
         """Genera una respuesta en streaming (yields chunks)."""
+        self.cancel_event.clear()
         if not self.is_ready:
             yield "Lo siento, mi cerebro de IA no está disponible."
             return
@@ -107,13 +120,40 @@ class AIEngine:
                 stream=True
             )
             
-            for output in stream:
-                chunk = output['choices'][0]['text']
-                yield chunk
+            # Latencia: prompt-eval (hasta el primer token) y generación
+            start = time.perf_counter()
+            first_token = None
+            tokens = 0
+            try:
+                for output in stream:
+                    if self.cancel_event.is_set():
+                        app_logger.info("Generación cancelada (barge-in).")
+                        break
+                    if first_token is None:
+                        first_token = time.perf_counter()
+                        tracer.record('llm_prompt_eval', first_token - start, prompt_chars=len(prompt))
+                    tokens += 1
+                    chunk = output['choices'][0]['text']
+                    yield chunk
+            finally:
+                if first_token is not None:
+                    tracer.record('llm_generate', time.perf_counter() - first_token, tokens=tokens,
+                                  cancelled=self.cancel_event.is_set())
+                LLM_TOKENS.inc(tokens, mode='stream')
+            LLM_REQUESTS.inc(mode='stream', outcome='cancelled' if self.cancel_event.is_set() else 'ok')
 
         except Exception as e:
+            LLM_REQUESTS.inc(mode='stream', outcome='error')
             app_logger.error(f"Error generando stream: {e}")
             yield " Error."
 
+    def cancel(self):
+        """Cancela la generación en streaming en curso."""
+        self.cancel_event.set()
+
+    @property
+    def is_cancelled(self):
+        return self.cancel_event.is_set()
+
 # Alias for backward compatibility if needed, but we will update imports
 GemmaEngine = AIEngine
@@ -0,0 +1,239 @@
+import threading
+import time
+import numpy as np
+from modules.utils import no_alsa_error
+from modules.logger import vosk_logger
+
+try:
+    import pyaudio
+    PYAUDIO_DISPONIBLE = True
+except ImportError:
+    pyaudio = None
+    PYAUDIO_DISPONIBLE = False
+
+try:
+    import webrtcvad
+    WEBRTCVAD_DISPONIBLE = True
+except ImportError:
+    webrtcvad = None
+    WEBRTCVAD_DISPONIBLE = False
+
+# Eventos devueltos por VoiceActivityDetector.process()
+VAD_SPEECH_START = 'start'
+VAD_SPEECH = 'speech'
+VAD_SPEECH_END = 'end'
+
+
+class AudioRingBuffer:
+    """
+    Buffer circular preasignado de muestras int16.
+    Las posiciones son absolutas (muestras escritas desde el inicio), así varios
+    consumidores pueden leer a su ritmo sin copiar el audio a listas de Python.
+    """
+    def __init__(self, capacity_samples):
+        self.capacity = int(capacity_samples)
+        self._buffer = np.zeros(self.capacity, dtype=np.int16)
+        self._position = 0
+        self._cond = threading.Condition()
+
+    @property
+    def position(self):
+        return self._position
+
+    def write(self, samples):
+        """Escribe un bloque de muestras y despierta a los consumidores."""
+        n = len(samples)
+        if n == 0:
+            return
+        if n > self.capacity:
+            samples = samples[-self.capacity:]
+            n = self.capacity
+
+        with self._cond:
+            start = self._position % self.capacity
+            first = min(n, self.capacity - start)
+            self._buffer[start:start + first] = samples[:first]
+            if first < n:
+                self._buffer[:n - first] = samples[first:]
+            self._position += n
+            self._cond.notify_all()
+
+    def read(self, start, count):
+        """
+        Devuelve una copia de [start, start + count).
+        Si parte del rango ya fue sobrescrito, se recorta al audio disponible.
+        """
+        with self._cond:
+            end = min(start + count, self._position)
+            start = max(start, self._position - self.capacity, 0)
+            if end <= start:
+                return np.zeros(0, dtype=np.int16)
+
+            i = start % self.capacity
+            j = end % self.capacity
+            if i < j:
+                return self._buffer[i:j].copy()
+            return np.concatenate((self._buffer[i:], self._buffer[:j]))
+
+    def wait_for(self, position, timeout=None):
+        """Bloquea hasta que se hayan escrito `position` muestras (sin sleep-polling)."""
+        with self._cond:
+            return self._cond.wait_for(lambda: self._position >= position, timeout)
+
+
+class VoiceActivityDetector:
+    """
+    VAD por tramas con histéresis.
+    Usa WebRTC VAD si está instalado; si no, energía RMS vectorizada con un
+    suelo de ruido adaptativo. El fin de frase se decide por `silence_ms`
+    en lugar de un número fijo de bloques.
+    """
+    def __init__(self, rate=16000, frame_ms=30, threshold=500, aggressiveness=2,
+                 min_speech_ms=90, silence_ms=600, noise_ratio=3.0):
+        self.rate = rate
+        self.frame_ms = frame_ms
+        self.frame_samples = int(rate * frame_ms / 1000)
+        self.threshold = threshold
+        self.noise_ratio = noise_ratio
+        self.noise_floor = threshold / noise_ratio
+
+        self.min_speech_frames = max(1, int(min_speech_ms / frame_ms))
+        self.silence_frames_limit = max(1, int(silence_ms / frame_ms))
+
+        self.webrtc = None
+        if WEBRTCVAD_DISPONIBLE and frame_ms in (10, 20, 30):
+            try:
+                self.webrtc = webrtcvad.Vad(int(aggressiveness))
+            except Exception as e:
+                vosk_logger.warning(f"WebRTC VAD no disponible, usando energía: {e}")
+
+        self.reset()
+
+    def reset(self):
+        self.in_speech = False
+        self._speech_run = 0
+        self._silence_run = 0
+
+    @staticmethod
+    def rms(frame):
+        samples = frame.astype(np.float32)
+        return float(np.sqrt(np.dot(samples, samples) / max(len(samples), 1)))
+
+    def is_speech(self, frame):
+        level = self.rms(frame)
+        dynamic_threshold = max(self.threshold, self.noise_floor * self.noise_ratio)
+        voiced = level > dynamic_threshold
+
+        if self.webrtc is not None and len(frame) == self.frame_samples:
+            try:
+                voiced = self.webrtc.is_speech(frame.tobytes(), self.rate) and level > self.noise_floor
+            except Exception:
+                pass
+
+        if not voiced and not self.in_speech:
+            # Adaptar el suelo de ruido sólo con tramas de silencio
+            self.noise_floor = 0.95 * self.noise_floor + 0.05 * level
+        return voiced
+
+    def process(self, frame):
+        """Procesa una trama y devuelve VAD_SPEECH_START, VAD_SPEECH, VAD_SPEECH_END o None."""
+        voiced = self.is_speech(frame)
+
+        if not self.in_speech:
+            self._speech_run = self._speech_run + 1 if voiced else 0
+            if self._speech_run >= self.min_speech_frames:
+                self.in_speech = True
+                self._silence_run = 0
+                return VAD_SPEECH_START
+            return None
+
+        if voiced:
+            self._silence_run = 0
+        else:
+            self._silence_run += 1
+            if self._silence_run >= self.silence_frames_limit:
+                self.reset()
+                return VAD_SPEECH_END
+        return VAD_SPEECH
+
+
+class EchoGate:
+    """
+    Supresión de eco simple por energía (barge-in).
+    Compara la energía del micrófono con el nivel de la salida del Speaker
+    (referencia) y estima el acoplamiento altavoz->micrófono con una media
+    móvil sobre las tramas consideradas eco. Sólo pasa la voz que supera
+    claramente el eco esperado.
+    """
+    def __init__(self, min_level=500, margin=2.0, adapt=0.05):
+        self.min_level = min_level
+        self.margin = margin
+        self.adapt = adapt
+        self.coupling = 1.0
+
+    def is_echo(self, mic_level, ref_level):
+        if ref_level <= 0:
+            return mic_level < self.min_level
+
+        expected = self.coupling * ref_level
+        if mic_level < max(self.min_level, expected * self.margin):
+            self.coupling += self.adapt * (mic_level / ref_level - self.coupling)
+            return True
+        return False
+
+
+class AudioCapture:
+    """
+    Hilo de captura PyAudio que escribe en un AudioRingBuffer.
+    El hilo queda bloqueado en stream.read(); los consumidores esperan al buffer.
+    """
+    def __init__(self, rate=16000, frame_samples=480, device_index=None, buffer_seconds=10):
+        self.rate = rate
+        self.frame_samples = frame_samples
+        self.device_index = device_index
+        self.ring = AudioRingBuffer(rate * buffer_seconds)
+        self.running = False
+        self.thread = None
+        self._pa = None
+        self._stream = None
+
+    def start(self):
+        if not PYAUDIO_DISPONIBLE:
+            raise RuntimeError("PyAudio no está instalado.")
+        if self.running:
+            return
+
+        with no_alsa_error():
+            self._pa = pyaudio.PyAudio()
+            self._stream = self._pa.open(format=pyaudio.paInt16, channels=1, rate=self.rate, input=True,
+                                         frames_per_buffer=self.frame_samples,
+                                         input_device_index=self.device_index)
+            self._stream.start_stream()
+
+        self.running = True
+        self.thread = threading.Thread(target=self._capture_loop, daemon=True, name="Audio_Capture")
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread:
+            self.thread.join(timeout=2)
+        try:
+            if self._stream:
+                self._stream.stop_stream()
+                self._stream.close()
+            if self._pa:
+                self._pa.terminate()
+        except Exception as e:
+            vosk_logger.error(f"Error cerrando captura de audio: {e}")
+        self._stream = None
+        self._pa = None
+
+    def _capture_loop(self):
+        while self.running:
+            try:
+                data = self._stream.read(self.frame_samples, exception_on_overflow=False)
+                self.ring.write(np.frombuffer(data, dtype=np.int16))
+            except Exception as e:
+                vosk_logger.error(f"Error leyendo audio del micrófono: {e}")
+                time.sleep(0.5)
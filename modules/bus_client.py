@@ -1,28 +1,80 @@
-import socketio
 import logging
 import json
 import threading
 import time
+import uuid
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from modules.config_manager import ConfigManager
+from modules.bus_routing import is_wildcard, topic_matches
+from modules.ipc_bus import IPCTransport, DEFAULT_SOCKET_PATH
+from modules.metrics import registry
+
+DEFAULT_BUS_PORT = 8181 # MessageBus (Socket.IO transport)
+
+try:
+    import socketio
+    SOCKETIO_AVAILABLE = True
+except ImportError:
+    socketio = None
+    SOCKETIO_AVAILABLE = False
 
 logger = logging.getLogger("BusClient")
 
+# Request latency histogram buckets (ms, upper bounds)
+LATENCY_BUCKETS = [1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000]
+
+BUS_MESSAGES = registry.counter('neo_bus_messages_total', 'Bus messages sent/received by this process.', ['client', 'direction', 'topic'])
+BUS_EMIT_FAILURES = registry.counter('neo_bus_emit_failures_total', 'Bus messages that could not be sent.', ['client', 'topic'])
+
 class BusClient:
-    def __init__(self, host='localhost', port=5000, name="UnknownClient"):
-        self.sio = socketio.Client()
+    def __init__(self, host='localhost', port=None, name="UnknownClient", transport=None, socket_path=None):
+        bus_config = ConfigManager().get('bus', {})
         self.host = host
-        self.port = port
+        # Same port the bus listens on (bus.port): the old fixed 5000 is web_admin's Socket.IO, not the bus
+        self.port = port or bus_config.get('port', DEFAULT_BUS_PORT)
         self.name = name
         self.handlers = {} # Map event_type -> [callbacks]
         self.connected = False
+        self.closed = False
+        self._ready_info = None
 
-        self._setup_events()
+        # Request/response: correlation_id -> pending entry
+        self.reply_topic = f"{self.name}.response"
+        self.max_inflight = bus_config.get('max_inflight', 8)
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+        self._inflight = {} # topic -> BoundedSemaphore (backpressure per topic)
+        self._request_stats = {}
+        self._executor = None
+        self.handlers[self.reply_topic] = [self._on_response]
+
+        # Transport: 'socketio' (default, Flask-SocketIO bus) or 'ipc' (Unix socket + msgpack)
+        self.transport = transport or bus_config.get('transport', 'socketio')
+        self.sio = None
+        self.ipc = None
+        if self.transport == 'ipc':
+            # Handlers run in a small pool (like Socket.IO's async handlers) so a callback
+            # doing request() doesn't block the reader that has to deliver its reply
+            self._executor = ThreadPoolExecutor(max_workers=bus_config.get('ipc_workers', 4),
+                                                thread_name_prefix=f"Bus_{name}")
+            self.ipc = IPCTransport(socket_path or bus_config.get('socket_path', DEFAULT_SOCKET_PATH), name,
+                                    self._dispatch_async, on_connect=self._on_ipc_connect,
+                                    on_disconnect=self._on_ipc_disconnect)
+        else:
+            self.sio = socketio.Client()
+            self._setup_events()
 
     def _setup_events(self):
         @self.sio.event
         def connect():
             self.connected = True
             logger.info(f"[{self.name}] Connected to Message Bus")
+            # Declare our topics so the bus only routes what we handle
+            self.sio.emit('subscribe', {'topics': list(self.handlers), 'name': self.name})
             self.emit(f"{self.name}.connected", {})
+            self._emit_ready()
 
         @self.sio.event
         def disconnect():
@@ -34,25 +86,58 @@ class BusClient:
             """
             Handle incoming messages from the bus.
             """
-            msg_type = data.get('type')
-            msg_data = data.get('data', {})
-            
-            # logger.debug(f"[{self.name}] Received: {msg_type}")
-            
-            if msg_type in self.handlers:
-                for callback in self.handlers[msg_type]:
-                    try:
-                        callback(data)
-                    except Exception as e:
-                        logger.error(f"Error in callback for {msg_type}: {e}")
+            self._dispatch(data)
+
+    def _on_ipc_connect(self):
+        self.connected = True
+        logger.info(f"[{self.name}] Connected to IPC Bus")
+        # Server-side filtering: only the topics we handle are delivered
+        self.ipc.subscribe(list(self.handlers))
+        self.emit(f"{self.name}.connected", {})
+        self._emit_ready()
+
+    def _on_ipc_disconnect(self):
+        self.connected = False
+        logger.info(f"[{self.name}] Disconnected from IPC Bus")
+
+    def _dispatch_async(self, data):
+        if data.get('type') == self.reply_topic:
+            self._on_response(data)
+        else:
+            self._executor.submit(self._dispatch, data)
+
+    def _dispatch(self, data):
+        msg_type = data.get('type')
+        BUS_MESSAGES.inc(client=self.name, direction='in', topic=msg_type)
+
+        callbacks = list(self.handlers.get(msg_type, ()))
+        for pattern, handlers in list(self.handlers.items()):
+            if is_wildcard(pattern) and topic_matches(pattern, msg_type):
+                callbacks.extend(handlers)
+
+        for callback in callbacks:
+            try:
+                callback(data)
+            except Exception as e:
+                logger.error(f"Error in callback for {msg_type}: {e}")
 
     def on(self, event_type, callback):
-        """Register a callback for a specific event type."""
-        if event_type not in self.handlers:
+        """Register a callback for a specific event type (wildcards like 'recognizer_loop:*' allowed)."""
+        is_new = event_type not in self.handlers
+        if is_new:
             self.handlers[event_type] = []
         self.handlers[event_type].append(callback)
 
-    def emit(self, event_type, data=None):
+        if is_new and self.connected:
+            try:
+                if self.ipc:
+                    self.ipc.subscribe([event_type])
+                else:
+                    self.sio.emit('subscribe', {'topics': [event_type], 'name': self.name})
+            except Exception as e:
+                logger.error(f"Failed to subscribe to {event_type}: {e}")
+
+    def emit(self, event_type, data=None, context=None):
         """Send a message to the bus."""
         if data is None:
             data = {}
@@ -60,24 +145,144 @@ class BusClient:
         payload = {
             "type": event_type,
             "data": data,
-            "context": {"source": self.name}
+            "context": dict(context or {}, source=self.name)
         }
         
         if self.connected:
             try:
-                self.sio.emit('message', payload)
+                if self.ipc:
+                    self.ipc.publish(event_type, payload)
+                else:
+                    self.sio.emit('message', payload)
+                BUS_MESSAGES.inc(client=self.name, direction='out', topic=event_type)
             except Exception as e:
+                BUS_EMIT_FAILURES.inc(client=self.name, topic=event_type)
                 logger.error(f"Failed to emit {event_type}: {e}")
         else:
+            BUS_EMIT_FAILURES.inc(client=self.name, topic=event_type)
             logger.warning(f"Cannot emit {event_type}: Not connected")
 
+    def mark_ready(self, info=None):
+        """
+        Announce '{name}.ready' (models loaded, handlers registered) for the supervisor.
+        Re-sent after every reconnection.
+        """
+        self._ready_info = dict(info or {}, pid=os.getpid())
+        self._emit_ready()
+
+    def _emit_ready(self):
+        if self._ready_info is not None and self.connected:
+            self.emit(f"{self.name}.ready", self._ready_info)
+
+    # --- Request / Response ---
+
+    def request(self, topic, data=None, timeout=2.0):
+        """
+        Send `topic` and wait for the matching reply (correlation id).
+        Returns the reply's data dict, or None on timeout / not connected / too many in-flight calls.
+        """
+        if not self.connected:
+            return None
+
+        gate = self._inflight.setdefault(topic, threading.BoundedSemaphore(self.max_inflight))
+        start = time.perf_counter()
+        # Backpressure: a slow responder makes callers wait (within their timeout) instead of piling up
+        if not gate.acquire(timeout=timeout):
+            self._record_request(topic, None, 'rejected')
+            logger.warning(f"[{self.name}] Request {topic} rejected: {self.max_inflight} calls already in flight")
+            return None
+
+        correlation_id = uuid.uuid4().hex
+        entry = {'event': threading.Event(), 'response': None}
+        with self._pending_lock:
+            self._pending[correlation_id] = entry
+        try:
+            self.emit(topic, data, context={'correlation_id': correlation_id, 'reply_to': self.reply_topic})
+            remaining = timeout - (time.perf_counter() - start)
+            if entry['event'].wait(max(remaining, 0)):
+                self._record_request(topic, time.perf_counter() - start, 'ok')
+                return entry['response'].get('data', {})
+            self._record_request(topic, None, 'timeout')
+            logger.warning(f"[{self.name}] Request {topic} timed out after {timeout}s")
+            return None
+        finally:
+            with self._pending_lock:
+                self._pending.pop(correlation_id, None)
+            gate.release()
+
+    def _on_response(self, message):
+        correlation_id = message.get('context', {}).get('correlation_id')
+        with self._pending_lock:
+            entry = self._pending.get(correlation_id)
+        if entry:
+            entry['response'] = message
+            entry['event'].set()
+
+    def reply(self, request_message, data=None):
+        """Answer a request received through on()/on_request()."""
+        context = request_message.get('context', {})
+        reply_to = context.get('reply_to')
+        if reply_to:
+            self.emit(reply_to, data, context={'correlation_id': context.get('correlation_id')})
+
+    def on_request(self, topic, handler):
+        """Register a responder: the handler's return value is sent back as the reply."""
+        def responder(message):
+            result = handler(message)
+            self.reply(message, result if result is not None else {})
+        self.on(topic, responder)
+
+    def _record_request(self, topic, elapsed, outcome):
+        with self._pending_lock:
+            stats = self._request_stats.get(topic)
+            if stats is None:
+                stats = self._request_stats[topic] = {
+                    'ok': 0, 'timeout': 0, 'rejected': 0,
+                    'buckets': [0] * (len(LATENCY_BUCKETS) + 1)
+                }
+            stats[outcome] += 1
+            if elapsed is not None:
+                ms = elapsed * 1000
+                index = next((i for i, b in enumerate(LATENCY_BUCKETS) if ms <= b), len(LATENCY_BUCKETS))
+                stats['buckets'][index] += 1
+
+    def request_stats(self):
+        """Per-topic outcome counters and latency histogram ({'<=N ms': count})."""
+        labels = [f"<={b}ms" for b in LATENCY_BUCKETS] + [f">{LATENCY_BUCKETS[-1]}ms"]
+        with self._pending_lock:
+            return {
+                topic: {
+                    'ok': s['ok'], 'timeout': s['timeout'], 'rejected': s['rejected'],
+                    'histogram': {label: n for label, n in zip(labels, s['buckets']) if n}
+                }
+                for topic, s in self._request_stats.items()
+            }
+
     def run_forever(self):
         """Connect and keep running (blocking)."""
         self.connect()
+        if self.ipc:
+            # IPC has no built-in reconnection: wait for the reader and reconnect
+            while True:
+                self.ipc.wait()
+                if self.closed:
+                    return
+                logger.warning(f"[{self.name}] IPC bus connection lost. Reconnecting...")
+                self.connect()
         self.sio.wait()
 
     def connect(self):
         """Connect to the bus with retry logic."""
+        if self.ipc:
+            while not self.connected and not self.closed:
+                try:
+                    self.ipc.connect()
+                    break
+                except OSError as e:
+                    logger.error(f"Connection failed ({self.ipc.path}): {e}. Retrying in 5s...")
+                    time.sleep(5)
+            return
+
         url = f"http://{self.host}:{self.port}"
         
         while not self.connected:
@@ -92,7 +297,11 @@ class BusClient:
                 time.sleep(5)
 
     def close(self):
-        self.sio.disconnect()
+        self.closed = True
+        if self.ipc:
+            self.ipc.close()
+        else:
+            self.sio.disconnect()
 
 if __name__ == "__main__":
     # Test Client
@@ -0,0 +1,140 @@
+import threading
+import time
+from fnmatch import fnmatchcase
+
+
+def is_wildcard(topic):
+    return any(c in topic for c in '*?[')
+
+
+def topic_matches(pattern, topic):
+    """Exact match, or glob match for wildcard patterns such as 'recognizer_loop:*'."""
+    if not is_wildcard(pattern):
+        return pattern == topic
+    return fnmatchcase(topic, pattern)
+
+
+def broker_reply(request, data, source, default_topic):
+    """
+    (topic, message) answering a request sent to the broker itself. Follows the
+    BusClient.request() convention: sent to context.reply_to with the request's
+    correlation_id. Requests without reply_to get `default_topic` (legacy).
+    """
+    context = (request or {}).get('context') or {}
+    topic = context.get('reply_to') or default_topic
+    reply_context = {'source': source}
+    if context.get('correlation_id'):
+        reply_context['correlation_id'] = context['correlation_id']
+    return topic, {'type': topic, 'data': data, 'context': reply_context}
+
+
+class SubscriptionRegistry:
+    """
+    Topic -> subscriber routing table shared by the bus brokers.
+
+    Exact topics live in a dict; wildcard patterns are kept per subscriber and
+    resolved once per topic, with the result cached until subscriptions change.
+    """
+    def __init__(self):
+        self._exact = {}      # topic -> set(subscriber)
+        self._wildcards = {}  # subscriber -> set(pattern)
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, subscriber, topics):
+        with self._lock:
+            for topic in topics:
+                if is_wildcard(topic):
+                    self._wildcards.setdefault(subscriber, set()).add(topic)
+                else:
+                    self._exact.setdefault(topic, set()).add(subscriber)
+            self._cache.clear()
+
+    def unsubscribe(self, subscriber, topics=None):
+        """Remove some topics of a subscriber, or all of them when topics is None."""
+        with self._lock:
+            if topics is None:
+                for subscribers in self._exact.values():
+                    subscribers.discard(subscriber)
+                self._exact = {t: s for t, s in self._exact.items() if s}
+                self._wildcards.pop(subscriber, None)
+            else:
+                for topic in topics:
+                    if is_wildcard(topic):
+                        self._wildcards.get(subscriber, set()).discard(topic)
+                    elif topic in self._exact:
+                        self._exact[topic].discard(subscriber)
+                        if not self._exact[topic]:
+                            del self._exact[topic]
+            self._cache.clear()
+
+    def match(self, topic):
+        """Set of subscribers interested in `topic`."""
+        with self._lock:
+            cached = self._cache.get(topic)
+            if cached is not None:
+                return cached
+
+            result = set(self._exact.get(topic, ()))
+            for subscriber, patterns in self._wildcards.items():
+                if any(fnmatchcase(topic, p) for p in patterns):
+                    result.add(subscriber)
+
+            result = frozenset(result)
+            if len(self._cache) > 4096:
+                self._cache.clear()
+            self._cache[topic] = result
+            return result
+
+    def subscriptions(self, subscriber):
+        with self._lock:
+            topics = {t for t, s in self._exact.items() if subscriber in s}
+            return sorted(topics | self._wildcards.get(subscriber, set()))
+
+    def has_subscriber(self, subscriber):
+        with self._lock:
+            return subscriber in self._wildcards or any(subscriber in s for s in self._exact.values())
+
+
+class TopicStats:
+    """Per-topic message and byte counters for bus monitoring."""
+    def __init__(self):
+        self.started = time.time()
+        self._topics = {}
+        self._lock = threading.Lock()
+
+    def record(self, topic, nbytes=0, delivered=0):
+        with self._lock:
+            entry = self._topics.get(topic)
+            if entry is None:
+                entry = self._topics[topic] = {'messages': 0, 'bytes': 0, 'delivered': 0, 'dropped': 0}
+            entry['messages'] += 1
+            entry['bytes'] += nbytes
+            entry['delivered'] += delivered
+            if not delivered:
+                entry['dropped'] += 1
+
+    def snapshot(self):
+        with self._lock:
+            topics = {t: dict(v) for t, v in self._topics.items()}
+        uptime = max(time.time() - self.started, 1e-6)
+        return {
+            'uptime': round(uptime, 1),
+            'messages': sum(v['messages'] for v in topics.values()),
+            'bytes': sum(v['bytes'] for v in topics.values()),
+            'topics': topics,
+            'rate': {t: round(v['messages'] / uptime, 3) for t, v in topics.items()}
+        }
+
+
+def estimate_size(obj):
+    """Cheap payload size estimate (bytes/str lengths) without re-serializing."""
+    if isinstance(obj, (bytes, bytearray, memoryview)):
+        return len(obj)
+    if isinstance(obj, str):
+        return len(obj)
+    if isinstance(obj, dict):
+        return sum(len(str(k)) + estimate_size(v) for k, v in obj.items())
+    if isinstance(obj, (list, tuple)):
+        return sum(estimate_size(v) for v in obj)
+    return 8
@@ -1,14 +1,20 @@
 import logging
 from modules.logger import app_logger
-from modules.knowledge_base import KnowledgeBase
 from modules.sentiment import SentimentManager
+from modules.lazy_loader import LazyProxy
+from modules.tracing import tracer
+
+def _create_knowledge_base():
+    # chromadb + SentenceTransformer: only imported when RAG is first used
+    from modules.knowledge_base import KnowledgeBase
+    return KnowledgeBase()
 
 class ChatManager:
     def __init__(self, ai_engine):
         self.ai_engine = ai_engine
         self.context_history = []
         self.brain = None # Injected later
-        self.knowledge_base = KnowledgeBase() # Initialize RAG
+        self.knowledge_base = LazyProxy('knowledge_base', _create_knowledge_base) # RAG (lazy)
         self.sentiment_manager = SentimentManager()
         
         # System Prompt Base
@@ -48,7 +54,8 @@ class ChatManager:
         # 1. Retrieve RAG Context
         rag_context = ""
         try:
-            docs = self.knowledge_base.query(user_input)
+            with tracer.span('rag'):
+                docs = self.knowledge_base.query(user_input) if self.knowledge_base else None
             if docs:
                 rag_context = "\nCONTEXTO TÉCNICO (Documentación):\n" + "\n---\n".join(docs) + "\n"
         except Exception as e:
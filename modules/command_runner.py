@@ -0,0 +1,369 @@
+"""
+Streaming shell command runner for the web terminal and SysAdminManager.
+
+Each command runs in its own process group with stdout/stderr read in chunks
+as they arrive and handed to a callback (Socket.IO in web_admin), so long
+commands (apt upgrade, journalctl) show progress and can be cancelled.
+Output is kept in memory up to a limit and then spilled to a temp file;
+pages of it are read back with CommandRunner.read(). A job whose output
+exceeds `max_output` is stopped (`yes` would otherwise fill the disk).
+Commands get no stdin: anything that prompts (apt upgrade's Y/n) reads EOF
+and aborts, so it has to be run non-interactively (apt upgrade -y). Concurrency is limited
+per session and globally. Threads, not asyncio: web_admin runs Socket.IO in
+threading mode.
+"""
+import os
+import time
+import uuid
+import codecs
+import signal
+import logging
+import tempfile
+import threading
+import subprocess
+
+from modules.metrics import registry
+
+logger = logging.getLogger("CommandRunner")
+
+JOBS = registry.counter('neo_command_jobs_total', 'Shell commands run by the command runner.', ['result'])
+
+CHUNK_SIZE = 64 * 1024
+KILL_GRACE = 3 # seconds between SIGTERM and SIGKILL
+
+
+def _utf8_boundary(data, end):
+    """Largest cut <= end that does not split a UTF-8 sequence."""
+    for _ in range(3):
+        if 0 < end < len(data) and (data[end] & 0xC0) == 0x80:
+            end -= 1
+    return end
+
+
+class OutputBuffer:
+    """
+    Combined output of a job: in memory up to `max_memory` bytes, then in a temp file.
+    Nothing is stored past `max_size` bytes (None: no limit).
+    """
+    def __init__(self, max_memory=256 * 1024, spill_dir=None, max_size=None):
+        self.max_memory = max_memory
+        self.spill_dir = spill_dir
+        self.max_size = max_size
+        self.full = False
+        self.memory = bytearray()
+        self.file = None
+        self.path = None
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def write(self, data):
+        """Store `data`; False once `max_size` is reached (the excess is dropped)."""
+        with self.lock:
+            if self.max_size is not None and self.size + len(data) > self.max_size:
+                data = data[:max(0, self.max_size - self.size)]
+                self.full = True
+            if self.file is None and len(self.memory) + len(data) > self.max_memory:
+                fd, self.path = tempfile.mkstemp(prefix="neo_cmd_", suffix=".log", dir=self.spill_dir)
+                self.file = os.fdopen(fd, 'w+b')
+                self.file.write(self.memory)
+                self.memory = bytearray()
+            if self.file is not None:
+                self.file.seek(0, os.SEEK_END)
+                self.file.write(data)
+            else:
+                self.memory.extend(data)
+            self.size += len(data)
+            return not self.full
+
+    def read(self, offset=0, limit=64 * 1024):
+        """(text, next_offset) for a page of at most `limit` bytes starting at `offset`."""
+        with self.lock:
+            offset = max(0, min(offset, self.size))
+            if self.file is not None:
+                self.file.flush()
+                self.file.seek(offset)
+                data = self.file.read(limit + 3)
+            else:
+                data = bytes(self.memory[offset:offset + limit + 3])
+        end = _utf8_boundary(data, min(limit, len(data)))
+        return data[:end].decode('utf-8', 'replace'), offset + end
+
+    def text(self, limit=None):
+        """Whole output, or its head and tail when larger than `limit` bytes."""
+        if limit is None or self.size <= limit:
+            return self.read(0, self.size)[0]
+        head = self.read(0, limit // 2)[0]
+        tail = self.read(self.size - limit // 2, limit // 2)[0]
+        return f"{head}\n[... {self.size - limit} bytes omitidos ...]\n{tail}"
+
+    @property
+    def spilled(self):
+        return self.file is not None
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+            if self.path:
+                try:
+                    os.remove(self.path)
+                except OSError:
+                    pass
+                self.path = None
+            self.memory = bytearray()
+
+
+class CommandJob:
+    def __init__(self, command, cwd=None, owner=None, on_output=None, on_done=None,
+                 max_memory=256 * 1024, spill_dir=None, timeout=None, env=None, max_output=None):
+        self.id = uuid.uuid4().hex
+        self.command = command
+        self.cwd = cwd
+        self.owner = owner
+        self.on_output = on_output # fn(job, stream, text)
+        self.on_done = on_done # fn(job)
+        self.timeout = timeout
+        self.env = env
+        self.output = OutputBuffer(max_memory, spill_dir, max_output)
+        self.proc = None
+        self.returncode = None
+        self.cancelled = False
+        self.timed_out = False
+        self.output_limited = False
+        self.error = None
+        self.started = None
+        self.finished = None
+        self.done = threading.Event()
+
+    @property
+    def running(self):
+        return not self.done.is_set()
+
+    @property
+    def success(self):
+        return (self.returncode == 0 and not self.cancelled and not self.timed_out and not self.output_limited
+                and self.error is None)
+
+    def info(self):
+        return {
+            'job_id': self.id,
+            'command': self.command,
+            'cwd': self.cwd,
+            'running': self.running,
+            'returncode': self.returncode,
+            'success': self.success,
+            'cancelled': self.cancelled,
+            'timed_out': self.timed_out,
+            'output_limited': self.output_limited,
+            'error': self.error,
+            'size': self.output.size,
+            'spilled': self.output.spilled,
+            'duration': round((self.finished or time.time()) - self.started, 2) if self.started else 0
+        }
+
+    def start(self):
+        self.started = time.time()
+        try:
+            self.proc = subprocess.Popen(
+                self.command, shell=True, cwd=self.cwd, env=self.env,
+                stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                start_new_session=True # own process group: cancel reaches the whole pipeline
+            )
+        except OSError as e:
+            self.error = str(e)
+            self._emit('stderr', f"{e}\n".encode())
+            self._finish()
+            return
+        readers = [threading.Thread(target=self._pump, args=(self.proc.stdout, 'stdout'), daemon=True),
+                   threading.Thread(target=self._pump, args=(self.proc.stderr, 'stderr'), daemon=True)]
+        for reader in readers:
+            reader.start()
+        threading.Thread(target=self._wait, args=(readers,), daemon=True, name=f"Cmd-{self.id[:8]}").start()
+
+    def _pump(self, pipe, stream):
+        decoder = codecs.getincrementaldecoder('utf-8')('replace')
+        fd = pipe.fileno()
+        while True:
+            try:
+                data = os.read(fd, CHUNK_SIZE)
+            except OSError:
+                break
+            if not data:
+                break
+            self._emit(stream, data, decoder)
+        tail = decoder.decode(b'', final=True)
+        if tail and self.on_output:
+            self.on_output(self, stream, tail)
+        pipe.close()
+
+    def _emit(self, stream, data, decoder=None):
+        if self.output_limited:
+            return # stopping: drain the pipe without storing
+        if not self.output.write(data):
+            logger.warning(f"Output of '{self.command}' over {self.output.max_size} bytes, stopping it")
+            self.output_limited = True
+            self._terminate()
+        if self.on_output:
+            text = decoder.decode(data) if decoder else data.decode('utf-8', 'replace')
+            if text:
+                try:
+                    self.on_output(self, stream, text)
+                except Exception as e:
+                    logger.debug(f"Output callback failed: {e}")
+
+    def _wait(self, readers):
+        try:
+            self.proc.wait(timeout=self.timeout)
+        except subprocess.TimeoutExpired:
+            self.timed_out = True
+            self._signal(signal.SIGTERM)
+            try:
+                self.proc.wait(timeout=KILL_GRACE)
+            except subprocess.TimeoutExpired:
+                self._signal(signal.SIGKILL)
+                self.proc.wait()
+        for reader in readers:
+            reader.join(timeout=KILL_GRACE) # a background child may still hold the pipe
+        self.returncode = self.proc.returncode
+        self._finish()
+
+    def _finish(self):
+        self.finished = time.time()
+        self.done.set()
+        JOBS.inc(result='ok' if self.success else 'cancelled' if self.cancelled else 'timeout' if self.timed_out
+                 else 'output_limit' if self.output_limited else 'fail')
+        if self.on_done:
+            try:
+                self.on_done(self)
+            except Exception as e:
+                logger.debug(f"Done callback failed: {e}")
+
+    def _signal(self, sig):
+        try:
+            os.killpg(self.proc.pid, sig)
+        except (OSError, AttributeError):
+            pass
+
+    def _terminate(self):
+        """SIGTERM the process group, SIGKILL it if still alive after KILL_GRACE."""
+        self._signal(signal.SIGTERM)
+
+        def escalate():
+            if not self.done.wait(KILL_GRACE):
+                self._signal(signal.SIGKILL)
+        threading.Thread(target=escalate, daemon=True).start()
+
+    def cancel(self):
+        if not self.running or self.proc is None:
+            return False
+        self.cancelled = True
+        self._terminate()
+        return True
+
+    def wait(self, timeout=None):
+        return self.done.wait(timeout)
+
+
+class CommandRunner:
+    def __init__(self, max_per_session=2, max_jobs=8, max_memory=256 * 1024, keep_finished=600,
+                 spill_dir=None, timeout=None, max_output=64 * 1024 * 1024):
+        self.max_per_session = max_per_session
+        self.max_jobs = max_jobs
+        self.max_memory = max_memory
+        self.max_output = max_output
+        self.keep_finished = keep_finished
+        self.spill_dir = spill_dir
+        self.timeout = timeout
+        self.jobs = {}
+        self.lock = threading.Lock()
+        registry.gauge('neo_command_jobs_running', 'Shell commands currently running.',
+                       callback=lambda: sum(1 for j in list(self.jobs.values()) if j.running))
+
+    def start(self, command, cwd=None, owner=None, on_output=None, on_done=None, timeout=None, env=None):
+        """Returns (job, None) or (None, error message) when a concurrency limit is reached."""
+        self._cleanup()
+        with self.lock:
+            running = [j for j in self.jobs.values() if j.running]
+            if owner is not None and sum(1 for j in running if j.owner == owner) >= self.max_per_session:
+                return None, f"Máximo de {self.max_per_session} comandos simultáneos por sesión."
+            if len(running) >= self.max_jobs:
+                return None, "Demasiados comandos en ejecución, inténtalo más tarde."
+            job = CommandJob(command, cwd, owner, on_output, on_done, self.max_memory, self.spill_dir,
+                             timeout if timeout is not None else self.timeout, env, self.max_output)
+            self.jobs[job.id] = job
+        job.start()
+        return job, None
+
+    def run(self, command, cwd=None, timeout=10):
+        """Blocking run with bounded memory. Returns the finished job."""
+        job, error = self.start(command, cwd, timeout=timeout)
+        if job is None:
+            raise RuntimeError(error)
+        job.wait()
+        return job
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    def release(self, job_id):
+        """Forget a finished job now and delete its spill file."""
+        with self.lock:
+            job = self.jobs.pop(job_id, None)
+        if job is not None:
+            job.output.close()
+
+    def cancel(self, job_id, owner=None):
+        job = self.jobs.get(job_id)
+        if job is None or (owner is not None and job.owner != owner):
+            return False
+        return job.cancel()
+
+    def cancel_owner(self, owner):
+        """Cancel everything a session started (e.g. on disconnect)."""
+        for job in list(self.jobs.values()):
+            if job.owner == owner and job.running:
+                job.cancel()
+
+    def read(self, job_id, offset=0, limit=64 * 1024):
+        job = self.jobs.get(job_id)
+        if job is None:
+            return None
+        text, next_offset = job.output.read(offset, limit)
+        return dict(job.info(), offset=offset, next_offset=next_offset, data=text)
+
+    def _cleanup(self):
+        """Forget finished jobs (and their spill files) after `keep_finished` seconds."""
+        now = time.time()
+        with self.lock:
+            expired = [j for j in self.jobs.values() if not j.running and now - j.finished > self.keep_finished]
+            for job in expired:
+                del self.jobs[job.id]
+        for job in expired:
+            job.output.close()
+
+
+_runner = None
+_runner_lock = threading.Lock()
+
+
+def get_runner():
+    global _runner
+    if _runner is None:
+        with _runner_lock:
+            if _runner is None:
+                conf = {}
+                try:
+                    from modules.config_manager import ConfigManager
+                    conf = ConfigManager().get('terminal', {}) or {}
+                except Exception:
+                    pass
+                _runner = CommandRunner(
+                    max_per_session=conf.get('max_per_session', 2),
+                    max_jobs=conf.get('max_jobs', 8),
+                    max_memory=conf.get('memory_limit_kb', 256) * 1024,
+                    keep_finished=conf.get('keep_finished', 600),
+                    timeout=conf.get('timeout') or None,
+                    max_output=conf.get('output_limit_mb', 64) * 1024 * 1024 or None
+                )
+    return _runner
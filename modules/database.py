@@ -4,8 +4,14 @@ import os
 from datetime import datetime
 from collections import deque
 
+from modules.metrics import registry
+from modules.file_search import FileSearch
+
 logger = logging.getLogger("NeoDatabase")
 
+DB_WRITE_SECONDS = registry.histogram('neo_db_write_seconds', 'SQLite write latency (statement + commit).', ['op'],
+                                      buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0))
+
 class DatabaseManager:
     def __init__(self, db_path="database/brain.db"):
         self.db_path = db_path
@@ -137,6 +143,25 @@ class DatabaseManager:
                 indexed_at DATETIME DEFAULT CURRENT_TIMESTAMP
             )
         ''')
+        # Incremental indexer (modules/file_indexer.py): parent dir + exact mtime per file,
+        # generation stamp per directory and run state for resuming
+        columns = {row[1] for row in cursor.execute("PRAGMA table_info(files_index)")}
+        for column, declaration in (("dir", "TEXT"), ("mtime_ns", "INTEGER")):
+            if column not in columns:
+                cursor.execute(f"ALTER TABLE files_index ADD COLUMN {column} {declaration}")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_files_index_dir ON files_index(dir)")
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS files_dirs (
+                path TEXT PRIMARY KEY,
+                generation INTEGER
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS files_index_meta (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            )
+        ''')
 
         conn.commit()
         # FTS5 Virtual Tables for Fast Search
@@ -178,9 +203,54 @@ class DatabaseManager:
         except sqlite3.OperationalError as e:
             logger.warning(f"FTS5 not supported or error initializing: {e}. Falling back to standard search.")
 
+        self._init_files_fts(cursor)
+
         conn.commit()
         logger.info("Database initialized.")
 
+    def _init_files_fts(self, cursor):
+        """
+        files_fts: FTS5 over files_index (name, dir) kept in sync by triggers.
+        Trigram tokenizer (SQLite >= 3.34) for substring/fuzzy search, else unicode61 words.
+        Sets self.files_fts to 'trigram', 'unicode61' or None (LIKE fallback).
+        """
+        self.files_fts = None
+        try:
+            existing = cursor.execute("SELECT sql FROM sqlite_master WHERE name = 'files_fts'").fetchone()
+            if existing:
+                self.files_fts = 'trigram' if 'trigram' in existing[0] else 'unicode61'
+            else:
+                for tokenizer, mode in (("tokenize='trigram'", 'trigram'), ("prefix='2 3'", 'unicode61')):
+                    try:
+                        cursor.execute(f"CREATE VIRTUAL TABLE files_fts USING fts5(name, dir, content='files_index', content_rowid='id', {tokenizer})")
+                        self.files_fts = mode
+                        break
+                    except sqlite3.OperationalError:
+                        continue
+                if self.files_fts is None:
+                    return
+                cursor.execute("INSERT INTO files_fts(files_fts) VALUES('rebuild')") # index existing rows
+            cursor.execute('''
+                CREATE TRIGGER IF NOT EXISTS files_index_ai AFTER INSERT ON files_index BEGIN
+                  INSERT INTO files_fts(rowid, name, dir) VALUES (new.id, new.name, new.dir);
+                END;
+            ''')
+            cursor.execute('''
+                CREATE TRIGGER IF NOT EXISTS files_index_ad AFTER DELETE ON files_index BEGIN
+                  INSERT INTO files_fts(files_fts, rowid, name, dir) VALUES('delete', old.id, old.name, old.dir);
+                END;
+            ''')
+            cursor.execute('''
+                CREATE TRIGGER IF NOT EXISTS files_index_au AFTER UPDATE OF name, dir ON files_index BEGIN
+                  INSERT INTO files_fts(files_fts, rowid, name, dir) VALUES('delete', old.id, old.name, old.dir);
+                  INSERT INTO files_fts(rowid, name, dir) VALUES (new.id, new.name, new.dir);
+                END;
+            ''')
+        except sqlite3.OperationalError as e:
+            logger.warning(f"files_fts not available ({e}), file search falls back to LIKE.")
+            self.files_fts = None
+
+    @DB_WRITE_SECONDS.time(op='log_interaction')
     def log_interaction(self, user_input, neo_response, intent_name=None):
         conn = self.get_connection()
         try:
@@ -200,6 +270,7 @@ class DatabaseManager:
         )
         return cursor.fetchall()
 
+    @DB_WRITE_SECONDS.time(op='add_fact')
     def add_fact(self, key, value):
         conn = self.get_connection()
         try:
@@ -240,6 +311,7 @@ class DatabaseManager:
             )
             return cursor.fetchall()
 
+    @DB_WRITE_SECONDS.time(op='add_alias')
     def add_alias(self, trigger, command):
         conn = self.get_connection()
         try:
@@ -264,6 +336,7 @@ class DatabaseManager:
         cursor = conn.execute("SELECT trigger, command FROM aliases")
         return {row['trigger']: row['command'] for row in cursor.fetchall()}
 
+    @DB_WRITE_SECONDS.time(op='log_event')
     def log_event(self, event_type, details, sentiment="neutral", context_json="{}"):
         conn = self.get_connection()
         try:
@@ -325,6 +398,7 @@ class DatabaseManager:
             return cursor.fetchall()
 
     # --- Cortex Methods ---
+    @DB_WRITE_SECONDS.time(op='update_concept')
     def update_concept(self, word, sentiment_delta=0.0):
         conn = self.get_connection()
         try:
@@ -360,6 +434,7 @@ class DatabaseManager:
         cursor = conn.execute("SELECT * FROM concepts ORDER BY frequency DESC LIMIT ?", (limit,))
         return cursor.fetchall()
 
+    @DB_WRITE_SECONDS.time(op='add_relation')
     def add_relation(self, source, target, relation_type, weight=1.0):
         conn = self.get_connection()
         try:
@@ -442,6 +517,7 @@ class DatabaseManager:
                     
         return list(set(dependencies + indirect))
 
+    @DB_WRITE_SECONDS.time(op='log_surprise')
     def log_surprise(self, topic, message):
         conn = self.get_connection()
         try:
@@ -473,6 +549,7 @@ class DatabaseManager:
         )
         return cursor.fetchall()
 
+    @DB_WRITE_SECONDS.time(op='add_daily_summary')
     def add_daily_summary(self, date_str, summary):
         conn = self.get_connection()
         try:
@@ -498,12 +575,15 @@ class DatabaseManager:
 
     # --- File Indexing Methods ---
 
+    @DB_WRITE_SECONDS.time(op='index_file')
     def index_file(self, path, name, extension, size, mtime):
         conn = self.get_connection()
         try:
             conn.execute(
-                "INSERT OR REPLACE INTO files_index (path, name, extension, size, modified_at, indexed_at) VALUES (?, ?, ?, ?, ?, ?)",
-                (path, name, extension, size, mtime, datetime.now())
+                """INSERT INTO files_index (path, name, extension, size, modified_at, indexed_at, dir) VALUES (?, ?, ?, ?, ?, ?, ?)
+                   ON CONFLICT(path) DO UPDATE SET name = excluded.name, extension = excluded.extension, size = excluded.size,
+                   modified_at = excluded.modified_at, indexed_at = excluded.indexed_at, dir = excluded.dir""",
+                (path, name, extension, size, mtime, datetime.now(), os.path.dirname(path))
             )
             conn.commit()
             return True
@@ -512,19 +592,23 @@ class DatabaseManager:
             return False
 
     def search_files_index(self, query, limit=10):
-        """Search files by name using LIKE."""
-        conn = self.get_connection()
-        wildcard = f"%{query.lower()}%"
-        cursor = conn.execute(
-            "SELECT path, name, size FROM files_index WHERE name LIKE ? LIMIT ?",
-            (wildcard, limit)
-        )
-        return cursor.fetchall()
+        """
+        Ranked filename search tolerant to ASR errors (trigram FTS5 + fuzzy re-rank, see modules/file_search.py).
+        Returns [{'path', 'name', 'size', 'modified_at', 'score'}], best first.
+        """
+        try:
+            return FileSearch(self.get_connection(), self.files_fts).search(query, limit)
+        except sqlite3.Error as e:
+            logger.error(f"Error searching files index: {e}")
+            return []
 
+    @DB_WRITE_SECONDS.time(op='clear_file_index')
     def clear_file_index(self):
         conn = self.get_connection()
         try:
             conn.execute("DELETE FROM files_index")
+            conn.execute("DELETE FROM files_dirs")
+            conn.execute("DELETE FROM files_index_meta")
             conn.commit()
             return True
         except sqlite3.Error as e:
@@ -0,0 +1,280 @@
+"""
+Incremental file indexer for files_index (FilesSkill).
+
+- os.scandir walk: the DirEntry stat is reused (no extra os.stat per file) and
+  file types come from the directory listing.
+- Each directory is compared with its stored rows (path, size, mtime_ns), so
+  only new, changed and vanished files are written.
+- Every run has a generation number. A directory stamps it in files_dirs when
+  done. Directories never stamped by a finished run are gone and their files
+  are deleted at the end. An unchanged full re-run therefore writes no file
+  rows but rewrites one stamp per directory; refresh() of an unchanged
+  directory (stamp already current) writes nothing.
+- Writes go through one private connection in large batched transactions.
+- The stamp of a directory is committed with its rows, so an interrupted run
+  (shutdown, crash) resumes with the same generation and skips the directories
+  it already finished.
+"""
+import os
+import time
+import stat
+import sqlite3
+import logging
+import threading
+from datetime import datetime
+
+from modules.metrics import registry
+
+logger = logging.getLogger("FileIndexer")
+
+CHANGES = registry.counter('neo_file_index_changes_total', 'Rows written by the file indexer.', ['op'])
+
+DEFAULT_EXCLUDES = ['.cache', '.git', 'node_modules', '__pycache__', '.venv', 'venv', '.Trash', 'Trash']
+
+
+def extension_of(name):
+    return name.split('.')[-1].lower() if '.' in name else ''
+
+
+class FileIndexer:
+    def __init__(self, db_path, scan_paths, extensions=None, exclude_dirs=DEFAULT_EXCLUDES, batch_size=5000):
+        self.db_path = db_path
+        self.scan_paths = [os.path.abspath(os.path.expanduser(p)) for p in scan_paths]
+        self.extensions = {e.lower().lstrip('.') for e in extensions or []}
+        self.exclude_dirs = set(exclude_dirs or [])
+        self.batch_size = batch_size
+        self.stop_event = threading.Event()
+        self.lock = threading.Lock() # one run at a time
+        self.conn = None
+        self.pending = 0
+        self.stats = {}
+
+    # --- Storage ---
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL;")
+        conn.execute("PRAGMA synchronous=NORMAL;")
+        return conn
+
+    def _meta(self, key, default=None):
+        row = self.conn.execute("SELECT value FROM files_index_meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def _set_meta(self, **values):
+        self.conn.executemany("INSERT OR REPLACE INTO files_index_meta (key, value) VALUES (?, ?)",
+                              [(k, str(v)) for k, v in values.items()])
+
+    def _written(self, count=1):
+        """Commit once enough rows are pending (one fsync per batch, not per file)."""
+        self.pending += count
+        if self.pending >= self.batch_size:
+            self.conn.commit()
+            self.pending = 0
+
+    def last_finished(self):
+        """Timestamp of the last complete run (0 if never), without opening a long-lived connection."""
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT value FROM files_index_meta WHERE key = 'finished_at'").fetchone()
+            status = conn.execute("SELECT value FROM files_index_meta WHERE key = 'status'").fetchone()
+        except sqlite3.Error:
+            return 0
+        finally:
+            conn.close()
+        if status and status[0] == 'running':
+            return 0 # interrupted: resume as soon as possible
+        return float(row[0]) if row else 0
+
+    # --- Scan ---
+
+    def run(self):
+        """Incremental scan of every scan path. Returns stats, or None if a run is already active."""
+        if not self.lock.acquire(blocking=False):
+            return None
+        self.stop_event.clear()
+        self.stats = {'files': 0, 'added': 0, 'updated': 0, 'deleted': 0, 'dirs': 0, 'resumed_dirs': 0}
+        started = time.time()
+        try:
+            self.conn = self._connect()
+            if self._meta('status') == 'running':
+                generation = int(self._meta('generation', 1))
+                logger.info(f"Resuming interrupted file scan (generation {generation})")
+            else:
+                generation = int(self._meta('generation', 0)) + 1
+                self._set_meta(generation=generation, status='running', started_at=started)
+                self.conn.commit()
+
+            visited = set()
+            done = {row[0] for row in self.conn.execute(
+                "SELECT path FROM files_dirs WHERE generation = ?", (generation,))}
+            for root in self.scan_paths:
+                if os.path.isdir(root):
+                    self._walk(root, generation, visited, done)
+                if self.stop_event.is_set():
+                    break
+
+            if self.stop_event.is_set():
+                self.conn.commit() # checkpoint: finished directories keep their stamp
+                logger.info(f"File scan interrupted after {self.stats['dirs']} directories, will resume")
+                return self.stats
+
+            self._finish(generation)
+            self.stats['duration'] = round(time.time() - started, 1)
+            logger.info(f"File scan complete: {self.stats}")
+            return self.stats
+        except sqlite3.Error as e:
+            logger.error(f"File scan failed: {e}")
+            return None
+        finally:
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
+            self.lock.release()
+
+    def stop(self):
+        self.stop_event.set()
+
+    # --- Targeted updates (fs_watcher) ---
+
+    def covers(self, path):
+        """True if `path` is inside a scan path and not under an excluded directory."""
+        for root in self.scan_paths:
+            if path == root or path.startswith(root.rstrip('/') + '/'):
+                relative = path[len(root):].strip('/')
+                return not any(part in self.exclude_dirs for part in relative.split('/') if part)
+        return False
+
+    def refresh(self, directories, recursive=False, timeout=5):
+        """
+        Re-index only `directories` (their subtrees too with recursive=True). A directory
+        that no longer exists is dropped with its subtree. Returns stats, or None while a
+        full run holds the index (try again later).
+        """
+        if not self.lock.acquire(timeout=timeout):
+            return None
+        self.stats = {'files': 0, 'added': 0, 'updated': 0, 'deleted': 0, 'dirs': 0, 'resumed_dirs': 0}
+        try:
+            self.conn = self._connect()
+            generation = int(self._meta('generation', 0))
+            for directory in directories:
+                if not os.path.isdir(directory):
+                    self._remove_tree(directory)
+                elif recursive:
+                    self._walk(directory, generation, set())
+                else:
+                    try:
+                        with os.scandir(directory) as it:
+                            self._index_dir(directory, list(it), generation)
+                    except OSError:
+                        continue
+            self.conn.commit()
+            self.pending = 0
+            return self.stats
+        except sqlite3.Error as e:
+            logger.error(f"File index refresh failed: {e}")
+            return None
+        finally:
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
+            self.lock.release()
+
+    def _remove_tree(self, directory):
+        # '/' < '0': [dir + '/', dir + '0') is exactly the subtree, and uses the dir index
+        bounds = (directory, directory.rstrip('/') + '/', directory.rstrip('/') + '0')
+        cur = self.conn.execute("DELETE FROM files_index WHERE dir = ? OR (dir >= ? AND dir < ?)", bounds)
+        self.conn.execute("DELETE FROM files_dirs WHERE path = ? OR (path >= ? AND path < ?)", bounds)
+        self.stats['deleted'] += max(cur.rowcount, 0)
+        CHANGES.inc(max(cur.rowcount, 0), op='delete')
+
+    def _walk(self, root, generation, visited, done=()):
+        stack = [root]
+        while stack and not self.stop_event.is_set():
+            directory = stack.pop()
+            if directory in visited:
+                continue
+            visited.add(directory)
+            try:
+                with os.scandir(directory) as it:
+                    entries = list(it)
+            except OSError:
+                continue # permissions, vanished
+
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False) and entry.name not in self.exclude_dirs:
+                        stack.append(entry.path)
+                except OSError:
+                    pass
+            if directory in done:
+                self.stats['resumed_dirs'] += 1
+                continue
+            self._index_dir(directory, entries, generation)
+
+    def _index_dir(self, directory, entries, generation):
+        """Diff one directory against its stored rows and write the differences."""
+        seen = {}
+        for entry in entries:
+            name = entry.name
+            if self.extensions and extension_of(name) not in self.extensions:
+                continue
+            try:
+                if not entry.is_file():
+                    continue
+                st = entry.stat() # cached by scandir (a symlink is followed once)
+            except OSError:
+                continue
+            if stat.S_ISREG(st.st_mode):
+                seen[name] = (st.st_size, st.st_mtime_ns)
+        self.stats['files'] += len(seen)
+
+        stored = {row[0]: (row[1], row[2]) for row in self.conn.execute(
+            "SELECT name, size, mtime_ns FROM files_index WHERE dir = ?", (directory,))}
+
+        now = datetime.now()
+        upserts = []
+        for name, (size, mtime_ns) in seen.items():
+            old = stored.get(name)
+            if old == (size, mtime_ns):
+                continue
+            self.stats['added' if old is None else 'updated'] += 1
+            upserts.append((os.path.join(directory, name), name, extension_of(name), size,
+                            datetime.fromtimestamp(mtime_ns / 1e9), now, directory, mtime_ns))
+        removed = [(os.path.join(directory, name),) for name in stored if name not in seen]
+
+        if upserts:
+            self.conn.executemany('''
+                INSERT INTO files_index (path, name, extension, size, modified_at, indexed_at, dir, mtime_ns)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(path) DO UPDATE SET
+                    name = excluded.name, extension = excluded.extension, size = excluded.size,
+                    modified_at = excluded.modified_at, indexed_at = excluded.indexed_at,
+                    dir = excluded.dir, mtime_ns = excluded.mtime_ns
+            ''', upserts)
+            CHANGES.inc(len(upserts), op='upsert')
+        if removed:
+            self.conn.executemany("DELETE FROM files_index WHERE path = ?", removed)
+            self.stats['deleted'] += len(removed)
+            CHANGES.inc(len(removed), op='delete')
+        # Stamped after its rows: a crash before the commit just redoes this directory.
+        # The WHERE leaves a stamp that is already current untouched (no page write).
+        cur = self.conn.execute('''
+            INSERT INTO files_dirs (path, generation) VALUES (?, ?)
+            ON CONFLICT(path) DO UPDATE SET generation = excluded.generation
+            WHERE files_dirs.generation != excluded.generation
+        ''', (directory, generation))
+        self.stats['dirs'] += 1
+        self._written(len(upserts) + len(removed) + max(cur.rowcount, 0))
+
+    def _finish(self, generation):
+        """Drop files whose directory was not seen by this complete run (removed, excluded, legacy rows)."""
+        cur = self.conn.execute(
+            "DELETE FROM files_index WHERE dir IS NULL OR dir NOT IN (SELECT path FROM files_dirs WHERE generation = ?)",
+            (generation,))
+        self.stats['deleted'] += max(cur.rowcount, 0)
+        CHANGES.inc(max(cur.rowcount, 0), op='delete')
+        self.conn.execute("DELETE FROM files_dirs WHERE generation < ?", (generation,))
+        self._set_meta(status='done', finished_at=time.time())
+        self.conn.commit()
+        self.pending = 0
@@ -0,0 +1,171 @@
+"""
+Ranked, typo-tolerant filename search over files_index.
+
+Candidates come from the files_fts FTS5 index (trigram tokenizer over name and
+dir, see DatabaseManager._init_files_fts):
+  1. every query trigram is probed with a capped query (newest PROBE rows). The
+     rare ones (fewer hits than the cap) are selective, and files sharing most of
+     them are the candidates, so "informe anul" or "fotos de la playa" still find
+     informe_anual.pdf and fotos_playa.jpg after ASR errors;
+  2. when every trigram is common, exact substrings of all query words.
+No bm25 ordering: it needs full document counts of every term, which costs
+tens of ms on common trigrams. The candidates are re-ranked with RapidFuzz
+(difflib without it) on the file stem, plus recency of modified_at, words found
+in the directory and a bonus when the extension was spoken. Modes without
+trigram support: 'unicode61' (word prefix queries) and None (LIKE scan).
+"""
+import re
+import math
+import difflib
+import logging
+import unicodedata
+from datetime import datetime
+
+try:
+    from rapidfuzz import fuzz
+except ImportError:
+    fuzz = None
+
+logger = logging.getLogger("FileSearch")
+
+CANDIDATES = 200 # rows re-ranked in Python
+PROBE = 500 # a trigram with fewer files than this is selective
+MAX_TRIGRAMS = 24 # probes per query (long dictations)
+RECENCY_DAYS = 90
+MIN_SCORE = 45 # below this a candidate only shares a few trigrams with the query
+RELATIVE_CUTOFF = 0.7 # and it must score at least 70% of the best hit
+
+KNOWN_EXTENSIONS = {
+    'txt', 'pdf', 'md', 'py', 'jpg', 'jpeg', 'png', 'gif', 'mp3', 'mp4', 'wav', 'ogg', 'mkv', 'avi',
+    'doc', 'docx', 'odt', 'xls', 'xlsx', 'ods', 'csv', 'json', 'xml', 'html', 'zip', 'tar', 'gz', 'sh'
+}
+
+
+def normalize(text):
+    """Lowercase without diacritics (ASR output and file names disagree on accents)."""
+    text = unicodedata.normalize('NFKD', text.lower())
+    return ''.join(c for c in text if not unicodedata.combining(c))
+
+
+def parse_query(query):
+    """(words, extension or None). 'informe anual.pdf' -> (['informe', 'anual'], 'pdf')."""
+    words = [w for w in re.split(r'[^\w]+', normalize(query)) if w]
+    extension = None
+    if len(words) > 1 and words[-1] in KNOWN_EXTENSIONS:
+        extension = words.pop()
+    return words, extension
+
+
+def trigrams(words):
+    grams = []
+    for word in words:
+        for i in range(len(word) - 2):
+            gram = word[i:i + 3]
+            if gram not in grams:
+                grams.append(gram)
+    return grams
+
+
+def _quote(term):
+    return '"' + term.replace('"', '""') + '"'
+
+
+def similarity(query, stem):
+    """0-100 similarity of the spoken words and a file stem."""
+    if fuzz is not None:
+        return max(fuzz.WRatio(query, stem), fuzz.partial_ratio(query, stem))
+    matcher = difflib.SequenceMatcher(None, query, stem, autojunk=False)
+    # partial_ratio stand-in: share of the query found in runs of 3+ characters
+    partial = sum(b.size for b in matcher.get_matching_blocks() if b.size >= 3) / len(query) if query else 0
+    return 100 * max(matcher.ratio(), 0.9 * partial)
+
+
+def _age_days(modified_at, now):
+    if not modified_at:
+        return None
+    try:
+        value = datetime.fromisoformat(str(modified_at))
+    except ValueError:
+        return None
+    return max(0.0, (now - value).total_seconds() / 86400)
+
+
+def score(row, words, extension, now):
+    """Combined rank: name similarity dominates; directory, recency and extension break ties."""
+    name = normalize(row['name'])
+    stem, _, ext = name.rpartition('.') if '.' in name else (name, '', '')
+    value = similarity(' '.join(words), re.sub(r'[^\w]+', ' ', stem).strip())
+    directory = normalize(row['dir'] or '')
+    value += 5 * sum(1 for w in words if len(w) >= 3 and w in directory and w not in stem)
+    age = _age_days(row['modified_at'], now)
+    if age is not None:
+        value += 10 * math.exp(-age / RECENCY_DAYS)
+    if extension:
+        value += 25 if ext == extension else -15
+    return value
+
+
+class FileSearch:
+    def __init__(self, conn, mode='trigram'):
+        self.conn = conn
+        self.mode = mode
+
+    def search(self, query, limit=10):
+        """[{path, name, size, modified_at, score}] best first, without weak matches (see MIN_SCORE)."""
+        words, extension = parse_query(query)
+        if not words and extension:
+            words, extension = [extension], None
+        if not words:
+            return []
+
+        if self.mode == 'trigram':
+            rows = self._trigram_candidates(words)
+        elif self.mode == 'unicode61':
+            rows = self._token_candidates(words)
+        else:
+            rows = []
+        if self.mode is None or (not rows and all(len(w) < 3 for w in words)):
+            rows = self._like_candidates(words) # full scan: no FTS5, or only 1-2 letter words
+
+        now = datetime.now()
+        ranked = sorted(((score(r, words, extension, now), r) for r in rows), key=lambda x: x[0], reverse=True)
+        if ranked:
+            cutoff = max(MIN_SCORE, ranked[0][0] * RELATIVE_CUTOFF)
+            ranked = [(value, r) for value, r in ranked if value >= cutoff]
+        return [{'path': r['path'], 'name': r['name'], 'size': r['size'], 'modified_at': r['modified_at'],
+                 'score': round(value, 1)} for value, r in ranked[:limit]]
+
+    def _rows(self, where, args):
+        return self.conn.execute(
+            f"SELECT path, name, dir, size, modified_at FROM files_index WHERE {where}", args).fetchall()
+
+    def _match(self, match, limit):
+        """rowids of the newest `limit` matches (rowid order is cheap, bm25 order is not)."""
+        return [r[0] for r in self.conn.execute(
+            "SELECT rowid FROM files_fts WHERE files_fts MATCH ? ORDER BY rowid DESC LIMIT ?", (match, limit))]
+
+    def _trigram_candidates(self, words):
+        long_words = [w for w in words if len(w) >= 3] # trigram cannot match shorter terms
+        if not long_words:
+            return []
+        # 1. Files sharing the most selective trigrams (tolerates misheard letters and word splits)
+        hits = {}
+        for gram in trigrams(long_words)[:MAX_TRIGRAMS]:
+            ids = self._match(_quote(gram), PROBE)
+            if len(ids) < PROBE:
+                for rowid in ids:
+                    hits[rowid] = hits.get(rowid, 0) + 1
+        if hits:
+            best = sorted(hits, key=hits.get, reverse=True)[:CANDIDATES]
+            return self._rows(f"id IN ({','.join('?' * len(best))})", best)
+        # 2. Only common trigrams: every word as a substring
+        ids = self._match(' AND '.join(_quote(w) for w in long_words), CANDIDATES)
+        return self._rows(f"id IN ({','.join('?' * len(ids))})", ids) if ids else []
+
+    def _token_candidates(self, words):
+        # unicode61: whole tokens with prefix matching ("infor*")
+        ids = self._match(' OR '.join(_quote(w) + '*' for w in words), CANDIDATES)
+        return self._rows(f"id IN ({','.join('?' * len(ids))})", ids) if ids else []
+
+    def _like_candidates(self, words):
+        return self._rows("name LIKE ? LIMIT ?", (f"%{max(words, key=len)}%", CANDIDATES))
@@ -0,0 +1,256 @@
+"""
+Cached index of the flags every executable accepts.
+
+validate_command_flags used to spawn `<exe> --help` for every Mango command.
+Here the help output (or the man page when --help gives nothing) is parsed
+once into a set of flags, kept in memory and persisted in
+data/flag_index.json keyed by the binary's real path and mtime, so an upgrade
+of the tool re-indexes it. Tools with per-subcommand flags (docker ps -a) get
+one entry per subcommand.
+
+Build it ahead of time with: python resources/tools/build_flag_index.py
+"""
+import os
+import re
+import json
+import shlex
+import shutil
+import logging
+import threading
+import subprocess
+
+from modules.metrics import registry
+
+logger = logging.getLogger("FlagIndex")
+
+LOOKUPS = registry.counter('neo_flag_index_lookups_total', 'Flag index lookups.', ['result'])
+
+# Common admin toolset indexed at install time
+COMMON_TOOLS = [
+    'ls', 'find', 'df', 'du', 'free', 'ps', 'top', 'grep', 'cat', 'head', 'tail', 'sort', 'uniq', 'wc',
+    'cut', 'tr', 'sed', 'awk', 'xargs', 'cp', 'mv', 'rm', 'mkdir', 'rmdir', 'touch', 'ln', 'chmod',
+    'chown', 'stat', 'file', 'tar', 'gzip', 'zip', 'unzip', 'date', 'uptime', 'uname', 'hostname',
+    'whoami', 'id', 'who', 'last', 'lsblk', 'blkid', 'mount', 'umount', 'systemctl', 'journalctl',
+    'ip', 'ss', 'netstat', 'ping', 'traceroute', 'dig', 'nslookup', 'curl', 'wget', 'ssh', 'scp',
+    'rsync', 'kill', 'pkill', 'pgrep', 'nice', 'renice', 'lsof', 'dmesg', 'apt', 'apt-get', 'dpkg',
+    'docker', 'git', 'pip', 'ufw', 'crontab', 'sensors', 'vcgencmd', 'nmcli', 'iwconfig'
+]
+
+# Tools whose subcommands have their own flags: indexed as "<tool> <subcommand>"
+SUBCOMMAND_TOOLS = {'docker', 'podman', 'git', 'kubectl', 'pip', 'pip3'}
+COMMON_SUBCOMMANDS = {
+    'docker': ['ps', 'run', 'exec', 'logs', 'images', 'pull', 'stop', 'start', 'restart', 'rm', 'rmi', 'stats', 'inspect', 'compose'],
+    'git': ['status', 'log', 'diff', 'pull', 'push', 'commit', 'add', 'branch', 'checkout', 'clone']
+}
+
+# -a, --all, -name, -s[tatistics], --block-size=SIZE (the =SIZE is dropped)
+FLAG_RE = re.compile(r'(?<![\w-])(--?[A-Za-z0-9?][\w-]*)(?:\[(\w+)\])?')
+NUMERIC_RE = re.compile(r'^-\d+$') # head -5, tail -20
+COMMAND_SEPARATORS = {'|', '||', '&&', ';', '&'}
+HELP_TIMEOUT = 5
+GENERIC_FLAGS = {'-h', '--help', '--version', '-V'}
+MIN_FLAGS = 3 # fewer real flags than this: the help text only points elsewhere (procps ps, mawk)
+
+
+def usable(flags):
+    """True when a flag set describes the tool, not just '--help'."""
+    return len(set(flags) - GENERIC_FLAGS) >= MIN_FLAGS
+
+
+def parse_flags(text):
+    """Set of flags mentioned in a help text or man page."""
+    text = re.sub(r'.\x08', '', text) # man overstrike (bold/underline)
+    flags = set()
+    for m in FLAG_RE.finditer(text):
+        flag, optional = m.group(1).rstrip('-'), m.group(2)
+        if len(flag) < 2 or flag == '--':
+            continue
+        flags.add(flag)
+        if optional:
+            # ip style "-s[tatistics]": every abbreviation is accepted
+            for i in range(1, len(optional) + 1):
+                flags.add(flag + optional[:i])
+    return flags
+
+
+def command_flags(command):
+    """(executable, subcommand or None, [flags]) of the first command of a line."""
+    try:
+        parts = shlex.split(command)
+    except ValueError:
+        parts = command.split()
+    words = []
+    for part in parts:
+        if part in COMMAND_SEPARATORS:
+            break
+        words.append(part)
+    if not words:
+        return None, None, []
+
+    executable = words[0]
+    subcommand = None
+    if os.path.basename(executable) in SUBCOMMAND_TOOLS and len(words) > 1 and re.match(r'^[a-z][\w-]*$', words[1]):
+        subcommand = words[1]
+    flags = []
+    for word in words[1:]:
+        if word == '--':
+            break # everything after is positional
+        if word.startswith('-') and len(word) > 1:
+            flags.append(word)
+    return executable, subcommand, flags
+
+
+def flag_known(flag, known):
+    """True if `flag` (as typed) is covered by the indexed set."""
+    flag = flag.split('=', 1)[0]
+    if flag in known or NUMERIC_RE.match(flag):
+        return True
+    if flag.startswith('--'):
+        # Unambiguous GNU abbreviation (--human for --human-readable)
+        return any(k.startswith(flag) for k in known if k.startswith('--'))
+    # Grouped short flags (-lah) or a short flag with an attached value (-n5, -ofile)
+    if f"-{flag[1]}" not in known:
+        return False
+    for i in range(2, len(flag)):
+        if f"-{flag[i]}" not in known:
+            return not flag[i:].isalpha() # -n5, -w80: value attached to the previous flag
+    return True
+
+
+class FlagIndex:
+    def __init__(self, path="data/flag_index.json"):
+        self.path = path
+        self.entries = self._load() # key -> {'mtime': ns, 'flags': [..]}
+        self.cache = {} # key -> (mtime, set)
+        self.lock = threading.Lock()
+        self.dirty = False
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save(self):
+        with self.lock:
+            if not self.dirty:
+                return
+            data = dict(self.entries)
+            self.dirty = False
+        try:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            tmp = self.path + '.tmp'
+            with open(tmp, 'w') as f:
+                json.dump(data, f, sort_keys=True)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            logger.error(f"Cannot save flag index: {e}")
+
+    def _resolve(self, executable):
+        """(real path, mtime_ns) of an executable, or (None, None) for builtins/unknown."""
+        found = shutil.which(executable)
+        if not found:
+            return None, None
+        real = os.path.realpath(found)
+        try:
+            return real, os.stat(real).st_mtime_ns
+        except OSError:
+            return None, None
+
+    def _read_help(self, path, subcommand=None):
+        argv = [path] + ([subcommand] if subcommand else []) + ['--help']
+        try:
+            proc = subprocess.run(argv, capture_output=True, text=True, timeout=HELP_TIMEOUT,
+                                  stdin=subprocess.DEVNULL, errors='replace')
+            flags = parse_flags(proc.stdout + proc.stderr)
+        except (subprocess.TimeoutExpired, OSError):
+            flags = set()
+        if usable(flags) or subcommand:
+            return flags
+        # --help lists (almost) nothing ('ps --help' only mentions --help): add the man page
+        try:
+            name = os.path.basename(path)
+            proc = subprocess.run(['man', '-P', 'cat', name], capture_output=True, text=True, timeout=HELP_TIMEOUT,
+                                  env=dict(os.environ, MANWIDTH='200'), errors='replace')
+            return flags | parse_flags(proc.stdout)
+        except (subprocess.TimeoutExpired, OSError):
+            return flags
+
+    def flags_for(self, executable, subcommand=None):
+        """Known flags of an executable (plus its subcommand), or None when it cannot be indexed."""
+        path, mtime = self._resolve(executable)
+        if not path:
+            LOOKUPS.inc(result='unknown')
+            return None
+        flags = self._flags(path, mtime)
+        if subcommand:
+            flags = flags | self._flags(path, mtime, subcommand)
+        # Without help or man text worth trusting the tool is treated as not indexable
+        return flags if usable(flags) else None
+
+    def _flags(self, path, mtime, subcommand=None):
+        key = f"{path} {subcommand}" if subcommand else path
+        with self.lock:
+            cached = self.cache.get(key)
+            if cached and cached[0] == mtime:
+                LOOKUPS.inc(result='memory')
+                return cached[1]
+            entry = self.entries.get(key)
+            if entry and entry.get('mtime') == mtime:
+                flags = set(entry['flags'])
+                self.cache[key] = (mtime, flags)
+                LOOKUPS.inc(result='disk')
+                return flags
+
+        flags = self._read_help(path, subcommand) # outside the lock: may take seconds
+        LOOKUPS.inc(result='indexed')
+        with self.lock:
+            self.cache[key] = (mtime, flags)
+            self.entries[key] = {'mtime': mtime, 'flags': sorted(flags)}
+            self.dirty = True
+        return flags
+
+    def validate(self, command):
+        """(True, None) if every flag is known, (False, message) otherwise. Unindexable tools pass."""
+        executable, subcommand, flags = command_flags(command)
+        if executable is None:
+            return False, "Comando vacío"
+        if not flags:
+            return True, None
+        known = self.flags_for(executable, subcommand)
+        if self.dirty:
+            self.save()
+        if not known:
+            return True, None # no help/man: cannot validate, do not block
+
+        invalid = [flag for flag in flags if not flag_known(flag, known)]
+        if invalid:
+            return False, f"Flags posiblemente inválidos detectados: {', '.join(invalid)} para el comando '{executable}'"
+        return True, None
+
+    def build(self, tools=COMMON_TOOLS, subcommands=COMMON_SUBCOMMANDS):
+        """Index a list of tools up front. Returns {tool: number of flags} for the installed ones."""
+        summary = {}
+        for tool in tools:
+            path, mtime = self._resolve(tool)
+            if not path:
+                continue
+            summary[tool] = len(self._flags(path, mtime))
+            for sub in subcommands.get(tool, []):
+                summary[f"{tool} {sub}"] = len(self._flags(path, mtime, sub))
+        self.save()
+        return summary
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_flag_index():
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = FlagIndex()
+    return _index
@@ -0,0 +1,237 @@
+"""
+Live filesystem watcher that keeps files_index current between full scans.
+
+Every directory under the FileIndexer scan paths gets an inotify watch
+(modules/inotify.py). Watches are added breadth-first, so shallow and more
+relevant directories are covered first, until the watch budget runs out.
+Events only mark their directory dirty. Dirty directories are re-indexed
+(FileIndexer.refresh) once they have been quiet for `coalesce` seconds, so a
+burst of writes costs one small diff. New directories are watched and indexed
+recursively. Removed or moved-away directories are dropped from the index.
+
+Fallbacks are targeted rescans instead of a full scan:
+- directories left without a watch (budget reached, ENOSPC) are rescanned
+  every `unwatched_interval` seconds;
+- after a queue overflow (IN_Q_OVERFLOW), the directories with recent
+  activity are rescanned recursively.
+
+fanotify would avoid per-directory watches but needs CAP_SYS_ADMIN.
+"""
+import os
+import time
+import errno
+import logging
+import threading
+from collections import deque
+
+from modules import inotify
+from modules.metrics import registry
+
+logger = logging.getLogger("FsWatcher")
+
+REFRESHED = registry.counter('neo_fs_watcher_refreshes_total', 'Directories re-indexed by the filesystem watcher.', ['reason'])
+
+DIR_MASK = (inotify.IN_CREATE | inotify.IN_DELETE | inotify.IN_MOVED_FROM | inotify.IN_MOVED_TO |
+            inotify.IN_CLOSE_WRITE | inotify.IN_ATTRIB | inotify.IN_DELETE_SELF | inotify.IN_MOVE_SELF |
+            inotify.IN_ONLYDIR | inotify.IN_DONT_FOLLOW | inotify.IN_EXCL_UNLINK)
+RECENT_SECONDS = 60 # activity window used to target rescans after an overflow
+
+
+class FsWatcher:
+    def __init__(self, indexer, max_watches=100000, budget_ratio=0.5, coalesce=2.0, max_delay=10.0,
+                 unwatched_interval=900):
+        """
+        max_watches: hard cap of watches; the kernel limit (fs.inotify.max_user_watches)
+        times `budget_ratio` also applies, leaving room for other programs.
+        """
+        self.indexer = indexer
+        kernel = inotify.max_user_watches()
+        self.budget = min(max_watches, int(kernel * budget_ratio)) if kernel else max_watches
+        self.coalesce = coalesce
+        self.max_delay = max_delay
+        self.unwatched_interval = unwatched_interval
+
+        self.ino = None
+        self.watches = {} # wd -> directory
+        self.paths = {} # directory -> wd
+        self.unwatched = set() # directories without a watch (budget/ENOSPC)
+        self.dirty = {} # directory -> (first event, last event)
+        self.dirty_trees = set() # directories to refresh recursively (new or moved in)
+        self.recent = {} # directory -> last event time (for overflow recovery)
+        self.last_unwatched_scan = time.time()
+        self.retry_at = 0 # index busy with a full scan: retry after this
+        self.running = False
+        self.thread = None
+        registry.gauge('neo_fs_watches', 'Directories watched by the filesystem watcher.',
+                       callback=lambda: len(self.watches))
+
+    # --- Watches ---
+
+    def _watch_tree(self, root):
+        """Watch `root` and its subdirectories breadth-first within the budget. Returns directories added."""
+        added = []
+        queue = deque([root])
+        while queue:
+            directory = queue.popleft()
+            if directory in self.paths or not self.indexer.covers(directory):
+                continue
+            if len(self.watches) >= self.budget:
+                self.unwatched.add(directory)
+                continue
+            try:
+                wd = self.ino.add_watch(directory, DIR_MASK)
+            except OSError as e:
+                if e.errno == errno.ENOSPC:
+                    logger.warning(f"inotify watch limit reached at {len(self.watches)} watches")
+                    self.budget = len(self.watches)
+                    self.unwatched.add(directory)
+                continue # EACCES, ENOENT: skip
+            self.watches[wd] = directory
+            self.paths[directory] = wd
+            self.unwatched.discard(directory)
+            added.append(directory)
+            try:
+                with os.scandir(directory) as it:
+                    for entry in it:
+                        if entry.is_dir(follow_symlinks=False):
+                            queue.append(entry.path)
+            except OSError:
+                pass
+        return added
+
+    def _forget_tree(self, directory):
+        prefix = directory.rstrip('/') + '/'
+        for path in [p for p in self.paths if p == directory or p.startswith(prefix)]:
+            wd = self.paths.pop(path)
+            self.watches.pop(wd, None)
+            try:
+                self.ino.rm_watch(wd)
+            except OSError:
+                pass
+        self.unwatched = {p for p in self.unwatched if not (p == directory or p.startswith(prefix))}
+
+    # --- Loop ---
+
+    def start(self):
+        if self.running:
+            return self
+        if not inotify.available():
+            logger.warning("inotify not available, files_index is only refreshed by periodic scans")
+            return self
+        self.ino = inotify.Inotify()
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True, name="FsWatcher")
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.running = False
+        if self.ino is not None:
+            self.ino.wake() # the idle loop blocks in read() for up to a minute
+        if self.thread:
+            self.thread.join(timeout=5)
+
+    def _run(self):
+        started = time.time()
+        for root in self.indexer.scan_paths:
+            if os.path.isdir(root):
+                self._watch_tree(root)
+        logger.info(f"Watching {len(self.watches)} directories ({len(self.unwatched)} over budget {self.budget}) "
+                    f"in {time.time() - started:.1f}s")
+        try:
+            while self.running:
+                for event in self.ino.read(self._timeout()):
+                    self._handle(event)
+                self._flush()
+                if self.unwatched and time.time() - self.last_unwatched_scan > self.unwatched_interval:
+                    self._refresh(sorted(self.unwatched), True, 'unwatched')
+                    self.last_unwatched_scan = time.time()
+        except Exception as e:
+            logger.error(f"Filesystem watcher stopped: {e}")
+        finally:
+            self.ino.close()
+            self.running = False
+
+    def _timeout(self):
+        """Sleep until the next dirty directory is due (steady state: wake only on events)."""
+        if not self.dirty:
+            return 60.0
+        now = time.time()
+        due = min(min(last + self.coalesce, first + self.max_delay) for first, last in self.dirty.values())
+        return max(0.05, due - now, self.retry_at - now)
+
+    def _mark(self, directory, tree=False):
+        now = time.time()
+        first, _ = self.dirty.get(directory, (now, now))
+        self.dirty[directory] = (first, now)
+        if tree:
+            self.dirty_trees.add(directory)
+        self.recent[directory] = now
+
+    def _handle(self, event):
+        if event.mask & inotify.IN_Q_OVERFLOW:
+            self._overflow()
+            return
+        directory = self.watches.get(event.wd)
+        if directory is None:
+            return
+        if event.mask & inotify.IN_IGNORED:
+            # Watch removed by the kernel (directory deleted or unmounted)
+            self.watches.pop(event.wd, None)
+            if self.paths.get(directory) == event.wd:
+                del self.paths[directory]
+            return
+        if event.mask & (inotify.IN_DELETE_SELF | inotify.IN_MOVE_SELF):
+            self._forget_tree(directory)
+            self._mark(directory) # refresh() drops it from the index
+            return
+
+        path = os.path.join(directory, event.name) if event.name else directory
+        if event.mask & inotify.IN_ISDIR:
+            if event.mask & (inotify.IN_CREATE | inotify.IN_MOVED_TO):
+                if self.indexer.covers(path):
+                    self._watch_tree(path) # watch first, then index: nothing created meanwhile is lost
+                    self._mark(path, tree=True)
+            elif event.mask & (inotify.IN_DELETE | inotify.IN_MOVED_FROM):
+                self._forget_tree(path)
+                self._mark(path)
+            return
+        self._mark(directory)
+
+    def _overflow(self):
+        """Events were lost: rescan recursively what changed recently instead of everything."""
+        horizon = time.time() - RECENT_SECONDS
+        active = sorted(d for d, ts in self.recent.items() if ts > horizon) or list(self.indexer.scan_paths)
+        logger.warning(f"inotify queue overflow, rescanning {len(active)} recently active directories")
+        for directory in active:
+            self._mark(directory, tree=True)
+
+    def _flush(self):
+        now = time.time()
+        if now < self.retry_at:
+            return
+        due = [d for d, (first, last) in self.dirty.items() if now - last >= self.coalesce or now - first >= self.max_delay]
+        if not due:
+            return
+        trees = [d for d in due if d in self.dirty_trees]
+        flat = [d for d in due if d not in self.dirty_trees]
+        if self._refresh(flat, False, 'event') is not False and self._refresh(trees, True, 'new_dir') is not False:
+            for directory in due:
+                self.dirty.pop(directory, None)
+                self.dirty_trees.discard(directory)
+        else:
+            self.retry_at = now + 5
+        horizon = now - RECENT_SECONDS
+        self.recent = {d: ts for d, ts in self.recent.items() if ts > horizon}
+
+    def _refresh(self, directories, recursive, reason):
+        """False when the index is busy (full scan running): directories stay dirty and are retried."""
+        if not directories:
+            return True
+        stats = self.indexer.refresh(directories, recursive=recursive, timeout=0.5)
+        if stats is None:
+            return False
+        REFRESHED.inc(len(directories), reason=reason)
+        if stats['added'] or stats['updated'] or stats['deleted']:
+            logger.debug(f"files_index refreshed ({reason}): {stats}")
+        return True
@@ -3,13 +3,28 @@ import time
 import threading
 import logging
 import os
-import psutil
-from collections import deque
+
+from modules.metrics import registry
+from modules.system_sampler import get_sampler
+from modules.config_manager import ConfigManager
+from modules.log_tailer import LogTailer, JOURNAL_SOURCE
+from modules.signature_matcher import SignatureMatcher, WindowCounter
+from modules.net_stats import collector as net_collector
 
 logger = logging.getLogger("NeoGuard")
 
+GUARD_HITS = registry.counter('neo_guard_signature_hits_total', 'Guard signature matches.', ['signature'])
+GUARD_ALERTS = registry.counter('neo_guard_alerts_total', 'Guard alerts raised (threshold reached).', ['signature'])
+
 SIGNATURES_FILE = "data/attack_signatures.json"
-AUTH_LOG_PATH = "/var/log/auth.log" # Ajustar según distro (auth.log en Debian/Ubuntu)
+SYS_LOGS_FILE = "config/sys_logs.json"
+LOG_OFFSETS_FILE = "data/log_offsets.json"
+DEFAULT_LOG_SOURCES = ["seguridad", "nginx", "apache"] # grupos de sys_logs.json
+
+# Fuente de firma -> grupos de logs que la alimentan. "log:<grupo>" apunta a un grupo concreto.
+SIGNATURE_LOG_SOURCES = {
+    'log_auth': {'seguridad', JOURNAL_SOURCE}
+}
 
 class Guard:
     def __init__(self, event_queue):
@@ -18,9 +33,13 @@ class Guard:
         self.running = False
         self.thread = None
         
-        # Estado para contadores de ventana de tiempo
-        # Estructura: { "signature_id": [timestamp1, timestamp2, ...] }
-        self.state = {} 
+        # Contadores de ventana de tiempo por (firma, clave extraída)
+        self.windows = WindowCounter()
+        self.matchers = {} # grupo de logs -> SignatureMatcher compilado
+        self.sustained = {} # firma de métrica -> desde cuándo supera el límite
+        self.state_lock = threading.Lock() # register_event llega desde el tailer y desde el bucle de métricas
+        self.config = ConfigManager().get('guard', {}) or {}
+        self.tailer = None
 
     def load_signatures(self):
         if not os.path.exists(SIGNATURES_FILE):
@@ -37,110 +56,144 @@ class Guard:
         if not self.signatures:
             return
         self.running = True
+        self.start_log_tailer()
         self.thread = threading.Thread(target=self.monitor_loop, daemon=True)
         self.thread.start()
         logger.info("Neo Guard (Sistema de Detección) iniciado.")
 
     def stop(self):
         self.running = False
+        if self.tailer:
+            self.tailer.stop()
         if self.thread:
             self.thread.join()
 
-    def monitor_loop(self):
-        # Abrir log si existe
-        log_file = None
-        if os.path.exists(AUTH_LOG_PATH):
-            try:
-                log_file = open(AUTH_LOG_PATH, 'r')
-                log_file.seek(0, 2) # Ir al final del archivo
-            except Exception as e:
-                logger.error(f"No se pudo abrir {AUTH_LOG_PATH}: {e}")
+    def start_log_tailer(self):
+        """Sigue los logs de los grupos configurados (inotify) y entrega las líneas por lotes."""
+        if not any(self._log_groups(sig) for sig in self.signatures):
+            return
+        try:
+            with open(SYS_LOGS_FILE, 'r') as f:
+                sys_logs = json.load(f)
+        except Exception as e:
+            logger.error(f"Error cargando {SYS_LOGS_FILE}: {e}")
+            sys_logs = {}
+
+        groups = self.config.get('log_sources', DEFAULT_LOG_SOURCES)
+        sources = {group: sys_logs.get(group, []) for group in groups}
+
+        # journald: 'auto' solo si no hay log de seguridad en disco (Fedora/Arch sin rsyslog)
+        journal = self.config.get('journal', 'auto')
+        if journal == 'auto':
+            journal = not any(os.path.exists(p) for p in sources.get('seguridad', []))
+
+        self.tailer = LogTailer(
+            sources, self.check_log_lines,
+            state_file=LOG_OFFSETS_FILE,
+            journal=bool(journal),
+            batch_size=self.config.get('batch_size', 200),
+            batch_interval=self.config.get('batch_interval', 0.5)
+        ).start()
+
+    def _log_groups(self, sig):
+        """Grupos de logs de los que se alimenta una firma (vacío si no es de logs)."""
+        source = sig.get('source') or ''
+        if source in SIGNATURE_LOG_SOURCES:
+            return SIGNATURE_LOG_SOURCES[source]
+        if source.startswith('log:'):
+            return {source[4:]}
+        return set()
 
+    def monitor_loop(self):
+        # Los logs llegan por eventos (LogTailer); aquí solo quedan las firmas de métricas
+        last_prune = time.time()
         while self.running:
             try:
-                # 1. Analizar Logs (Log-based Signatures)
-                if log_file:
-                    line = log_file.readline()
-                    while line:
-                        self.check_log_signatures(line)
-                        line = log_file.readline()
-
-                # 2. Analizar Sistema (Metric-based Signatures)
                 self.check_system_signatures()
-
+                if time.time() - last_prune > 300:
+                    with self.state_lock:
+                        self.windows.prune() # claves (IPs) que ya no atacan
+                    last_prune = time.time()
                 time.sleep(1) # Intervalo de chequeo
             except Exception as e:
                 logger.error(f"Error en ciclo de Neo Guard: {e}")
                 time.sleep(5)
 
-    def check_log_signatures(self, line):
+    def check_log_lines(self, source, lines):
+        """Lote de líneas nuevas de un grupo de logs (callback del LogTailer)."""
+        matcher = self.matchers.get(source)
+        if matcher is None:
+            # Un autómata por grupo con solo las firmas que lo escuchan
+            matcher = self.matchers[source] = SignatureMatcher(
+                [sig for sig in self.signatures if source in self._log_groups(sig)]
+            )
+        if not matcher.signatures:
+            return
+
         current_time = time.time()
-        
-        for sig in self.signatures:
-            if sig.get('source') == 'log_auth':
-                pattern = sig.get('pattern')
-                if pattern and pattern in line:
-                    self.register_event(sig, current_time)
+        for line in lines:
+            for sig, key, _ in matcher.match(line):
+                self.register_event(sig, current_time, key)
+
+    def check_log_signatures(self, line, source='seguridad'):
+        self.check_log_lines(source, [line])
 
     def check_system_signatures(self):
         current_time = time.time()
-        
-        # Recolectar métricas una vez
-        cpu_pct = psutil.cpu_percent(interval=None)
-        mem_pct = psutil.virtual_memory().percent
-        
-        # Contar conexiones SYN_SENT para DDoS
-        syn_sent = 0
-        try:
-            connections = psutil.net_connections()
-            for c in connections:
-                if c.status == 'SYN_SENT':
-                    syn_sent += 1
-        except:
-            pass
+        metric_sigs = [sig for sig in self.signatures if sig.get('source') in ('system_stats', 'net_stats')]
+        if not metric_sigs:
+            return
 
+        # CPU/RAM del muestreador compartido (sin llamadas extra a psutil)
+        sample = get_sampler().snapshot()
         metrics = {
-            'cpu_percent': cpu_pct,
-            'memory_percent': mem_pct,
-            'syn_sent_count': syn_sent
+            'cpu_percent': sample.get('cpu_percent', 0),
+            'memory_percent': sample.get('ram_percent', 0)
         }
 
-        for sig in self.signatures:
-            source = sig.get('source')
-            if source in ['system_stats', 'net_stats']:
-                metric_name = sig.get('metric')
-                threshold = sig.get('threshold')
-                
-                val = metrics.get(metric_name, 0)
-                if val >= threshold:
-                    # Para métricas, "evento" es que supere el umbral en este chequeo
-                    # Podríamos querer que se mantenga X tiempo, pero simplificamos:
-                    # Si supera, cuenta como 1 hit. Si la ventana es corta, saltará rápido.
-                    self.register_event(sig, current_time)
-
-    def register_event(self, sig, timestamp):
-        sig_id = sig['id']
-        window = sig.get('window_seconds', 60)
-        threshold = sig.get('threshold', 1)
-        
-        if sig_id not in self.state:
-            self.state[sig_id] = deque()
-        
-        # Añadir evento actual
-        self.state[sig_id].append(timestamp)
-        
-        # Limpiar eventos viejos fuera de la ventana
-        while self.state[sig_id] and self.state[sig_id][0] < (timestamp - window):
-            self.state[sig_id].popleft()
-            
-        # Verificar umbral
-        if len(self.state[sig_id]) >= threshold:
-            self.trigger_alert(sig)
-            # Limpiar para no repetir alerta inmediatamente (Cooldown simple)
-            self.state[sig_id].clear()
-
-    def trigger_alert(self, sig):
+        # Red: estados TCP desde /proc/net/tcp{,6} y tasas de /proc/net/snmp (sin psutil.net_connections)
+        wanted = {sig.get('metric', '') for sig in metric_sigs}
+        states = any(m.endswith('_count') for m in wanted)
+        rates = any(m.endswith('_rate') for m in wanted)
+        if states or rates:
+            metrics.update(net_collector.sample(states=states, rates=rates))
+
+        for sig in metric_sigs:
+            # 'value' es el límite de la métrica; 'threshold' el nº de hits en la ventana.
+            # Firmas antiguas sin 'value' usaban 'threshold' para ambas cosas.
+            limit = sig.get('value', sig.get('threshold'))
+            val = metrics.get(sig.get('metric'))
+            if val is None or limit is None:
+                continue
+
+            if val < limit:
+                self.sustained.pop(sig['id'], None)
+                continue
+
+            # "Sostenido N segundos": solo cuenta como hit si lleva N s por encima del límite
+            sustained = sig.get('sustained_seconds', 0)
+            if sustained:
+                since = self.sustained.setdefault(sig['id'], current_time)
+                if current_time - since < sustained:
+                    continue
+                self.sustained[sig['id']] = current_time # el siguiente hit necesita otro periodo completo
+            self.register_event(sig, current_time)
+
+    def register_event(self, sig, timestamp, key=None):
+        GUARD_HITS.inc(signature=sig['id'])
+        with self.state_lock:
+            # Ventana deslizante por (firma, clave): p.ej. por IP atacante
+            alert = self.windows.hit(sig, key, timestamp)
+        if alert:
+            self.trigger_alert(sig, alert)
+
+    def trigger_alert(self, sig, alert=None):
+        GUARD_ALERTS.inc(signature=sig['id'])
         msg = f"Alerta de Seguridad: {sig['name']} detectado."
+        if alert and alert['kind'] == 'distinct':
+            msg = f"Alerta de Seguridad: {sig['name']} desde {alert['keys']} orígenes distintos (ataque distribuido)."
+        elif alert and alert.get('key'):
+            msg = f"Alerta de Seguridad: {sig['name']} detectado ({sig.get('key')} {alert['key']})."
         logger.warning(msg)
         
         # Enviar a NeoCore para que hable
@@ -1,14 +1,19 @@
 import os
-import json
 import time
 import threading
 import logging
-from datetime import datetime
 from modules.sysadmin import SysAdminManager
+from modules.system_sampler import get_sampler
+from modules.timeseries import get_store
+from modules.systemd_client import get_systemd
+
+from modules.metrics import registry
 
 # Configure Logging
 logger = logging.getLogger("HealthManager")
 
+HEALTH_EVENTS = registry.counter('neo_health_events_total', 'Self-healing incidents by service and event.', ['service', 'event'])
+
 class HealthManager:
     """
     Gestor de Auto-curación y Mantenimiento Predictivo.
@@ -19,6 +24,8 @@ class HealthManager:
     def __init__(self, config_manager):
         self.config = config_manager
         self.sys_admin = SysAdminManager()
+        self.systemd = get_systemd()
+        self.recovery_lock = threading.Lock() # poll loop and D-Bus watcher both trigger recoveries
         self.running = False
         self.thread = None
         
@@ -38,9 +45,9 @@ class HealthManager:
             'bluetooth', 'avahi-daemon'           # Hardware/Discovery
         ]
         
-        # Historial de incidentes
-        self.history_file = 'data/health_history.json'
-        self.incident_history = self._load_history()
+        # Historial de incidentes (tabla events del almacén de series temporales;
+        # el antiguo data/health_history.json se migra en el primer arranque)
+        self.store = get_store()
         
         # Configuración de recuperación
         self.recovery_attempts = {} # {service: count}
@@ -57,14 +64,19 @@ class HealthManager:
             logger.warning("Systemd not detected (Container/Distrobox?). Disabling service auto-healing.")
             self.monitored_services = []
         else:
-            # Filter services that are not installed
+            # Filter services that are not installed (one batched query for all of them)
+            states = self.systemd.get_states(self.monitored_services)
             valid_services = []
             for srv in self.monitored_services:
-                if self.sys_admin.is_service_installed(srv):
+                if states[srv]['load'] not in ('not-found', 'unknown'):
                     valid_services.append(srv)
                 else:
                     logger.info(f"ℹ️ Skipping {srv}: Service not found on system.")
             self.monitored_services = valid_services
+
+            # Event-driven detection over D-Bus; the 30s poll stays as a safety net
+            if self.monitored_services and self.systemd.watch(self.monitored_services, self._on_unit_change):
+                logger.info("HealthManager subscribed to systemd unit signals")
             
         logger.info(f"HealthManager checking: {self.monitored_services}")
 
@@ -117,8 +129,19 @@ class HealthManager:
                     if time.time() - self.last_recovery_time[name] > self.cooldown_window:
                         self.recovery_attempts[name] = 0
 
+    def _on_unit_change(self, name, active_state, sub_state):
+        """Señal de systemd: solo 'failed' dispara la recuperación al momento.
+        'inactive' también aparece en paradas/reinicios normales y lo decide el sondeo."""
+        if active_state == 'failed':
+            logger.warning(f"⚠️ Service FAILED signal: {name} ({sub_state})")
+            self._handle_failure(name)
+
     def _handle_failure(self, service_name):
         """Intenta recuperar un servicio caído."""
+        with self.recovery_lock:
+            self._recover(service_name)
+
+    def _recover(self, service_name):
         attempts = self.recovery_attempts.get(service_name, 0)
         
         if attempts < self.max_attempts:
@@ -149,8 +172,9 @@ class HealthManager:
         """
         # Obtener estado actual
         try:
-            cpu = float(self.sys_admin.get_cpu_usage().replace('%', ''))
-            ram = float(self.sys_admin.get_ram_usage().replace('%', ''))
+            sample = get_sampler().snapshot()
+            cpu = sample.get('cpu_percent') or 0
+            ram = sample.get('ram_percent') or 0
             
             # Regla Heurística 1: Alta Carga Persistente
             if cpu > 90 or ram > 90:
@@ -160,9 +184,9 @@ class HealthManager:
             # Regla Heurística 2: Patrón de fallo recurrente (Aprendizaje simple)
             # Analizamos si fallos recientes coinciden con ciertas horas o condiciones
             # Por ahora, implementación simple basada en frecuencia.
-            recent_crashes = [i for i in self.incident_history if (time.time() - i['timestamp']) < 86400 and i['event'] == 'CRASH_DETECTED']
+            recent_crashes = self.store.count_events(since=time.time() - 86400, event='CRASH_DETECTED')
             
-            if len(recent_crashes) > 5:
+            if recent_crashes > 5:
                 logger.warning("🔮 Prediction: System instability detected. High frequency of crashes in last 24h.")
                 
         except Exception:
@@ -170,37 +194,15 @@ class HealthManager:
 
     def _log_incident(self, target, event):
         """Registra un evento en el historial con contexto del sistema."""
+        HEALTH_EVENTS.inc(service=target, event=event)
+        # Misma forma que antes ("45.0%", "52.1°C") para no romper el historial existente
+        sample = get_sampler().snapshot()
         snapshot = {
-            'cpu': self.sys_admin.get_cpu_usage(),
-            'ram': self.sys_admin.get_ram_usage(),
-            'disk': self.sys_admin.get_disk_usage(),
-            'temp': self.sys_admin.get_cpu_temp()
+            'cpu': f"{sample['cpu_percent']}%" if sample.get('cpu_percent') is not None else "N/A",
+            'ram': f"{sample['ram_percent']}%" if sample.get('ram_percent') is not None else "N/A",
+            'disk': sample.get('disk_percent') or 0,
+            'temp': f"{sample['temp']:.1f}°C" if sample.get('temp') is not None else "N/A",
+            'load': sample.get('load')
         }
         
-        entry = {
-            'timestamp': time.time(),
-            'date': datetime.now().isoformat(),
-            'target': target,
-            'event': event,
-            'context': snapshot
-        }
-        
-        self.incident_history.append(entry)
-        self._save_history()
-
-    def _load_history(self):
-        if os.path.exists(self.history_file):
-            try:
-                with open(self.history_file, 'r') as f:
-                    return json.load(f)
-            except:
-                return []
-        return []
-
-    def _save_history(self):
-        # Asegurar directorio
-        os.makedirs(os.path.dirname(self.history_file), exist_ok=True)
-        # Guardar solo los últimos 1000 eventos para no llenar disco
-        keep = self.incident_history[-1000:]
-        with open(self.history_file, 'w') as f:
-            json.dump(keep, f, indent=4)
+        self.store.log_event(target, event, snapshot, source='health')
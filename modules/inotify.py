@@ -0,0 +1,155 @@
+"""
+Minimal inotify binding (ctypes, Linux only). No third-party dependency.
+
+    ino = Inotify()
+    wd = ino.add_watch('/var/log', IN_MODIFY | IN_CREATE | IN_MOVED_TO)
+    for event in ino.read(timeout=1.0):
+        print(event.wd, event.mask, event.name)
+"""
+import os
+import errno
+import ctypes
+import ctypes.util
+import select
+import struct
+from collections import namedtuple
+
+# Event masks (linux/inotify.h)
+IN_ACCESS = 0x00000001
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_CLOSE_NOWRITE = 0x00000010
+IN_OPEN = 0x00000020
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+
+IN_UNMOUNT = 0x00002000
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+
+IN_ONLYDIR = 0x01000000
+IN_DONT_FOLLOW = 0x02000000
+IN_EXCL_UNLINK = 0x04000000
+IN_MASK_ADD = 0x20000000
+IN_ISDIR = 0x40000000
+
+IN_CLOEXEC = 0o2000000
+IN_NONBLOCK = 0o4000
+
+IN_MOVE = IN_MOVED_FROM | IN_MOVED_TO
+
+_EVENT_HEADER = struct.Struct('iIII') # wd, mask, cookie, len
+READ_SIZE = 64 * 1024
+
+Event = namedtuple('Event', ['wd', 'mask', 'cookie', 'name'])
+
+_libc = None
+
+
+def _load_libc():
+    global _libc
+    if _libc is None:
+        _libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        _libc.inotify_init1.argtypes = [ctypes.c_int]
+        _libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        _libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+    return _libc
+
+
+def available():
+    """True when the platform provides inotify."""
+    try:
+        return hasattr(_load_libc(), 'inotify_init1')
+    except OSError:
+        return False
+
+
+def max_user_watches():
+    """The kernel per-user watch limit (fs.inotify.max_user_watches), None if unknown."""
+    try:
+        with open('/proc/sys/fs/inotify/max_user_watches') as f:
+            return int(f.read())
+    except (OSError, ValueError):
+        return None
+
+
+class Inotify:
+    def __init__(self):
+        self.libc = _load_libc()
+        self.fd = self.libc.inotify_init1(IN_CLOEXEC | IN_NONBLOCK)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        # Self-pipe: wake() interrupts a read() blocked in select from another thread
+        self._wake_r, self._wake_w = os.pipe2(os.O_NONBLOCK | os.O_CLOEXEC)
+
+    def fileno(self):
+        return self.fd
+
+    def add_watch(self, path, mask):
+        """Watch descriptor for `path`. Re-adding a path returns the same wd (mask replaced)."""
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, f"inotify_add_watch({path}): {os.strerror(err)}")
+        return wd
+
+    def rm_watch(self, wd):
+        if self.libc.inotify_rm_watch(self.fd, wd) < 0:
+            err = ctypes.get_errno()
+            if err != errno.EINVAL: # already gone (file deleted -> IN_IGNORED)
+                raise OSError(err, os.strerror(err))
+
+    def wake(self):
+        """Make a pending or the next read() return [] at once (thread-safe)."""
+        if self.fd < 0:
+            return # closed: never write to a descriptor number that may have been reused
+        try:
+            os.write(self._wake_w, b'\0')
+        except OSError:
+            pass # pipe full: a wake-up is already pending
+
+    def read(self, timeout=None):
+        """Pending events, waiting up to `timeout` seconds (None blocks). [] on timeout or wake()."""
+        ready, _, _ = select.select([self.fd, self._wake_r], [], [], timeout)
+        if self._wake_r in ready:
+            try:
+                while os.read(self._wake_r, 512):
+                    pass
+            except BlockingIOError:
+                pass
+            return []
+        if not ready:
+            return []
+        try:
+            data = os.read(self.fd, READ_SIZE)
+        except BlockingIOError:
+            return []
+
+        events = []
+        pos = 0
+        while pos + _EVENT_HEADER.size <= len(data):
+            wd, mask, cookie, length = _EVENT_HEADER.unpack_from(data, pos)
+            pos += _EVENT_HEADER.size
+            name = data[pos:pos + length].rstrip(b'\0')
+            pos += length
+            events.append(Event(wd, mask, cookie, os.fsdecode(name)))
+        return events
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            os.close(self._wake_r)
+            os.close(self._wake_w)
+            self.fd = -1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,310 @@
+import os
+import sys
+import json
+import queue
+import socket
+import struct
+import base64
+import logging
+import threading
+
+# Add root to path (so the broker can be started as a script)
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+
+from modules.bus_routing import SubscriptionRegistry, TopicStats, broker_reply
+
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    msgpack = None
+    MSGPACK_AVAILABLE = False
+
+logger = logging.getLogger("IPCBus")
+
+DEFAULT_SOCKET_PATH = "/tmp/neo_bus.sock"
+
+# Frame: [u32 length of the rest][u8 op][u16 topic length][topic utf-8][body]
+# The broker only parses the header, so published frames are forwarded as-is
+# to subscribers without deserializing (or copying) the payload.
+HEADER = struct.Struct('!IBH')
+OP_PUB = 1
+OP_SUB = 2
+OP_UNSUB = 3
+OP_HELLO = 4
+
+STATS_REQUEST_TOPIC = 'bus:get_stats'
+STATS_TOPIC = 'bus:stats'
+
+
+def pack(obj):
+    """Serialize a message body. msgpack keeps bytes binary; JSON fallback base64-encodes them."""
+    if MSGPACK_AVAILABLE:
+        return msgpack.packb(obj, use_bin_type=True)
+    return json.dumps(obj, default=_json_default).encode('utf-8')
+
+
+def unpack(data):
+    if MSGPACK_AVAILABLE:
+        return msgpack.unpackb(data, raw=False)
+    return json.loads(bytes(data).decode('utf-8'), object_hook=_json_hook)
+
+
+def _json_default(obj):
+    if isinstance(obj, (bytes, bytearray, memoryview)):
+        return {'__bytes__': base64.b64encode(bytes(obj)).decode('ascii')}
+    raise TypeError(f"Not serializable: {type(obj)}")
+
+
+def _json_hook(obj):
+    if len(obj) == 1 and '__bytes__' in obj:
+        return base64.b64decode(obj['__bytes__'])
+    return obj
+
+
+def build_frame(op, topic='', body=b''):
+    topic_bytes = topic.encode('utf-8')
+    return HEADER.pack(HEADER.size - 4 + len(topic_bytes) + len(body), op, len(topic_bytes)) + topic_bytes + body
+
+
+def _recv_exact(sock, n):
+    buf = bytearray(n)
+    view = memoryview(buf)
+    got = 0
+    while got < n:
+        r = sock.recv_into(view[got:], n - got)
+        if r == 0:
+            raise ConnectionError("socket closed")
+        got += r
+    return buf
+
+
+def read_frame(sock):
+    """Returns (op, topic, body, raw_frame)."""
+    header = _recv_exact(sock, HEADER.size)
+    length, op, topic_len = HEADER.unpack(header)
+    rest = _recv_exact(sock, length - (HEADER.size - 4))
+    topic = rest[:topic_len].decode('utf-8')
+    body = memoryview(rest)[topic_len:]
+    return op, topic, body, bytes(header) + bytes(rest)
+
+
+class _BrokerClient:
+    """Connected peer. Outgoing frames go through a bounded queue so one slow
+    subscriber can't stall routing for everyone else."""
+    def __init__(self, conn, client_id, max_queue=2000):
+        self.conn = conn
+        self.id = client_id
+        self.name = f"client-{client_id}"
+        self.outbox = queue.Queue(maxsize=max_queue)
+        self.alive = True
+        self.writer = threading.Thread(target=self._write_loop, daemon=True)
+        self.writer.start()
+
+    def send(self, frame):
+        try:
+            self.outbox.put_nowait(frame)
+            return True
+        except queue.Full:
+            return False
+
+    def _write_loop(self):
+        while self.alive:
+            frame = self.outbox.get()
+            if frame is None:
+                break
+            try:
+                self.conn.sendall(frame)
+            except OSError:
+                self.alive = False
+                break
+
+    def close(self):
+        self.alive = False
+        try:
+            self.outbox.put_nowait(None)
+        except queue.Full:
+            pass
+        try:
+            self.conn.close()
+        except OSError:
+            pass
+
+
+class IPCBroker:
+    """
+    Unix domain socket broker with server-side topic filtering.
+    Also usable in-process as a stand-in broker for tools and benchmarks.
+    """
+    def __init__(self, path=DEFAULT_SOCKET_PATH):
+        self.path = path
+        self.registry = SubscriptionRegistry()
+        self.stats = TopicStats()
+        self.clients = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self._server = None
+        self.running = False
+
+    def start(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self._server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._server.bind(self.path)
+        os.chmod(self.path, 0o660)
+        self._server.listen(64)
+        self.running = True
+        threading.Thread(target=self._accept_loop, daemon=True, name="IPCBroker").start()
+        logger.info(f"IPC bus listening on {self.path}")
+
+    def serve_forever(self):
+        self.start()
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+    def stop(self):
+        self.running = False
+        try:
+            self._server.close()
+        except Exception:
+            pass
+        for client in list(self.clients.values()):
+            client.close()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    def _accept_loop(self):
+        while self.running:
+            try:
+                conn, _ = self._server.accept()
+            except OSError:
+                break
+            with self._lock:
+                self._next_id += 1
+                client = _BrokerClient(conn, self._next_id)
+                self.clients[client.id] = client
+            threading.Thread(target=self._client_loop, args=(client,), daemon=True).start()
+
+    def _client_loop(self, client):
+        try:
+            while self.running and client.alive:
+                op, topic, body, frame = read_frame(client.conn)
+                if op == OP_PUB:
+                    self._route(client, topic, body, frame)
+                elif op == OP_SUB:
+                    self.registry.subscribe(client.id, unpack(body))
+                elif op == OP_UNSUB:
+                    self.registry.unsubscribe(client.id, unpack(body))
+                elif op == OP_HELLO:
+                    client.name = unpack(body).get('name', client.name)
+                    logger.info(f"{client.name} connected")
+        except (ConnectionError, OSError):
+            pass
+        except Exception as e:
+            logger.error(f"Broker error ({client.name}): {e}")
+        finally:
+            logger.info(f"{client.name} disconnected")
+            self.registry.unsubscribe(client.id)
+            with self._lock:
+                self.clients.pop(client.id, None)
+            client.close()
+
+    def _route(self, sender, topic, body, frame):
+        if topic == STATS_REQUEST_TOPIC:
+            # Answered by the broker itself: the only published body it deserializes
+            try:
+                request = unpack(body)
+            except Exception:
+                request = {}
+            reply_topic, reply = broker_reply(request, self.stats.snapshot(), 'IPCBroker', STATS_TOPIC)
+            sender.send(build_frame(OP_PUB, reply_topic, pack(reply)))
+            return
+
+        delivered = 0
+        for client_id in self.registry.match(topic):
+            if client_id == sender.id:
+                continue
+            client = self.clients.get(client_id)
+            if client and client.send(frame):
+                delivered += 1
+        self.stats.record(topic, len(frame), delivered)
+
+
+class IPCTransport:
+    """Client side of the IPC bus, used by BusClient when bus.transport is 'ipc'."""
+    def __init__(self, path, name, on_message, on_connect=None, on_disconnect=None):
+        self.path = path
+        self.name = name
+        self.on_message = on_message
+        self.on_connect = on_connect
+        self.on_disconnect = on_disconnect
+        self.sock = None
+        self.connected = False
+        self._send_lock = threading.Lock()
+        self._reader = None
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(self.path)
+        self.sock = sock
+        self.connected = True
+        self._send(build_frame(OP_HELLO, body=pack({'name': self.name})))
+        self._reader = threading.Thread(target=self._read_loop, daemon=True, name=f"IPC_{self.name}")
+        self._reader.start()
+        if self.on_connect:
+            self.on_connect()
+
+    def _send(self, frame):
+        with self._send_lock:
+            self.sock.sendall(frame)
+
+    def publish(self, topic, payload):
+        self._send(build_frame(OP_PUB, topic, pack(payload)))
+
+    def subscribe(self, topics):
+        if topics:
+            self._send(build_frame(OP_SUB, body=pack(list(topics))))
+
+    def unsubscribe(self, topics):
+        if topics:
+            self._send(build_frame(OP_UNSUB, body=pack(list(topics))))
+
+    def _read_loop(self):
+        try:
+            while self.connected:
+                op, topic, body, _ = read_frame(self.sock)
+                if op == OP_PUB:
+                    self.on_message(unpack(body))
+        except (ConnectionError, OSError):
+            pass
+        except Exception as e:
+            logger.error(f"[{self.name}] IPC read error: {e}")
+        finally:
+            was_connected = self.connected
+            self.connected = False
+            if was_connected and self.on_disconnect:
+                self.on_disconnect()
+
+    def wait(self):
+        if self._reader:
+            self._reader.join()
+
+    def close(self):
+        self.connected = False
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+            self.sock.close()
+        except Exception:
+            pass
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - [IPC BUS] - %(levelname)s - %(message)s')
+    path = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_SOCKET_PATH
+    if not MSGPACK_AVAILABLE:
+        logger.warning("msgpack not installed: using JSON framing (slower, bytes are base64-encoded).")
+    IPCBroker(path).serve_forever()
@@ -0,0 +1,181 @@
+import os
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger("LazyLoader")
+
+WARMUP_THREAD_NAME = "Warmup"
+
+
+class LazyProxy:
+    """
+    Stand-in for a heavy manager. The real object is built by `factory` on the
+    first attribute access, or earlier by the registry warm-up thread.
+    Concurrent callers block on the same load instead of building twice.
+
+    A factory that raises or returns None leaves the proxy falsy, so existing
+    `if self.manager:` checks keep working.
+    """
+    def __init__(self, name, factory):
+        object.__setattr__(self, '_lazy_name', name)
+        object.__setattr__(self, '_lazy_factory', factory)
+        object.__setattr__(self, '_lazy_instance', None)
+        object.__setattr__(self, '_lazy_failed', False)
+        object.__setattr__(self, '_lazy_lock', threading.Lock())
+        object.__setattr__(self, '_lazy_elapsed', None)
+        object.__setattr__(self, '_lazy_on_demand', False)
+
+    def _lazy_load(self):
+        if self._lazy_instance is not None or self._lazy_failed:
+            return self._lazy_instance
+
+        with self._lazy_lock:
+            if self._lazy_instance is None and not self._lazy_failed:
+                on_demand = threading.current_thread().name != WARMUP_THREAD_NAME
+                start = time.perf_counter()
+                try:
+                    instance = self._lazy_factory()
+                except Exception as e:
+                    logger.error(f"Failed to load {self._lazy_name}: {e}")
+                    instance = None
+                elapsed = time.perf_counter() - start
+
+                object.__setattr__(self, '_lazy_elapsed', elapsed)
+                object.__setattr__(self, '_lazy_on_demand', on_demand)
+                if instance is None:
+                    object.__setattr__(self, '_lazy_failed', True)
+                else:
+                    object.__setattr__(self, '_lazy_instance', instance)
+                    logger.info(f"{self._lazy_name} loaded in {elapsed:.2f}s{' (on demand)' if on_demand else ''}")
+        return self._lazy_instance
+
+    def __getattr__(self, attr):
+        instance = self._lazy_load()
+        if instance is None:
+            raise AttributeError(f"{self._lazy_name} is not available ('{attr}')")
+        return getattr(instance, attr)
+
+    def __setattr__(self, attr, value):
+        instance = self._lazy_load()
+        if instance is None:
+            raise AttributeError(f"{self._lazy_name} is not available ('{attr}')")
+        setattr(instance, attr, value)
+
+    def __bool__(self):
+        # Not loaded yet still counts as available; only a failed load is falsy
+        return not self._lazy_failed
+
+    def __repr__(self):
+        state = 'loaded' if self._lazy_instance is not None else 'failed' if self._lazy_failed else 'pending'
+        return f"<LazyProxy {self._lazy_name} ({state})>"
+
+
+def is_loaded(obj):
+    """True for real objects and loaded proxies. Never triggers a load."""
+    if isinstance(obj, LazyProxy):
+        return obj._lazy_instance is not None
+    return obj is not None
+
+
+def unwrap(obj):
+    """The real object behind a proxy (loading it if needed)."""
+    if isinstance(obj, LazyProxy):
+        return obj._lazy_load()
+    return obj
+
+
+class ServiceRegistry:
+    """
+    Startup bookkeeping: lazy services, a prioritized warm-up queue that runs
+    in the background once the assistant is listening, and phase timings.
+    Lower priority values warm up first.
+    """
+    def __init__(self):
+        self.proxies = {}
+        self.tasks = [] # (priority, seq, name, fn)
+        self.phases = []
+        self.milestones = {}
+        self.task_timings = {}
+        self.started = time.perf_counter()
+        self.warmup_thread = None
+
+    def lazy(self, name, factory, priority=None):
+        """Register a lazy service. With a priority it is also queued for warm-up."""
+        return self.add(LazyProxy(name, factory), priority)
+
+    def add(self, proxy, priority=None):
+        """Track a proxy created elsewhere (e.g. inside a manager)."""
+        self.proxies[proxy._lazy_name] = proxy
+        if priority is not None:
+            self.schedule(proxy._lazy_name, proxy._lazy_load, priority)
+        return proxy
+
+    def schedule(self, name, fn, priority=50):
+        """Queue a background startup task (discovery, indexing, ingestion...)."""
+        self.tasks.append((priority, len(self.tasks), name, fn))
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.phases.append((name, elapsed))
+            logger.info(f"Startup phase '{name}': {elapsed:.2f}s")
+
+    def mark(self, milestone):
+        """Record the time since startup of a milestone (e.g. 'listening')."""
+        elapsed = time.perf_counter() - self.started
+        self.milestones[milestone] = elapsed
+        logger.info(f"Startup milestone '{milestone}' at {elapsed:.2f}s")
+        return elapsed
+
+    def warm_up(self, background=True, delay=0.0):
+        """Run the queued tasks by priority, in a low-priority thread by default."""
+        if not background:
+            self._run_tasks()
+            return
+        self.warmup_thread = threading.Thread(target=self._run_tasks, args=(delay,), daemon=True, name=WARMUP_THREAD_NAME)
+        self.warmup_thread.start()
+
+    def _run_tasks(self, delay=0.0):
+        if threading.current_thread().name == WARMUP_THREAD_NAME:
+            try:
+                # Keep model loading from starving the audio threads (Linux: per-thread nice)
+                os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 10)
+            except (AttributeError, OSError):
+                pass
+        if delay:
+            time.sleep(delay)
+
+        for priority, _, name, fn in sorted(self.tasks):
+            start = time.perf_counter()
+            try:
+                fn()
+            except Exception as e:
+                logger.error(f"Warm-up task '{name}' failed: {e}")
+            self.task_timings[name] = time.perf_counter() - start
+        self.tasks = []
+        self.mark('warm')
+        logger.info(f"Warm-up complete: {self.summary()}")
+
+    def report(self):
+        return {
+            'phases': {name: round(elapsed, 3) for name, elapsed in self.phases},
+            'milestones': {name: round(elapsed, 3) for name, elapsed in self.milestones.items()},
+            'tasks': {name: round(elapsed, 3) for name, elapsed in self.task_timings.items()},
+            'services': {
+                name: {
+                    'loaded': proxy._lazy_instance is not None,
+                    'failed': proxy._lazy_failed,
+                    'load_seconds': round(proxy._lazy_elapsed, 3) if proxy._lazy_elapsed is not None else None,
+                    'on_demand': proxy._lazy_on_demand
+                } for name, proxy in self.proxies.items()
+            }
+        }
+
+    def summary(self):
+        return ", ".join(f"{name} {elapsed:.2f}s" for name, elapsed in self.task_timings.items())
@@ -0,0 +1,342 @@
+"""
+Multi-file log tailer for Guard.
+
+Follows several log files (and optionally journald) and hands new lines to a
+callback in batches: callback(source, [lines]).
+
+- inotify on the parent directories, so rotated files (rename + create),
+  files created later and in-place truncation (copytruncate) are all seen.
+  Without inotify it falls back to stat polling.
+- When a file is rotated the old handle is drained before switching.
+- The offset (and inode) of every file, plus the journald cursor, are
+  persisted after each delivered batch. A restart resumes where it stopped,
+  including the tail of a file rotated meanwhile (<path>.1), without
+  re-delivering lines. Files never seen before start at the end.
+"""
+import os
+import json
+import time
+import logging
+import threading
+import subprocess
+
+from modules import inotify
+from modules.metrics import registry
+
+logger = logging.getLogger("LogTailer")
+
+TAILED_LINES = registry.counter('neo_log_tailer_lines_total', 'Log lines read by the tailer.', ['source'])
+
+DIR_MASK = (inotify.IN_MODIFY | inotify.IN_CREATE | inotify.IN_MOVED_TO |
+            inotify.IN_MOVED_FROM | inotify.IN_DELETE | inotify.IN_ONLYDIR)
+JOURNAL_SOURCE = 'journal'
+RESCAN_SECONDS = 30 # stat every file now and then, in case an event was missed
+MAX_LINE = 64 * 1024
+
+
+class TailedFile:
+    def __init__(self, path, source):
+        self.path = path
+        self.source = source
+        self.fh = None
+        self.inode = None
+        self.offset = 0
+        self.partial = b''
+        self.warned = False
+
+    def open(self, offset=None):
+        """Open the current file. offset=None starts at the end."""
+        self.close()
+        try:
+            self.fh = open(self.path, 'rb')
+        except OSError as e:
+            if not self.warned and os.path.exists(self.path):
+                logger.warning(f"Cannot read {self.path}: {e}")
+                self.warned = True
+            return False
+        st = os.fstat(self.fh.fileno())
+        self.inode = st.st_ino
+        self.offset = st.st_size if offset is None or offset > st.st_size else offset
+        self.partial = b''
+        self.warned = False
+        return True
+
+    def read_lines(self):
+        """Complete lines appended since the last read (handles truncation)."""
+        if self.fh is None:
+            return []
+        try:
+            size = os.fstat(self.fh.fileno()).st_size
+        except OSError:
+            return []
+        if size < self.offset:
+            logger.info(f"{self.path} truncated, reading from the start")
+            self.offset = 0
+            self.partial = b''
+        if size == self.offset:
+            return []
+
+        self.fh.seek(self.offset)
+        data = self.fh.read(size - self.offset)
+        self.offset += len(data)
+        chunks = (self.partial + data).split(b'\n')
+        self.partial = chunks.pop()
+        if len(self.partial) > MAX_LINE:
+            chunks.append(self.partial)
+            self.partial = b''
+        return [c.decode('utf-8', 'replace') for c in chunks if c]
+
+    def rotated(self):
+        """True when the path now points to another file (or nothing)."""
+        try:
+            return os.stat(self.path).st_ino != self.inode
+        except OSError:
+            return True
+
+    def close(self):
+        if self.fh is not None:
+            self.fh.close()
+            self.fh = None
+
+
+class LogTailer:
+    def __init__(self, sources, callback, state_file="data/log_offsets.json", journal=False,
+                 batch_size=200, batch_interval=0.5, poll_interval=2.0):
+        """
+        sources: {source name: [paths]} (e.g. groups of config/sys_logs.json).
+        journal: also follow journald (source 'journal').
+        """
+        self.callback = callback
+        self.state_file = state_file
+        self.journal = journal
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self.poll_interval = poll_interval
+
+        self.files = {}
+        for source, paths in sources.items():
+            for path in paths:
+                path = os.path.abspath(path)
+                self.files.setdefault(path, TailedFile(path, source))
+
+        self.state = self._load_state()
+        self.journal_cursor = self.state.get('__journal_cursor__') # last delivered entry (persisted)
+        self.read_cursor = self.journal_cursor # last entry read from journalctl
+        self.pending_cursor = None
+        self.pending = {}
+        self.pending_count = 0
+        self.pending_since = None
+        self.lock = threading.Lock()
+        self.dirty = False
+        self.running = False
+        self.thread = None
+        self.journal_proc = None
+
+    # --- State ---
+
+    def _load_state(self):
+        try:
+            with open(self.state_file) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save_state(self):
+        state = {path: {'inode': f.inode, 'offset': f.offset} for path, f in self.files.items() if f.inode}
+        if self.journal_cursor:
+            state['__journal_cursor__'] = self.journal_cursor
+        try:
+            os.makedirs(os.path.dirname(self.state_file) or '.', exist_ok=True)
+            tmp = self.state_file + '.tmp'
+            with open(tmp, 'w') as f:
+                json.dump(state, f)
+            os.replace(tmp, self.state_file)
+        except OSError as e:
+            logger.error(f"Cannot save log offsets: {e}")
+        self.dirty = False
+
+    def _resume(self, tailed):
+        """Open a file at its persisted offset, draining a copy rotated while we were down."""
+        saved = self.state.get(tailed.path)
+        if not saved:
+            tailed.open() # never seen: start at the end, do not alert on old history
+            return
+        try:
+            inode = os.stat(tailed.path).st_ino
+        except OSError:
+            return
+        if inode == saved['inode']:
+            tailed.open(saved['offset'])
+            return
+
+        rotated = tailed.path + '.1'
+        try:
+            if os.stat(rotated).st_ino == saved['inode']:
+                old = TailedFile(rotated, tailed.source)
+                if old.open(saved['offset']):
+                    self._add_lines(tailed.source, old.read_lines())
+                    old.close()
+        except OSError:
+            pass
+        tailed.open(0) # new file since the last run: everything is unseen
+
+    # --- Batching ---
+
+    def _add_lines(self, source, lines, cursor=None):
+        if not lines:
+            return
+        with self.lock:
+            self.pending.setdefault(source, []).extend(lines)
+            if cursor:
+                self.pending_cursor = cursor
+            self.pending_count += len(lines)
+            if self.pending_since is None:
+                self.pending_since = time.time()
+            self.dirty = True
+        TAILED_LINES.inc(len(lines), source=source)
+
+    def flush(self, force=False):
+        with self.lock:
+            if not self.pending_count:
+                return
+            if not force and self.pending_count < self.batch_size and time.time() - self.pending_since < self.batch_interval:
+                return
+            pending, self.pending = self.pending, {}
+            cursor, self.pending_cursor = self.pending_cursor, None
+            self.pending_count = 0
+            self.pending_since = None
+
+        for source, lines in pending.items():
+            try:
+                self.callback(source, lines)
+            except Exception as e:
+                logger.error(f"Log callback failed for {source}: {e}")
+        if cursor:
+            self.journal_cursor = cursor
+        # Offsets are persisted only once their lines have been delivered, after every
+        # batch (at most one small write per batch_interval): a crash re-delivers nothing
+        if self.dirty:
+            self.save_state()
+
+    # --- Files ---
+
+    def _read(self, tailed):
+        if tailed.fh is None:
+            if os.path.exists(tailed.path):
+                tailed.open(0) # appeared after start (created or rotated in)
+            else:
+                return
+        elif tailed.rotated():
+            # Drain what was written to the old file before it was moved, then switch
+            self._add_lines(tailed.source, tailed.read_lines())
+            if not tailed.open(0):
+                tailed.close()
+            logger.info(f"{tailed.path} rotated")
+        self._add_lines(tailed.source, tailed.read_lines())
+
+    def _check_all(self):
+        for tailed in self.files.values():
+            self._read(tailed)
+
+    # --- Loop ---
+
+    def start(self):
+        if self.running:
+            return self
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True, name="LogTailer")
+        self.thread.start()
+        if self.journal:
+            threading.Thread(target=self._journal_loop, daemon=True, name="JournalTailer").start()
+        return self
+
+    def stop(self):
+        self.running = False
+        if self.journal_proc:
+            self.journal_proc.terminate()
+        if self.thread:
+            self.thread.join(timeout=5)
+
+    def _run(self):
+        for tailed in self.files.values():
+            self._resume(tailed)
+        self._check_all() # lines written while we were down
+        logger.info(f"Tailing {sum(1 for f in self.files.values() if f.fh)} of {len(self.files)} log files"
+                    f"{' + journald' if self.journal else ''}")
+
+        watcher, watches = None, {}
+        if inotify.available():
+            try:
+                watcher = inotify.Inotify()
+                for directory in {os.path.dirname(p) for p in self.files}:
+                    try:
+                        watches[watcher.add_watch(directory, DIR_MASK)] = directory
+                    except OSError as e:
+                        logger.debug(f"Not watching {directory}: {e}")
+            except OSError as e:
+                logger.warning(f"inotify unavailable, polling logs every {self.poll_interval}s: {e}")
+                watcher = None
+
+        last_scan = time.time()
+        try:
+            while self.running:
+                if watcher:
+                    timeout = self.batch_interval if self.pending_count else 1.0
+                    for event in watcher.read(timeout):
+                        if event.mask & inotify.IN_Q_OVERFLOW:
+                            self._check_all()
+                            continue
+                        directory = watches.get(event.wd)
+                        tailed = self.files.get(os.path.join(directory, event.name)) if directory else None
+                        if tailed:
+                            self._read(tailed)
+                    if time.time() - last_scan > RESCAN_SECONDS:
+                        self._check_all()
+                        last_scan = time.time()
+                else:
+                    self._check_all()
+                    time.sleep(self.poll_interval)
+                self.flush()
+        except Exception as e:
+            logger.error(f"Log tailer stopped: {e}")
+        finally:
+            self.flush(force=True)
+            self.save_state()
+            if watcher:
+                watcher.close()
+            for tailed in self.files.values():
+                tailed.close()
+
+    # --- journald ---
+
+    def _journal_loop(self):
+        """Follow journald as JSON, tracking __CURSOR ourselves so restarts resume exactly."""
+        while self.running:
+            cmd = ['journalctl', '--follow', '--output=json', '--no-pager']
+            cmd += [f'--after-cursor={self.read_cursor}'] if self.read_cursor else ['--lines=0']
+            try:
+                self.journal_proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+            except OSError as e:
+                logger.warning(f"journalctl not available: {e}")
+                return
+
+            for raw in self.journal_proc.stdout:
+                try:
+                    entry = json.loads(raw)
+                except ValueError:
+                    continue
+                self.read_cursor = entry.get('__CURSOR') or self.read_cursor
+                message = entry.get('MESSAGE')
+                if isinstance(message, list): # non UTF-8 payloads come as byte arrays
+                    message = bytes(message).decode('utf-8', 'replace')
+                if message:
+                    # Rendered like syslog writes auth.log (the signatures are written for it): only
+                    # SYSLOG_PID, which sudo does not set ("sudo: pam_unix(...)"), never the trusted _PID
+                    ident = entry.get('SYSLOG_IDENTIFIER') or entry.get('_COMM') or '?'
+                    pid = entry.get('SYSLOG_PID')
+                    line = f"{ident}[{pid}]: {message}" if pid else f"{ident}: {message}"
+                    self._add_lines(JOURNAL_SOURCE, [line], cursor=self.read_cursor)
+
+            self.journal_proc.wait()
+            if self.running:
+                time.sleep(5) # journalctl exited (journal rotated/vacuumed): restart from the cursor
@@ -28,9 +28,13 @@ except (ImportError, RuntimeError):
 import torch
 from transformers import AutoTokenizer, AutoModelForSeq2SeqLM
 
+from modules.metrics import registry
+
 # Setup Logging
 logger = logging.getLogger("MangoManager")
 
+INFERENCE_SECONDS = registry.histogram('neo_mango_inference_seconds', 'MANGO T5 inference time (tokenize + beam search + decode).')
+
 class MangoManager:
     """
     Gestor para el modelo MANGO T5 (Sysadmin AI).
@@ -92,21 +96,22 @@ class MangoManager:
             # Preprocessing simple
             input_text = text.strip()
             
-            # Tokenize
-            input_ids = self.tokenizer.encode(input_text, return_tensors="pt").to(self.device)
-            
-            # Generate
-            outputs = self.model.generate(
-                input_ids, 
-                max_length=128, 
-                num_beams=5, # Beam search para mejor calidad
-                early_stopping=True,
-                return_dict_in_generate=True, 
-                output_scores=True
-            )
-            
-            # Decode
-            command = self.tokenizer.decode(outputs.sequences[0], skip_special_tokens=True)
+            with INFERENCE_SECONDS.time():
+                # Tokenize
+                input_ids = self.tokenizer.encode(input_text, return_tensors="pt").to(self.device)
+                
+                # Generate
+                outputs = self.model.generate(
+                    input_ids, 
+                    max_length=128, 
+                    num_beams=5, # Beam search para mejor calidad
+                    early_stopping=True,
+                    return_dict_in_generate=True, 
+                    output_scores=True
+                )
+                
+                # Decode
+                command = self.tokenizer.decode(outputs.sequences[0], skip_special_tokens=True)
             
             # Calcular confianza aproximada (simple heuristic based on sequence score)
             # T5 gen logs scores, but for now we trust the top beam.
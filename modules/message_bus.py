@@ -3,9 +3,17 @@ import eventlet
 eventlet.monkey_patch()
 
 import logging
-from flask import Flask
+import os
+import sys
+import threading
+from flask import Flask, jsonify, request
 from flask_socketio import SocketIO, emit
 
+# Add root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+
+from modules.bus_routing import SubscriptionRegistry, TopicStats, estimate_size, broker_reply
+
 # Configure Logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - [BUS] - %(levelname)s - %(message)s')
 logger = logging.getLogger("MessageBus")
@@ -16,18 +24,51 @@ class MessageBus:
         self.port = port
         self.app = Flask(__name__)
         self.socketio = SocketIO(self.app, cors_allowed_origins="*", async_mode='eventlet')
+
+        # Topic routing: clients that declared subscriptions only get matching messages.
+        # Clients that never subscribe (legacy tools, monitor_bus.py) keep getting everything.
+        self.registry = SubscriptionRegistry()
+        self.stats = TopicStats()
+        self.legacy_sids = set()
+        self.client_names = {}
+        self._lock = threading.Lock()
         
         self.setup_routes()
 
     def setup_routes(self):
         @self.socketio.on('connect')
         def handle_connect():
+            with self._lock:
+                self.legacy_sids.add(request.sid)
             logger.info("Client connected")
 
         @self.socketio.on('disconnect')
         def handle_disconnect():
+            with self._lock:
+                self.legacy_sids.discard(request.sid)
+                self.client_names.pop(request.sid, None)
+            self.registry.unsubscribe(request.sid)
             logger.info("Client disconnected")
 
+        @self.socketio.on('subscribe')
+        def handle_subscribe(data):
+            """{"topics": ["speak", "recognizer_loop:*"], "name": "TTSService"}"""
+            topics = data.get('topics', [])
+            with self._lock:
+                self.legacy_sids.discard(request.sid)
+                if data.get('name'):
+                    self.client_names[request.sid] = data['name']
+            self.registry.subscribe(request.sid, topics)
+            logger.info(f"{self.client_names.get(request.sid, request.sid)} subscribed to {len(topics)} topics")
+
+        @self.socketio.on('unsubscribe')
+        def handle_unsubscribe(data):
+            self.registry.unsubscribe(request.sid, data.get('topics', []))
+
+        @self.app.route('/stats')
+        def stats():
+            return jsonify(self.get_stats())
+
         @self.socketio.on('message')
         def handle_message(data):
             """
@@ -39,15 +80,37 @@ class MessageBus:
             }
             """
             msg_type = data.get('type', 'unknown')
-            # logger.debug(f"Bus received: {msg_type}")
-            # Broadcast back to all clients (including sender, or exclude if needed)
-            # OVOS bus usually broadcasts to everyone.
-            emit('message', data, broadcast=True, include_self=False)
+
+            if msg_type == 'bus:get_stats':
+                # Answered by the broker itself, only to the requester
+                _, reply = broker_reply(data, self.get_stats(), 'MessageBus', 'bus:stats')
+                emit('message', reply)
+                return
+
+            with self._lock:
+                targets = set(self.legacy_sids)
+            targets |= self.registry.match(msg_type)
+            targets.discard(request.sid)
+
+            for sid in targets:
+                emit('message', data, to=sid)
+            self.stats.record(msg_type, estimate_size(data), len(targets))
+
+    def get_stats(self):
+        snapshot = self.stats.snapshot()
+        with self._lock:
+            snapshot['clients'] = {
+                'subscribed': {self.client_names.get(sid, sid): self.registry.subscriptions(sid)
+                               for sid in list(self.client_names)},
+                'legacy': len(self.legacy_sids)
+            }
+        return snapshot
 
     def run(self):
         logger.info(f"Starting Message Bus on {self.host}:{self.port}")
         self.socketio.run(self.app, host=self.host, port=self.port)
 
 if __name__ == "__main__":
-    bus = MessageBus()
+    from modules.config_manager import ConfigManager
+    bus = MessageBus(port=(ConfigManager().get('bus', {}) or {}).get('port', 8181))
     bus.run()
@@ -0,0 +1,114 @@
+"""
+Cheap network statistics from /proc for Guard.
+
+Counts TCP sockets per state straight from /proc/net/tcp and tcp6 (no per-process
+inode resolution as in psutil.net_connections), and turns the /proc/net/snmp
+and /proc/net/netstat counters into per-second rates.
+"""
+import time
+import logging
+
+from modules.metrics import registry
+
+logger = logging.getLogger("NetStats")
+
+TCP_TABLES = ['/proc/net/tcp', '/proc/net/tcp6']
+SNMP_FILE = '/proc/net/snmp'
+NETSTAT_FILE = '/proc/net/netstat'
+
+# /proc/net/tcp "st" column (include/net/tcp_states.h)
+TCP_STATES = {
+    '01': 'established', '02': 'syn_sent', '03': 'syn_recv', '04': 'fin_wait1',
+    '05': 'fin_wait2', '06': 'time_wait', '07': 'close', '08': 'close_wait',
+    '09': 'last_ack', '0A': 'listen', '0B': 'closing'
+}
+
+# (section, counter) -> metric name of its per-second rate
+RATE_COUNTERS = {
+    ('Tcp', 'ActiveOpens'): 'tcp_active_opens_rate',
+    ('Tcp', 'PassiveOpens'): 'tcp_passive_opens_rate',
+    ('Tcp', 'AttemptFails'): 'tcp_attempt_fails_rate',
+    ('Tcp', 'RetransSegs'): 'tcp_retrans_rate',
+    ('Tcp', 'OutRsts'): 'tcp_out_rsts_rate',
+    ('Tcp', 'InErrs'): 'tcp_in_errors_rate',
+    ('Udp', 'NoPorts'): 'udp_no_ports_rate',
+    ('Udp', 'InErrors'): 'udp_in_errors_rate',
+    ('TcpExt', 'SyncookiesSent'): 'syncookies_sent_rate',
+    ('TcpExt', 'ListenOverflows'): 'listen_overflows_rate',
+    ('TcpExt', 'ListenDrops'): 'listen_drops_rate'
+}
+
+
+def tcp_state_counts(tables=TCP_TABLES):
+    """{'syn_sent': n, 'established': n, ...} over IPv4 and IPv6."""
+    counts = {}
+    for path in tables:
+        try:
+            with open(path, 'rb') as f:
+                next(f, None) # header
+                for line in f:
+                    fields = line.split(None, 4)
+                    if len(fields) > 3:
+                        state = fields[3]
+                        counts[state] = counts.get(state, 0) + 1
+        except OSError:
+            continue
+    return {TCP_STATES.get(state.decode(), state.decode()): n for state, n in counts.items()}
+
+
+def read_counters(paths=(SNMP_FILE, NETSTAT_FILE)):
+    """{(section, name): value} from the header/value line pairs of /proc/net/snmp and netstat."""
+    counters = {}
+    for path in paths:
+        try:
+            with open(path) as f:
+                lines = f.read().splitlines()
+        except OSError:
+            continue
+        for header, values in zip(lines[::2], lines[1::2]):
+            section, names = header.split(':', 1)
+            _, numbers = values.split(':', 1)
+            for name, value in zip(names.split(), numbers.split()):
+                try:
+                    counters[(section, name)] = int(value)
+                except ValueError:
+                    pass
+    return counters
+
+
+class NetStatsCollector:
+    """
+    sample() -> flat dict for Guard metric signatures:
+      <state>_count (syn_sent_count, syn_recv_count, established_count, ...)
+      *_rate counters per second (tcp_retrans_rate, syncookies_sent_rate, ...)
+    Rates need two samples; the first call only returns counts.
+    """
+    def __init__(self):
+        self.last_counters = None
+        self.last_time = None
+        self.last_sample = {}
+
+    def sample(self, states=True, rates=True):
+        now = time.monotonic()
+        result = {}
+        if states:
+            counts = tcp_state_counts()
+            for state in TCP_STATES.values():
+                result[f"{state}_count"] = counts.get(state, 0)
+        if rates:
+            counters = read_counters()
+            if self.last_counters is not None and now > self.last_time:
+                elapsed = now - self.last_time
+                for key, metric in RATE_COUNTERS.items():
+                    if key in counters and key in self.last_counters:
+                        result[metric] = round(max(0, counters[key] - self.last_counters[key]) / elapsed, 2)
+            self.last_counters = counters
+            self.last_time = now
+        self.last_sample = result
+        return result
+
+
+collector = NetStatsCollector()
+
+registry.gauge('neo_tcp_connections', 'TCP sockets by state (last Guard sample).', ['state'],
+               callback=lambda: {k[:-6]: v for k, v in collector.last_sample.items() if k.endswith('_count')})
@@ -0,0 +1,137 @@
+"""
+Concurrent, dependency-aware probe runner (used by Sherlock).
+
+Probes are argv lists (never a shell). Independent probes run at the same time
+in a bounded thread pool; a probe with dependencies starts when all of them
+passed and is skipped ("blocked") as soon as one failed, so a failure is
+reported at its root cause. Results are cached for a short TTL.
+"""
+import time
+import logging
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+logger = logging.getLogger("ProbeExecutor")
+
+
+class Probe:
+    """
+    name:    concept it checks ('router', 'dns', ...)
+    argv:    command as a list
+    check:   optional fn(output) -> (ok, detail) applied after a zero exit code
+    max_lines: keep only the first lines of the output (e.g. top)
+    """
+    def __init__(self, name, argv, timeout=5, check=None, max_lines=None):
+        self.name = name
+        self.argv = argv
+        self.timeout = timeout
+        self.check = check
+        self.max_lines = max_lines
+
+    def run(self):
+        start = time.perf_counter()
+        result = {'name': self.name, 'command': ' '.join(self.argv), 'cached': False}
+        try:
+            proc = subprocess.run(self.argv, capture_output=True, text=True, timeout=self.timeout)
+            output = proc.stdout
+            if self.max_lines:
+                output = '\n'.join(output.splitlines()[:self.max_lines])
+            ok = proc.returncode == 0
+            detail = None
+            if ok and self.check:
+                ok, detail = self.check(output)
+            result.update(status='ok' if ok else 'fail', returncode=proc.returncode, output=output, detail=detail)
+        except subprocess.TimeoutExpired:
+            result.update(status='fail', returncode=None, output='', detail=f"timeout ({self.timeout}s)")
+        except OSError as e:
+            result.update(status='error', returncode=None, output='', detail=str(e))
+        result['duration_ms'] = round((time.perf_counter() - start) * 1000, 1)
+        return result
+
+
+class ProbeExecutor:
+    def __init__(self, max_workers=4, ttl=15):
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="Probe")
+        self.ttl = ttl
+        self.cache = {} # name -> (timestamp, result)
+        self.lock = threading.Lock()
+
+    def _cached(self, name):
+        with self.lock:
+            entry = self.cache.get(name)
+        if entry and time.time() - entry[0] < self.ttl:
+            return dict(entry[1], cached=True)
+        return None
+
+    def _store(self, result):
+        if result['status'] != 'error':
+            with self.lock:
+                self.cache[result['name']] = (time.time(), result)
+
+    def run(self, probes, dependencies=None, names=None):
+        """
+        probes: {name: Probe}; dependencies: {name: [names it needs]}.
+        names: probes to run (their dependencies are added). Returns a report dict.
+        """
+        dependencies = dependencies or {}
+        wanted = self._closure(names or list(probes), probes, dependencies)
+        deps = {n: [d for d in dependencies.get(n, []) if d in wanted] for n in wanted}
+
+        started = time.perf_counter()
+        results, running = {}, {}
+        pending = set(wanted)
+
+        while pending or running:
+            progressed = False
+            for name in sorted(pending):
+                blockers = [d for d in deps[name] if d in results and results[d]['status'] != 'ok']
+                if blockers:
+                    results[name] = {'name': name, 'status': 'skipped', 'blocked_by': blockers, 'duration_ms': 0, 'cached': False}
+                elif all(d in results for d in deps[name]):
+                    cached = self._cached(name)
+                    if cached:
+                        results[name] = cached
+                    else:
+                        running[self.pool.submit(probes[name].run)] = name
+                else:
+                    continue
+                pending.discard(name)
+                progressed = True
+
+            if running:
+                done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    results[name] = future.result()
+                    self._store(results[name])
+            elif pending and not progressed:
+                # Dependency cycle: run what is left without ordering
+                logger.warning(f"Dependency cycle among {sorted(pending)}, running them unordered")
+                for name in pending:
+                    deps[name] = []
+
+        failed = [n for n, r in results.items() if r['status'] in ('fail', 'error')]
+        return {
+            'duration_ms': round((time.perf_counter() - started) * 1000, 1),
+            'sequential_ms': round(sum(r['duration_ms'] for r in results.values() if not r['cached']), 1),
+            'probes': results,
+            'failed': failed,
+            'skipped': [n for n, r in results.items() if r['status'] == 'skipped'],
+            # A failure whose own dependencies all passed is a root cause
+            'root_causes': [n for n in failed if all(results[d]['status'] == 'ok' for d in deps[n])]
+        }
+
+    def _closure(self, names, probes, dependencies):
+        wanted, stack = set(), list(names)
+        while stack:
+            name = stack.pop()
+            if name in wanted or name not in probes:
+                continue
+            wanted.add(name)
+            stack.extend(dependencies.get(name, []))
+        return wanted
+
+    def clear_cache(self):
+        with self.lock:
+            self.cache.clear()
@@ -0,0 +1,152 @@
+import json
+import time
+import queue
+import threading
+import logging
+from collections import deque
+from contextlib import contextmanager
+
+try:
+    import vosk
+    VOSK_AVAILABLE = True
+except ImportError:
+    vosk = None
+    VOSK_AVAILABLE = False
+
+logger = logging.getLogger("RecognizerPool")
+
+GRAMMAR = 'grammar'
+FREE = 'free'
+
+
+class RecognizerPool:
+    """
+    Pool of pre-built Vosk KaldiRecognizers.
+
+    Two variants are kept warm: one constrained by the intent grammar and one
+    free-form. Recognizers are Reset() when returned, discarded (and replaced in
+    the background) when decoding raised or after `max_uses` utterances, so a
+    corrupted decoder never serves a second request.
+    """
+    def __init__(self, model, rate=16000, grammar=None, size=2, max_uses=200):
+        self.model = model
+        self.rate = rate
+        self.grammar = grammar
+        self.size = size
+        self.max_uses = max_uses
+
+        self._pools = {GRAMMAR: queue.LifoQueue(), FREE: queue.LifoQueue()}
+        self._uses = {}
+        self._lock = threading.Lock()
+        self.counters = {'acquired': 0, 'created': 0, 'misses': 0, 'discarded': 0, 'recycled': 0}
+        self.latencies = {GRAMMAR: deque(maxlen=500), FREE: deque(maxlen=500)}
+
+        for variant in self.variants():
+            for _ in range(size):
+                self._pools[variant].put(self._create(variant))
+        logger.info(f"Recognizer pool ready: {size} x {self.variants()}")
+
+    def variants(self):
+        return [GRAMMAR, FREE] if self.grammar else [FREE]
+
+    def _create(self, variant):
+        if variant == GRAMMAR and self.grammar:
+            rec = vosk.KaldiRecognizer(self.model, self.rate, self.grammar)
+        else:
+            rec = vosk.KaldiRecognizer(self.model, self.rate)
+        with self._lock:
+            self.counters['created'] += 1
+            self._uses[id(rec)] = 0
+        return rec
+
+    def _replenish(self, variant):
+        """Rebuild a discarded recognizer off the critical path."""
+        def build():
+            try:
+                if self._pools[variant].qsize() < self.size:
+                    self._pools[variant].put(self._create(variant))
+            except Exception as e:
+                logger.error(f"Failed to rebuild recognizer ({variant}): {e}")
+        threading.Thread(target=build, daemon=True).start()
+
+    def checkout(self, variant=GRAMMAR):
+        """Take a recognizer out of the pool. Must be returned with checkin()."""
+        if variant == GRAMMAR and not self.grammar:
+            variant = FREE
+
+        try:
+            rec = self._pools[variant].get_nowait()
+        except queue.Empty:
+            # Pool exhausted (concurrent utterances): build one on demand
+            with self._lock:
+                self.counters['misses'] += 1
+            rec = self._create(variant)
+
+        with self._lock:
+            self.counters['acquired'] += 1
+        return rec, variant
+
+    def checkin(self, rec, variant, healthy=True, elapsed=None):
+        if elapsed is not None:
+            self.latencies[variant].append(elapsed)
+        self._release(rec, variant, healthy)
+
+    @contextmanager
+    def acquire(self, variant=GRAMMAR):
+        """Borrow a recognizer. Exceptions raised inside the block mark it as unhealthy."""
+        rec, variant = self.checkout(variant)
+        healthy = True
+        start = time.perf_counter()
+        try:
+            yield rec
+        except Exception:
+            healthy = False
+            raise
+        finally:
+            self.checkin(rec, variant, healthy, time.perf_counter() - start)
+
+    def _release(self, rec, variant, healthy):
+        key = id(rec)
+        with self._lock:
+            uses = self._uses.get(key, 0) + 1
+            self._uses[key] = uses
+
+        if healthy and uses < self.max_uses:
+            try:
+                rec.Reset()
+                if self._pools[variant].qsize() < self.size:
+                    self._pools[variant].put(rec)
+                else:
+                    # Extra recognizer created on a miss: let it go
+                    with self._lock:
+                        self._uses.pop(key, None)
+                return
+            except Exception as e:
+                logger.warning(f"Recognizer reset failed, discarding: {e}")
+                healthy = False
+
+        with self._lock:
+            self._uses.pop(key, None)
+            self.counters['discarded' if not healthy else 'recycled'] += 1
+        self._replenish(variant)
+
+    def stats(self):
+        """Pool counters plus decode latency percentiles (ms) per variant."""
+        result = {'counters': dict(self.counters), 'latency_ms': {}}
+        for variant, values in self.latencies.items():
+            if not values:
+                continue
+            ordered = sorted(values)
+            result['latency_ms'][variant] = {
+                'count': len(ordered),
+                'p50': round(ordered[len(ordered) // 2] * 1000, 1),
+                'p95': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 1),
+                'max': round(ordered[-1] * 1000, 1)
+            }
+        return result
+
+
+def decode(rec, raw_data):
+    """Feed a whole utterance and return the final text. Raises on malformed output."""
+    rec.AcceptWaveform(raw_data)
+    return json.loads(rec.FinalResult()).get('text', '')
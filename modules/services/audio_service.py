@@ -1,9 +1,8 @@
 import time
 import threading
 import logging
-import pyaudio
+import uuid
 import numpy as np
-import struct
 import os
 import sys
 import base64
@@ -12,7 +11,9 @@ import base64
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
 
 from modules.bus_client import BusClient
-from modules.utils import no_alsa_error
+from modules.config_manager import ConfigManager
+from modules.audio_frontend import AudioCapture, EchoGate, VoiceActivityDetector, VAD_SPEECH_START, VAD_SPEECH_END
+from modules.wake_word import create_wake_word_spotter, small_vosk_model_path, sherpa_keywords_file, VOSK_DISPONIBLE
 
 # Setup Logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - [AUDIO] - %(levelname)s - %(message)s')
@@ -24,18 +25,54 @@ class AudioService:
         self.is_listening = False
         self.is_paused = False
         self.is_muted = False
+        self.output_level = 0.0 # nivel de la voz de TTSService (speak:start/speak:level), referencia del EchoGate
+        self.config_manager = ConfigManager()
+
+        # Barge-in: durante la reproducción no se pausa el micro, sólo se busca la wake word
+        self.barge_in = bool(self.config_manager.get('stt', {}).get('barge_in', False))
+        self.wake_spotter = None
+        if self.barge_in:
+            self.setup_wake_spotter()
         
         self.bus.connect()
         self.bus.on('speak', self.on_speak_start)
         self.bus.on('speak:done', self.on_speak_done)
+        self.bus.on('speak:start', self.on_speak_level)
+        self.bus.on('speak:level', self.on_speak_level)
         self.bus.on('mic:toggle', self.on_mic_toggle)
-        self.bus.on('mic:get_status', self.broadcast_status)
+        self.bus.on_request('mic:get_status', self.on_mic_get_status)
+
+    def setup_wake_spotter(self):
+        stt_config = self.config_manager.get('stt', {})
+        model_path = stt_config.get('model_path', "vosk-models/es")
+        vosk_model = None
+        # The full model is only a fallback: create_wake_word_spotter prefers Sherpa KWS or the small Vosk model
+        engine = stt_config.get('kws_engine', 'auto')
+        needs_full_model = not small_vosk_model_path(stt_config) and not (engine != 'vosk' and sherpa_keywords_file(stt_config))
+        if needs_full_model and VOSK_DISPONIBLE and os.path.isdir(model_path):
+            try:
+                import vosk
+                vosk_model = vosk.Model(model_path)
+            except Exception as e:
+                logger.error(f"Failed to load Vosk model for wake word spotter: {e}")
+
+        wake_words = self.config_manager.get('wake_words', ['neo', 'tio', 'bro'])
+        self.wake_spotter = create_wake_word_spotter(stt_config, wake_words, vosk_model)
+        if self.wake_spotter:
+            logger.info("Barge-in enabled.")
+        else:
+            logger.warning("Barge-in disabled: no wake word spotter available")
+            self.barge_in = False
 
     def on_speak_start(self, data):
         self.is_paused = True
 
     def on_speak_done(self, data):
         self.is_paused = False
+        self.output_level = 0.0
+
+    def on_speak_level(self, message):
+        self.output_level = float(message.get('data', {}).get('level') or 0.0)
 
     def on_mic_toggle(self, data):
         """Toggles microphone mute state."""
@@ -48,6 +85,13 @@ class AudioService:
         logger.info(f"Microphone Muted: {self.is_muted}")
         self.broadcast_status()
 
+    def on_mic_get_status(self, message):
+        """RPC responder; legacy fire-and-forget requests still get the broadcast."""
+        status = {'muted': self.is_muted, 'listening': self.is_listening}
+        if not message.get('context', {}).get('reply_to'):
+            self.broadcast_status()
+        return status
+
     def broadcast_status(self, data=None):
         self.bus.emit('mic:status', {'muted': self.is_muted, 'listening': self.is_listening})
 
@@ -56,73 +100,119 @@ class AudioService:
         threading.Thread(target=self.mic_loop, daemon=True).start()
         # Initial broadcast
         self.broadcast_status()
+        self.bus.mark_ready({'barge_in': self.barge_in})
         self.bus.run_forever()
 
     def mic_loop(self):
         logger.info("Starting Microphone Loop...")
-        CHUNK = 1024
         RATE = 16000
-        THRESHOLD = 500 # Energy threshold
-        SILENCE_LIMIT = 20 # Frames of silence to consider end of speech
-        
-        with no_alsa_error():
-            p = pyaudio.PyAudio()
-            stream = p.open(format=pyaudio.paInt16, channels=1, rate=RATE, input=True, frames_per_buffer=CHUNK)
-            stream.start_stream()
-        
-        audio_buffer = []
-        silence_frames = 0
-        is_recording = False
-        
-        while self.is_listening:
-            if self.is_paused or self.is_muted:
-                time.sleep(0.1)
-                continue
+        stt_config = self.config_manager.get('stt', {})
+
+        vad = VoiceActivityDetector(
+            rate=RATE,
+            frame_ms=stt_config.get('vad_frame_ms', 30),
+            threshold=stt_config.get('vad_threshold', 500),
+            aggressiveness=stt_config.get('vad_aggressiveness', 2),
+            silence_ms=stt_config.get('vad_silence_ms', 600)
+        )
+        frame_samples = vad.frame_samples
+        preroll_samples = int(RATE * stt_config.get('vad_preroll_ms', 300) / 1000)
+        # Streaming: audio en trozos binarios pequeños mientras se habla. Si no, blob base64 al final (legacy).
+        streaming = stt_config.get('streaming', True)
+        chunk_samples = int(RATE * stt_config.get('stream_chunk_ms', 120) / 1000)
+        echo_gate = EchoGate(min_level=vad.threshold * stt_config.get('barge_in_margin', 2.0))
+
+        capture = AudioCapture(rate=RATE, frame_samples=frame_samples,
+                               device_index=stt_config.get('input_device_index', None))
+        capture.start()
+        ring = capture.ring
+        position = ring.position
 
+        utterance_id = None
+        seq = 0
+        pending = []
+        utterance_audio = []
+
+        while self.is_listening:
             try:
-                data = stream.read(CHUNK, exception_on_overflow=False)
-                
-                # Simple Energy VAD
-                shorts = struct.unpack("%dh" % (len(data) / 2), data)
-                rms = np.sqrt(np.mean(np.square(shorts)))
-                
-                if rms > THRESHOLD:
-                    if not is_recording:
-                        is_recording = True
-                        logger.info("Speech detected...")
-                        self.bus.emit("recognizer_loop:record_begin")
-                    silence_frames = 0
+                if not ring.wait_for(position + frame_samples, timeout=0.5):
+                    continue
+                if ring.position - position > ring.capacity:
+                    position = ring.position - frame_samples
+
+                frame = ring.read(position, frame_samples)
+                position += frame_samples
+
+                if self.is_paused or self.is_muted:
+                    if utterance_id:
+                        # Utterance cortada por reproducción/mute: se descarta
+                        self.bus.emit("recognizer_loop:record_end", {"utterance_id": utterance_id, "chunks": seq, "aborted": True})
+                        utterance_id, pending, utterance_audio = None, [], []
+                    vad.reset()
+                    if self.is_paused and self.wake_spotter and not self.is_muted:
+                        self.barge_in_step(frame, echo_gate)
+                    continue
+
+                event = vad.process(frame)
+                if event is None:
+                    continue
+
+                if event == VAD_SPEECH_START:
+                    start = position - frame_samples * vad.min_speech_frames - preroll_samples
+                    chunk = ring.read(start, position - start)
+                    utterance_id = uuid.uuid4().hex[:12]
+                    seq = 0
+                    logger.info(f"Speech detected ({utterance_id})...")
+                    self.bus.emit("recognizer_loop:record_begin", {"utterance_id": utterance_id, "rate": RATE})
+                else:
+                    chunk = frame
+
+                if streaming:
+                    pending.append(chunk)
+                    if sum(len(c) for c in pending) >= chunk_samples or event == VAD_SPEECH_END:
+                        self.bus.emit("recognizer_loop:audio_chunk", {
+                            "utterance_id": utterance_id,
+                            "seq": seq,
+                            "data": np.concatenate(pending).tobytes(),
+                            "rate": RATE
+                        })
+                        seq += 1
+                        pending = []
                 else:
-                    if is_recording:
-                        silence_frames += 1
-                
-                if is_recording:
-                    audio_buffer.append(data)
-                    
-                    if silence_frames > SILENCE_LIMIT:
-                        # End of speech
-                        logger.info("End of speech. Sending audio...")
-                        self.bus.emit("recognizer_loop:record_end")
-                        
-                        raw_data = b''.join(audio_buffer)
+                    utterance_audio.append(chunk)
+
+                if event == VAD_SPEECH_END:
+                    logger.info(f"End of speech ({utterance_id}).")
+                    self.bus.emit("recognizer_loop:record_end", {"utterance_id": utterance_id, "chunks": seq})
+
+                    if not streaming:
                         # Encode to base64 for JSON transport
-                        b64_data = base64.b64encode(raw_data).decode('utf-8')
-                        
+                        b64_data = base64.b64encode(np.concatenate(utterance_audio).tobytes()).decode('utf-8')
                         self.bus.emit("recognizer_loop:audio", {
                             "data": b64_data,
                             "rate": RATE,
                             "width": 2, # 16-bit
                             "channels": 1
                         })
-                        
-                        audio_buffer = []
-                        is_recording = False
-                        silence_frames = 0
-                        
+                    utterance_id, pending, utterance_audio = None, [], []
+
             except Exception as e:
                 logger.error(f"Mic Loop Error: {e}")
                 time.sleep(1)
 
+        capture.stop()
+
+    def barge_in_step(self, frame, echo_gate):
+        """Pasa una trama capturada durante la reproducción al spotter de wake word."""
+        if echo_gate.is_echo(VoiceActivityDetector.rms(frame), self.output_level):
+            return
+        hit = self.wake_spotter.accept(frame)
+        if hit:
+            logger.info(f"Barge-in: wake word '{hit}' during playback")
+            self.bus.emit('speak:stop', {'wakeword': hit})
+            self.bus.emit('recognizer_loop:wakeword', {'wakeword': hit})
+            self.is_paused = False
+
 if __name__ == "__main__":
     service = AudioService()
     service.run()
@@ -2,6 +2,8 @@ import logging
 import os
 import sys
 import json
+import threading
+from collections import OrderedDict
 
 # Add root to path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
@@ -27,8 +29,51 @@ class NLUService:
         # Train Padatious
         self.padatious_manager.load_intents()
         
+        # Speculative matches on streaming partials: utterance_id -> (text, intent)
+        self.speculative = OrderedDict()
+        self.speculative_lock = threading.Lock()
+        
         self.bus.connect()
         self.bus.on('recognizer_loop:utterance', self.handle_utterance)
+        self.bus.on('recognizer_loop:partial', self.handle_partial)
+
+    def match_intent(self, text):
+        """Runs Padatious, then the RapidFuzz matcher. Returns the best intent or None."""
+        # 1. Try Padatious (Primary)
+        if self.padatious_manager.available:
+            pad_result = self.padatious_manager.calc_intent(text)
+            if pad_result and pad_result['confidence'] > 0.75:
+                logger.info(f"Padatious Match: {pad_result['name']} ({pad_result['score']}%)")
+                return pad_result
+        
+        # 2. Fallback to RapidFuzz (Legacy) if Padatious failed or low confidence
+        legacy_result = self.intent_manager.find_best_intent(text)
+        if legacy_result:
+            logger.info(f"Legacy Match: {legacy_result['name']} ({legacy_result['score']}%)")
+        return legacy_result
+
+    def handle_partial(self, message):
+        """
+        Pre-match streaming partials so the final utterance usually hits the cache.
+        Message data: {"utterance_id": "...", "partial": "text"}
+        """
+        data = message.get('data', {})
+        utterance_id = data.get('utterance_id')
+        text = data.get('partial', '').strip()
+        if not utterance_id or len(text.split()) < 2:
+            return
+
+        with self.speculative_lock:
+            cached = self.speculative.get(utterance_id)
+            if cached and cached[0] == text:
+                return
+
+        best_intent = self.match_intent(text)
+        with self.speculative_lock:
+            self.speculative[utterance_id] = (text, best_intent)
+            self.speculative.move_to_end(utterance_id)
+            while len(self.speculative) > 20:
+                self.speculative.popitem(last=False)
 
     def handle_utterance(self, message):
         """
@@ -44,21 +89,18 @@ class NLUService:
         text = utterances[0]
         logger.info(f"Processing: {text}")
         
-        best_intent = None
-        
-        # 1. Try Padatious (Primary)
-        if self.padatious_manager.available:
-            pad_result = self.padatious_manager.calc_intent(text)
-            if pad_result and pad_result['confidence'] > 0.75:
-                logger.info(f"Padatious Match: {pad_result['name']} ({pad_result['score']}%)")
-                best_intent = pad_result
-        
-        # 2. Fallback to RapidFuzz (Legacy) if Padatious failed or low confidence
-        if not best_intent:
-            legacy_result = self.intent_manager.find_best_intent(text)
-            if legacy_result:
-                logger.info(f"Legacy Match: {legacy_result['name']} ({legacy_result['score']}%)")
-                best_intent = legacy_result
+        # Reuse the speculative match if the last partial already was the final text
+        cached = None
+        utterance_id = data.get('utterance_id')
+        if utterance_id:
+            with self.speculative_lock:
+                cached = self.speculative.pop(utterance_id, None)
+
+        if cached and cached[0] == text.strip():
+            logger.info("Speculative match hit.")
+            best_intent = cached[1]
+        else:
+            best_intent = self.match_intent(text)
 
         # 3. Emit Result
         if best_intent:
@@ -110,6 +152,7 @@ class NLUService:
 
     def run(self):
         logger.info("NLU Service Started")
+        self.bus.mark_ready({'padatious': self.padatious_manager.available})
         self.bus.run_forever()
 
 if __name__ == "__main__":
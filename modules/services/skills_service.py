@@ -5,6 +5,7 @@ import queue
 import threading
 import time
 import random
+import re
 from datetime import datetime, date
 # Add root to path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
@@ -260,6 +261,12 @@ class SkillsService:
             
         # Also register for unknown intent (fallback to Chat)
         self.bus.on("recognizer_loop:unknown_intent", self.handle_unknown)
+        self.bus.on("speak:stop", self.on_speak_stop)
+
+    def on_speak_stop(self, message):
+        """Barge-in: corta la generación de la IA en curso."""
+        logger.info("speak:stop recibido. Cancelando generación.")
+        self.ai_engine.cancel()
 
     def handle_intent(self, message):
         intent_type = message.get('type')
@@ -406,16 +413,30 @@ class SkillsService:
         # 2. Fallback to Chat (Gemma)
         logger.info(f"Chatting with AI: {utterance}")
         try:
-            # Use ChatManager
-            response = self.chat_manager.get_response(utterance)
-            logger.info(f"AI Response: {response}")
-            self.bus.emit('speak', {'text': response})
+            # Use ChatManager (streaming por frases para poder cortarlo con speak:stop)
+            buffer = ""
+            for chunk in self.chat_manager.get_response_stream(utterance):
+                if self.ai_engine.is_cancelled:
+                    return
+                buffer += chunk
+                parts = re.split(r'([.!?\n])', buffer)
+                while len(parts) >= 2:
+                    sentence = (parts.pop(0) + parts.pop(0)).strip()
+                    if sentence:
+                        logger.info(f"AI Sentence: {sentence}")
+                        self.bus.emit('speak', {'text': sentence})
+                buffer = "".join(parts)
+
+            if buffer.strip() and not self.ai_engine.is_cancelled:
+                logger.info(f"AI Response: {buffer}")
+                self.bus.emit('speak', {'text': buffer.strip()})
         except Exception as e:
             logger.error(f"Error in ChatManager: {e}")
             self.bus.emit('speak', {'text': "Lo siento, me he quedado en blanco."})
 
     def run(self):
         logger.info("Skills Service Started")
+        self.bus.mark_ready({'intents': len(self.action_map)})
         self.bus.run_forever()
 
     # Helper for skills that might call self.core.speak directly (if any)
@@ -3,17 +3,18 @@ import json
 import threading
 import logging
 import numpy as np
-import struct
 import os
 import sys
 import base64
+from collections import OrderedDict
 
 # Add root to path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
 
 from modules.bus_client import BusClient
 from modules.config_manager import ConfigManager
-from modules.utils import normalize_text
+from modules.utils import normalize_text, load_json_data, build_vosk_grammar
+from modules.recognizer_pool import RecognizerPool, decode as decode_vosk, GRAMMAR, FREE
 
 # Setup Logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - [STT] - %(levelname)s - %(message)s')
@@ -32,7 +33,31 @@ try:
 except ImportError:
     SHERPA_AVAILABLE = False
 
+class StreamSession:
+    """Incremental decode state for one streamed utterance."""
+    def __init__(self, utterance_id, rate):
+        self.utterance_id = utterance_id
+        self.rate = rate
+        self.created = time.time()
+        self.end_received = None
+        self.lock = threading.Lock()
+        self.next_seq = 0
+        self.out_of_order = {} # seq -> bytes (bus handlers run concurrently)
+        self.total_chunks = None
+        self.audio = []
+        self.texts = []
+        self.last_partial = ""
+        self.recognizer = None
+        self.variant = None
+        self.healthy = True
+        self.finished = False
+
+
 class STTService:
+    SESSION_TIMEOUT = 30
+    EARLY_TIMEOUT = 5 # chunks received before their record_begin are kept this long
+    FINISHED_MEMORY = 256 # utterance_ids remembered after record_end/abort (late chunks are dropped)
+
     def __init__(self):
         self.bus = BusClient(name="STTService")
         self.config_manager = ConfigManager()
@@ -40,14 +65,27 @@ class STTService:
         
         # Models
         self.vosk_model = None
-        self.vosk_recognizer = None
+        self.recognizer_pool = None
         self.sherpa_recognizer = None
+
+        # Streaming sessions (utterance_id -> StreamSession). Only record_begin creates one
+        # (it checks out a pooled recognizer); chunks that overtake their record_begin (bus
+        # handlers run concurrently) wait in `early`, chunks of finished utterances are dropped.
+        self.sessions = {}
+        self.early = {} # utterance_id -> {'created', 'chunks': [message data], 'end': message data}
+        self.finished_ids = OrderedDict()
+        self.sessions_lock = threading.Lock()
+        threading.Thread(target=self._expire_loop, daemon=True, name="STTSessionReaper").start()
         
         self.setup_stt()
         
         # Connect to Bus
         self.bus.connect()
-        self.bus.on('recognizer_loop:audio', self.on_audio)
+        self.bus.on('recognizer_loop:audio', self.on_audio) # Legacy: whole utterance as base64
+        self.bus.on('recognizer_loop:record_begin', self.on_record_begin)
+        self.bus.on('recognizer_loop:audio_chunk', self.on_audio_chunk)
+        self.bus.on('recognizer_loop:record_end', self.on_record_end)
+        self.bus.on('stt:get_stats', self.on_get_stats)
 
     def setup_stt(self):
         engine = self.config.get('engine', 'vosk') # Default to vosk if not set
@@ -81,13 +119,29 @@ class STTService:
         if model_path:
             try:
                 self.vosk_model = vosk.Model(model_path)
-                # self.vosk_recognizer = vosk.KaldiRecognizer(self.vosk_model, 16000) # Removed: Instantiated per request
                 logger.info("Vosk Model loaded.")
+                self.setup_recognizer_pool()
             except Exception as e:
                 logger.error(f"Failed to load Vosk: {e}")
         else:
             logger.error(f"Vosk model not found in any of: {possible_paths}")
 
+    def setup_recognizer_pool(self):
+        """Pre-builds grammar and free-form recognizers so no construction happens per utterance."""
+        grammar = None
+        if self.config.get('use_grammar', True):
+            intents = load_json_data('config/intents.json', 'intents')
+            wake_words = self.config_manager.get('wake_words', ['neo', 'tio', 'bro'])
+            grammar = build_vosk_grammar(intents, wake_words, include_unk=True)
+
+        try:
+            self.recognizer_pool = RecognizerPool(
+                self.vosk_model, rate=16000, grammar=grammar,
+                size=self.config.get('recognizer_pool_size', 2)
+            )
+        except Exception as e:
+            logger.error(f"Failed to build recognizer pool: {e}")
+
     def setup_sherpa(self):
         if not SHERPA_AVAILABLE:
             logger.error("Sherpa-ONNX not installed.")
@@ -137,6 +191,190 @@ class STTService:
         except Exception as e:
             logger.error(f"Error processing audio: {e}")
 
+    # --- Streaming ---
+
+    def _expire_loop(self):
+        while True:
+            time.sleep(self.EARLY_TIMEOUT)
+            with self.sessions_lock:
+                stale = self._expire_sessions()
+            # Outside sessions_lock (lock order is session.lock -> sessions_lock): wait for
+            # a _feed in progress before its recognizer goes back to the pool
+            for session in stale:
+                with session.lock:
+                    session.finished = True
+                    self._release_session(session)
+
+    def _expire_sessions(self):
+        """
+        Drop sessions whose record_end never arrived and stale early chunks (sessions_lock held).
+        Returns the dropped sessions; the caller releases their recognizers under session.lock.
+        """
+        now = time.time()
+        stale = []
+        for utterance_id, session in list(self.sessions.items()):
+            if now - session.created > self.SESSION_TIMEOUT:
+                logger.warning(f"Dropping stale session {utterance_id}")
+                del self.sessions[utterance_id]
+                self._mark_finished(utterance_id)
+                stale.append(session)
+        for utterance_id, early in list(self.early.items()):
+            if now - early['created'] > self.EARLY_TIMEOUT:
+                logger.warning(f"Dropping chunks of {utterance_id}: record_begin never arrived")
+                del self.early[utterance_id]
+                self._mark_finished(utterance_id)
+        return stale
+
+    def _mark_finished(self, utterance_id):
+        """Remember a finished/aborted utterance so its late chunks are ignored (sessions_lock held)."""
+        self.finished_ids[utterance_id] = True
+        while len(self.finished_ids) > self.FINISHED_MEMORY:
+            self.finished_ids.popitem(last=False)
+
+    def _release_session(self, session):
+        """Check the recognizer back into the pool (session.lock held: no _feed can be using it)."""
+        if session.recognizer:
+            self.recognizer_pool.checkin(session.recognizer, session.variant, session.healthy,
+                                         time.time() - session.created)
+            session.recognizer = None
+
+    def _lookup(self, utterance_id, data, kind):
+        """
+        Session of a chunk/record_end, or None: finished utterances are dropped and
+        messages that overtook record_begin are parked in `early`.
+        """
+        with self.sessions_lock:
+            session = self.sessions.get(utterance_id)
+            if session is not None or utterance_id in self.finished_ids:
+                return session
+            early = self.early.setdefault(utterance_id, {'created': time.time(), 'chunks': [], 'end': None})
+            if kind == 'end':
+                early['end'] = data
+            else:
+                early['chunks'].append(data)
+            return None
+
+    def on_record_begin(self, message):
+        data = message.get('data', {})
+        utterance_id = data.get('utterance_id')
+        if not utterance_id:
+            return
+        rate = data.get('rate', 16000)
+        with self.sessions_lock:
+            if utterance_id in self.sessions or utterance_id in self.finished_ids:
+                return
+            session = StreamSession(utterance_id, rate)
+            if self.recognizer_pool and rate == self.recognizer_pool.rate:
+                session.recognizer, session.variant = self.recognizer_pool.checkout(GRAMMAR)
+            self.sessions[utterance_id] = session
+            early = self.early.pop(utterance_id, None)
+        if early:
+            for chunk in early['chunks']:
+                self._accept_chunk(session, chunk)
+            if early['end'] is not None:
+                self._accept_end(session, early['end'])
+
+    def on_audio_chunk(self, message):
+        data = message.get('data', {})
+        utterance_id = data.get('utterance_id')
+        if not utterance_id or not data.get('data'):
+            return
+        session = self._lookup(utterance_id, data, 'chunk')
+        if session is not None:
+            self._accept_chunk(session, data)
+
+    def _accept_chunk(self, session, data):
+        with session.lock:
+            if session.finished:
+                return
+            session.out_of_order[data.get('seq', session.next_seq)] = data['data']
+            # Feed in sequence order
+            while session.next_seq in session.out_of_order:
+                self._feed(session, session.out_of_order.pop(session.next_seq))
+                session.next_seq += 1
+            self._maybe_finish(session)
+
+    def on_record_end(self, message):
+        data = message.get('data', {})
+        utterance_id = data.get('utterance_id')
+        if not utterance_id:
+            return
+        session = self._lookup(utterance_id, data, 'end')
+        if session is not None:
+            self._accept_end(session, data)
+
+    def _accept_end(self, session, data):
+        with session.lock:
+            if session.finished:
+                return
+            if data.get('aborted'):
+                session.finished = True
+                with self.sessions_lock:
+                    self.sessions.pop(session.utterance_id, None)
+                    self._mark_finished(session.utterance_id)
+                self._release_session(session)
+                return
+            session.total_chunks = data.get('chunks', session.next_seq)
+            session.end_received = time.time()
+            self._maybe_finish(session)
+
+    def _feed(self, session, chunk):
+        session.audio.append(chunk)
+        rec = session.recognizer
+        if not rec or not session.healthy:
+            return
+
+        try:
+            if rec.AcceptWaveform(chunk):
+                text = json.loads(rec.Result()).get('text', '')
+                if text:
+                    session.texts.append(text)
+                partial = ""
+            else:
+                partial = json.loads(rec.PartialResult()).get('partial', '')
+        except Exception as e:
+            logger.error(f"Streaming decode error ({session.utterance_id}): {e}")
+            session.healthy = False
+            return
+
+        current = " ".join(session.texts + ([partial] if partial else [])).strip()
+        if current and current != session.last_partial:
+            session.last_partial = current
+            _, clean = self.strip_wake_word(current)
+            self.bus.emit("recognizer_loop:partial", {"utterance_id": session.utterance_id, "partial": clean})
+
+    def _maybe_finish(self, session):
+        """Finalize once record_end arrived and every chunk has been fed (session.lock held)."""
+        if session.finished or session.total_chunks is None or session.next_seq < session.total_chunks:
+            return
+        session.finished = True
+        with self.sessions_lock:
+            self.sessions.pop(session.utterance_id, None)
+            self._mark_finished(session.utterance_id)
+
+        raw_data = b''.join(session.audio)
+        text = ""
+        try:
+            if self.sherpa_recognizer:
+                text = self.transcribe_sherpa(raw_data, session.rate)
+            elif session.recognizer and session.healthy:
+                final = json.loads(session.recognizer.FinalResult()).get('text', '')
+                text = " ".join(session.texts + ([final] if final else [])).strip()
+                if session.variant == GRAMMAR and (not text or '[unk]' in text):
+                    text = self._decode_free(raw_data)
+            elif self.vosk_model:
+                text = self.transcribe_vosk(raw_data, session.rate)
+        except Exception as e:
+            logger.error(f"Error finalizing {session.utterance_id}: {e}")
+            session.healthy = False
+        finally:
+            self._release_session(session)
+
+        if text:
+            tail_ms = (time.time() - (session.end_received or time.time())) * 1000
+            logger.info(f"Streaming FinalResult ({session.utterance_id}, {tail_ms:.0f} ms after end): '{text}'")
+            self.process_text(text, session.utterance_id)
+
     def transcribe_sherpa(self, raw_data, rate):
         samples = np.frombuffer(raw_data, dtype=np.int16).astype(np.float32) / 32768.0
         s = self.sherpa_recognizer.create_stream()
@@ -147,28 +385,41 @@ class STTService:
     def transcribe_vosk(self, raw_data, rate):
         if not self.vosk_model:
             return ""
-            
+
+        if not self.recognizer_pool or rate != self.recognizer_pool.rate:
+            # Unusual sample rate: one-off recognizer
+            return decode_vosk(vosk.KaldiRecognizer(self.vosk_model, rate), raw_data)
+
+        start = time.perf_counter()
+        variant = GRAMMAR
         try:
-            # Create a fresh recognizer for each utterance to avoid C++ state corruption/assertions
-            # This prevents "ASSERTION_FAILED (VoskAPI:TraceBackBestPath())" crashes
-            rec = vosk.KaldiRecognizer(self.vosk_model, rate)
-            
-            # Feed the entire audio chunk
-            rec.AcceptWaveform(raw_data)
-            
-            # Get result
-            res = json.loads(rec.FinalResult())
-            text = res.get('text', '')
-            
+            # Grammar first (fast, matches intent triggers). Anything outside it comes
+            # back as [unk], so re-decode the same audio free-form.
+            with self.recognizer_pool.acquire(GRAMMAR) as rec:
+                text = decode_vosk(rec, raw_data)
+
+            if self.recognizer_pool.grammar and (not text or '[unk]' in text):
+                variant = FREE
+                text = self._decode_free(raw_data)
+
+            elapsed_ms = (time.perf_counter() - start) * 1000
             if text:
-                logger.info(f"Vosk FinalResult: '{text}'")
-                
+                logger.info(f"Vosk FinalResult ({variant}, {elapsed_ms:.0f} ms): '{text}'")
             return text
-            
+
         except Exception as e:
+            # The pool has already discarded the recognizer that failed
             logger.error(f"Vosk Transcription Error: {e}")
             return ""
 
+    def _decode_free(self, raw_data):
+        with self.recognizer_pool.acquire(FREE) as rec:
+            return decode_vosk(rec, raw_data)
+
+    def on_get_stats(self, message):
+        stats = self.recognizer_pool.stats() if self.recognizer_pool else {}
+        self.bus.emit('stt:stats', stats)
+
     def check_wake_word(self, text):
         wake_words = self.config_manager.get('wake_words', ['neo', 'tio', 'bro'])
         if isinstance(wake_words, str): wake_words = [wake_words]
@@ -179,21 +430,27 @@ class STTService:
                 return ww.lower()
         return None
 
-    def process_text(self, text):
-        logger.info(f"Transcribed: {text}")
+    def strip_wake_word(self, text):
         ww = self.check_wake_word(text)
+        if ww:
+            text = text.replace(ww, "").strip()
+        return ww, text
+
+    def process_text(self, text, utterance_id=None):
+        logger.info(f"Transcribed: {text}")
+        ww, text = self.strip_wake_word(text)
         
         if ww:
             logger.info(f"Wake Word Detected: {ww}")
             self.bus.emit("recognizer_loop:wakeword", {"wakeword": ww})
-            # Remove wake word
-            text = text.replace(ww, "").strip()
         
         if text:
-            self.bus.emit("recognizer_loop:utterance", {"utterances": [text]})
+            self.bus.emit("recognizer_loop:utterance", {"utterances": [text], "utterance_id": utterance_id})
 
     def run(self):
         logger.info("STT Service Started")
+        self.bus.mark_ready({'engine': self.config.get('engine', 'vosk'),
+                             'model_loaded': bool(self.vosk_model or self.sherpa_recognizer)})
         self.bus.run_forever()
 
 if __name__ == "__main__":
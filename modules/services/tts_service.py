@@ -15,6 +15,9 @@ from modules.speaker import Speaker
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - [TTS] - %(levelname)s - %(message)s')
 logger = logging.getLogger("TTSService")
 
+LEVEL_INTERVAL = 0.1 # s entre muestras del nivel de salida (speak:level)
+LEVEL_CHANGE = 0.15 # sólo se publica si cambia más de un 15% (o cada segundo)
+
 class TTSService:
     def __init__(self):
         self.bus = BusClient(name="TTSService")
@@ -25,9 +28,12 @@ class TTSService:
         
         self.bus.connect()
         self.bus.on('speak', self.handle_speak)
+        self.bus.on('speak:stop', self.handle_stop)
         
         # Start monitoring speaker events
+        self.speaking = False
         threading.Thread(target=self.monitor_speaker, daemon=True).start()
+        threading.Thread(target=self.publish_levels, daemon=True).start()
 
     def handle_speak(self, message):
         data = message.get('data', {})
@@ -36,6 +42,11 @@ class TTSService:
             logger.info(f"Speaking: {text}")
             self.speaker.speak(text)
 
+    def handle_stop(self, message):
+        """Barge-in: corta la reproducción y vacía la cola."""
+        logger.info("Stop requested (barge-in)")
+        self.speaker.stop()
+
     def monitor_speaker(self):
         """Relay speaker events to bus."""
         while True:
@@ -46,16 +57,36 @@ class TTSService:
                 if msg_type == 'speaker_status':
                     status = event.get('status')
                     if status == 'speaking':
-                        self.bus.emit('speak:start', {})
+                        self.speaking = True
+                        self.bus.emit('speak:start', {'level': self.speaker.output_level})
                     elif status == 'idle':
+                        self.speaking = False
                         self.bus.emit('speak:done', {})
                 
                 self.event_queue.task_done()
             except Exception as e:
                 logger.error(f"Error monitoring speaker: {e}")
 
+    def publish_levels(self):
+        """
+        Publica el nivel RMS de la salida mientras se habla (speak:level): AudioService
+        lo usa como referencia del EchoGate para que la propia voz no dispare el barge-in.
+        """
+        last_level, last_sent = 0.0, 0.0
+        while True:
+            time.sleep(LEVEL_INTERVAL)
+            if not self.speaking:
+                last_level = 0.0
+                continue
+            level = self.speaker.output_level
+            now = time.time()
+            if abs(level - last_level) > LEVEL_CHANGE * max(last_level, 1.0) or now - last_sent >= 1.0:
+                self.bus.emit('speak:level', {'level': level})
+                last_level, last_sent = level, now
+
     def run(self):
         logger.info("TTS Service Started")
+        self.bus.mark_ready({'engine': self.speaker.engine})
         self.bus.run_forever()
 
 if __name__ == "__main__":
@@ -71,6 +71,7 @@ class WebService:
 
     def run(self):
         logger.info("Starting Web Service (Flask + SocketIO)...")
+        self.bus.mark_ready()
         # Run Flask-SocketIO
         # Note: We use allow_unsafe_werkzeug=True as in original code
         socketio.run(app, host='0.0.0.0', port=5000, debug=False, use_reloader=False, allow_unsafe_werkzeug=True)
@@ -1,53 +1,135 @@
 import logging
-import time
-import random
-import subprocess
 from modules.database import DatabaseManager
+from modules.probe_executor import Probe, ProbeExecutor
 
 logger = logging.getLogger("NeoSherlock")
 
+# Built-in ordering; extended with 'needs'/'uses'/'depends_on' relations of the knowledge graph
+DEFAULT_DEPENDENCIES = {
+    "internet": ["router"],
+    "dns": ["internet"]
+}
+DEPENDENCY_RELATIONS = ("needs", "uses", "depends_on")
+GENERAL_PROBES = ["internet", "dns", "disk", "memory", "cpu"]
+
+STATUS_LABELS = {'ok': "OK", 'fail': "FALLO", 'error': "ERROR", 'skipped': "OMITIDO"}
+
+
+def default_gateway(route_file="/proc/net/route"):
+    """IPv4 default gateway from the kernel routing table (None if there is no default route)."""
+    try:
+        with open(route_file) as f:
+            next(f, None)
+            for line in f:
+                fields = line.split()
+                if len(fields) > 2 and fields[1] == "00000000" and fields[2] != "00000000":
+                    return ".".join(str(int(fields[2][i:i + 2], 16)) for i in (6, 4, 2, 0))
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def _disk_check(output):
+    """df -h: fails when the root filesystem is 95% full or more."""
+    for line in output.splitlines()[1:]:
+        fields = line.split()
+        if len(fields) >= 6 and fields[5] == "/" and fields[4].endswith("%"):
+            used = int(fields[4][:-1])
+            return used < 95, f"{used}% usado"
+    return True, None
+
+
+def _memory_check(output):
+    """free -m: fails when less than 5% of RAM is available."""
+    for line in output.splitlines():
+        fields = line.split()
+        if fields and fields[0].startswith("Mem") and len(fields) >= 7:
+            total, available = int(fields[1]), int(fields[6])
+            if total:
+                return available * 100 / total >= 5, f"{available} MB disponibles"
+    return True, None
+
+
 class Sherlock:
     """
     Sherlock is the Diagnostic Reasoning Engine for T.I.O.
     Block 4 Upgrade: Real Command Execution & Dynamic Trees.
+    Probes run concurrently; dependent ones (router -> internet -> dns) wait for
+    their dependencies and are skipped when one fails, so the root cause is reported.
     """
     def __init__(self, event_queue):
         self.db = DatabaseManager()
         self.event_queue = event_queue
-        # Map concepts to real commands
-        self.command_map = {
-            "internet": "ping -c 1 8.8.8.8",
-            "router": "ping -c 1 192.168.1.1", # Assumption
-            "dns": "nslookup google.com",
-            "disk": "df -h",
-            "memory": "free -m",
-            "cpu": "top -bn1 | head -5",
-            "nginx": "systemctl is-active nginx",
-            "apache": "systemctl is-active apache2",
-            "docker": "systemctl is-active docker"
+
+        conf = {}
+        try:
+            from modules.config_manager import ConfigManager
+            conf = ConfigManager().get('sherlock', {}) or {}
+        except Exception:
+            pass
+        timeout = conf.get('probe_timeout', 5)
+        self.executor = ProbeExecutor(max_workers=conf.get('max_workers', 4), ttl=conf.get('cache_ttl', 15))
+
+        router = default_gateway() or "192.168.1.1"
+        # Map concepts to real commands (argv, no shell)
+        self.probes = {
+            "internet": Probe("internet", ["ping", "-c", "1", "-W", "2", "8.8.8.8"], timeout),
+            "router": Probe("router", ["ping", "-c", "1", "-W", "2", router], timeout),
+            "dns": Probe("dns", ["nslookup", "google.com"], timeout),
+            "disk": Probe("disk", ["df", "-h"], timeout, check=_disk_check),
+            "memory": Probe("memory", ["free", "-m"], timeout, check=_memory_check),
+            "cpu": Probe("cpu", ["top", "-bn1"], timeout, max_lines=5),
+            "nginx": Probe("nginx", ["systemctl", "is-active", "nginx"], timeout),
+            "apache": Probe("apache", ["systemctl", "is-active", "apache2"], timeout),
+            "docker": Probe("docker", ["systemctl", "is-active", "docker"], timeout)
         }
+        self.dependencies = self._load_dependencies()
         logger.info("Neo Sherlock (Block 4 Upgraded) initialized.")
 
+    def _load_dependencies(self):
+        """DEFAULT_DEPENDENCIES plus knowledge-graph relations between known probes."""
+        deps = {name: list(targets) for name, targets in DEFAULT_DEPENDENCIES.items()}
+        for name in self.probes:
+            try:
+                related = self.db.get_related_concepts(name)
+            except Exception as e:
+                logger.warning(f"Sherlock: could not read relations for {name}: {e}")
+                continue
+            for target, rel_type, _ in related:
+                if rel_type in DEPENDENCY_RELATIONS and target in self.probes and target != name:
+                    deps.setdefault(name, [])
+                    if target not in deps[name]:
+                        deps[name].append(target)
+        return deps
+
+    def report(self, concepts=None):
+        """
+        Structured diagnosis: {duration_ms, sequential_ms, probes: {name: {status,
+        duration_ms, cached, output, detail, blocked_by}}, failed, skipped, root_causes}.
+        """
+        report = self.executor.run(self.probes, self.dependencies, concepts or GENERAL_PROBES)
+        logger.info(f"Sherlock: {len(report['probes'])} probes in {report['duration_ms']} ms "
+                    f"(sequential {report['sequential_ms']} ms), root causes: {report['root_causes']}")
+        return report
+
     def run_diagnosis(self):
         """
-        Runs a general system diagnosis (Internet, Disk, Memory, CPU).
+        Runs a general system diagnosis (Router, Internet, DNS, Disk, Memory, CPU).
         """
         logger.info("Sherlock: Running general diagnosis...")
+        report = self.report()
         problems = []
-        
-        # Check Internet
-        if not self._run_command(self.command_map['internet'])['success']:
-            problems.append("No hay conexión a Internet.")
-            
-        # Check Disk
-        disk = self._run_command(self.command_map['disk'])
-        if disk['success'] and '100%' in disk['output']:
-            problems.append("El disco está lleno.")
-            
-        # Check Memory
-        mem = self._run_command(self.command_map['memory'])
-        # Simple heuristic: if 'available' is very low (parsing needed, but let's keep it simple for now)
-        
+        messages = {
+            "router": "No llego al router.",
+            "internet": "No hay conexión a Internet.",
+            "dns": "La resolución DNS falla.",
+            "disk": "El disco está lleno.",
+            "memory": "Queda muy poca memoria disponible."
+        }
+        for name in report['root_causes']:
+            if name in messages:
+                problems.append(messages[name])
+
         if not problems:
             return "Todos los sistemas vitales (Red, Disco, Memoria) parecen nominales."
         else:
@@ -58,49 +140,38 @@ class Sherlock:
         Main entry point for diagnosis.
         """
         logger.info(f"Sherlock: Diagnosing '{problem_description}'...")
-        
-        # 1. Identify Concepts (Simplified)
-        concepts = [word for word in self.command_map.keys() if word in problem_description.lower()]
-        
+        text = problem_description.lower()
+
+        # 1. Identify Concepts
+        concepts = [name for name in self.probes if name in text]
+
         if not concepts:
-            # Try to infer from Knowledge Graph
-            # e.g. "web" -> infer "nginx"
-            pass 
+            # Try to infer from Knowledge Graph, e.g. "web" -> "nginx"
+            for word in [text] + text.split():
+                try:
+                    inferred = self.db.infer_problems(word)
+                except Exception:
+                    inferred = []
+                concepts.extend(c for c in inferred if c in self.probes and c not in concepts)
 
         if not concepts:
             return "No tengo ni idea de qué me hablas, Watson. Sé más específico."
 
-        # 2. Execute Diagnostics
-        report = []
-        for concept in concepts:
-            cmd = self.command_map.get(concept)
-            if cmd:
-                self.event_queue.put({'type': 'speak', 'text': f"Comprobando {concept}..."})
-                result = self._run_command(cmd)
-                status = "OK" if result['success'] else "FALLO"
-                report.append(f"{concept}: {status}")
-                
-                # Knowledge Graph Pathfinding (if failed)
-                if not result['success']:
-                    self.event_queue.put({'type': 'speak', 'text': f"¡Ojo! {concept} ha fallado. Buscando culpables..."})
-                    # Find dependencies
-                    # e.g. nginx failed -> check port 80? check config?
-                    pass
-
-        if report:
-            return "Diagnóstico finalizado: " + ", ".join(report)
-        
-        return "No he podido ejecutar ninguna prueba."
+        # 2. Execute Diagnostics (dependencies are added and checked first)
+        self.event_queue.put({'type': 'speak', 'text': f"Comprobando {', '.join(concepts)}..."})
+        report = self.report(concepts)
 
-    def _run_command(self, cmd):
-        try:
-            # SECURITY WARNING: This executes shell commands.
-            # Ensure cmd comes from trusted self.command_map only.
-            result = subprocess.run(cmd, shell=True, capture_output=True, text=True, timeout=5)
-            return {
-                'success': result.returncode == 0,
-                'output': result.stdout
-            }
-        except Exception as e:
-            logger.error(f"Sherlock Execution Error: {e}")
-            return {'success': False, 'output': str(e)}
+        lines = []
+        for name, result in report['probes'].items():
+            line = f"{name}: {STATUS_LABELS.get(result['status'], result['status'])}"
+            if result.get('blocked_by'):
+                line += f" (depende de {', '.join(result['blocked_by'])})"
+            lines.append(line)
+
+        if report['root_causes']:
+            self.event_queue.put({'type': 'speak', 'text': f"¡Ojo! El origen parece ser: {', '.join(report['root_causes'])}."})
+
+        if lines:
+            return "Diagnóstico finalizado: " + ", ".join(lines)
+
+        return "No he podido ejecutar ninguna prueba."
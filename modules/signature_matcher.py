@@ -0,0 +1,243 @@
+"""
+Compiled multi-pattern matcher for Guard log signatures.
+
+All literal patterns of a signature set are compiled into one Aho-Corasick
+automaton (pyahocorasick) or, without it, one trie-shaped regex. Each line is
+scanned once whatever the number of signatures; only the signatures that hit
+pay for field extraction. A handful of literals without pyahocorasick are
+checked with plain `in` instead: below PLAIN_LITERALS_MAX that is faster than
+driving the regex engine. Regex signatures share one combined prefilter
+(without group names, which may repeat across signatures); those that cannot
+be combined (backreferences, global inline flags) are searched on every line.
+
+Signature fields used here (data/attack_signatures.json):
+    pattern   literal substring
+    regex     regular expression (alternative to pattern; named groups become fields)
+    key       field the sliding window is kept per (e.g. "ip", "user")
+    distinct_threshold  alert when this many different keys hit within the window
+
+Built-in fields: ip (sshd "from <ip>", PAM "rhost=<ip>") and user.
+"""
+import re
+import time
+from collections import deque, OrderedDict, Counter
+
+try:
+    import ahocorasick
+    AHOCORASICK_AVAILABLE = True
+except ImportError:
+    AHOCORASICK_AVAILABLE = False
+
+FIELD_PATTERNS = {
+    'ip': re.compile(r'(?:\bfrom|\brhost=)\s*(?P<ip>[0-9a-fA-F:.]*[0-9a-fA-F])'),
+    'user': re.compile(r'(?:\bfor (?:invalid user )?|\buser=|\bruser=|\binvalid user )(?P<user>[^\s;]+)')
+}
+
+MAX_KEYS_PER_SIGNATURE = 10000 # bound memory when keys are attacker-controlled
+PLAIN_LITERALS_MAX = 16 # up to this many literals, substring checks beat the trie regex
+
+NAMED_GROUP = re.compile(r'(?<!\\)\(\?P<\w+>')
+NOT_COMBINABLE = re.compile(r'\(\?P=|\\[1-9]|\\g<|^\(\?[aiLmsux]+\)')
+
+
+def trie_regex(literals):
+    """
+    One regex matching any of `literals`, shaped as a prefix trie so the engine
+    follows a single branch per position instead of trying every alternative.
+    Used as a prefilter: it stops at the shortest literal found.
+    """
+    trie = {}
+    for literal in literals:
+        node = trie
+        for ch in literal:
+            node = node.setdefault(ch, {})
+        node[''] = True
+
+    def build(node):
+        if '' in node:
+            return '' # a literal ends here: enough for "line contains something"
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items())]
+        return branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+
+    return build(trie) if trie else None
+
+
+def prefilter_pattern(pattern):
+    """
+    `pattern` for the combined prefilter: named groups become non-capturing
+    (two signatures may both define (?P<ip>...)). None when it cannot be
+    combined (backreferences, global inline flags).
+    """
+    if NOT_COMBINABLE.search(pattern):
+        return None
+    return NAMED_GROUP.sub('(?:', pattern)
+
+
+def prefix_extensions(literals):
+    """{literal: [longer literals starting with it]}. Sorting keeps those contiguous."""
+    ordered = sorted(literals)
+    result = {}
+    for i, literal in enumerate(ordered):
+        longer = []
+        for other in ordered[i + 1:]:
+            if not other.startswith(literal):
+                break
+            longer.append(other)
+        result[literal] = longer
+    return result
+
+
+class SignatureMatcher:
+    def __init__(self, signatures, use_ahocorasick=True):
+        self.signatures = [s for s in signatures if s.get('pattern') or s.get('regex')]
+        self.literals = {} # literal -> [signature]
+        self.regexes = [] # (compiled, signature)
+        self.unfiltered = [] # regexes searched on every line (not in the prefilter)
+        for sig in self.signatures:
+            if sig.get('regex'):
+                self.regexes.append((re.compile(sig['regex']), sig))
+            else:
+                self.literals.setdefault(sig['pattern'], []).append(sig)
+
+        self.automaton = None
+        self.prefilter = None
+        if self.literals and use_ahocorasick and AHOCORASICK_AVAILABLE:
+            self.automaton = ahocorasick.Automaton()
+            for literal in self.literals:
+                self.automaton.add_word(literal, literal)
+            self.automaton.make_automaton()
+        self.finder = None
+        self.plain = None
+        if self.automaton is None and 0 < len(self.literals) <= PLAIN_LITERALS_MAX:
+            self.plain = list(self.literals)
+        elif self.automaton is None and self.literals:
+            # Zero-width lookahead: one match per position where some literal starts (overlaps included)
+            trie = trie_regex(self.literals)
+            self.literal_filter = re.compile(trie) # fast reject: most lines match nothing
+            self.finder = re.compile(f'(?=({trie}))')
+            # The finder reports the shortest literal at each position; longer ones sharing it as prefix are checked apart
+            self.extensions = prefix_extensions(self.literals)
+        if self.regexes:
+            combinable = [(prefilter_pattern(rx.pattern), rx, sig) for rx, sig in self.regexes]
+            self.unfiltered = [(rx, sig) for pattern, rx, sig in combinable if pattern is None]
+            patterns = [pattern for pattern, _, _ in combinable if pattern is not None]
+            if patterns:
+                try:
+                    self.prefilter = re.compile('|'.join(f'(?:{p})' for p in patterns))
+                except re.error:
+                    self.unfiltered = list(self.regexes) # correct, just slower
+
+    @property
+    def engine(self):
+        if self.automaton is not None:
+            return 'aho-corasick'
+        return 'substring' if self.plain is not None else 'regex'
+
+    def match(self, line):
+        """[(signature, key, fields)] for every signature the line matches."""
+        if self.automaton is not None:
+            found = {literal for _, literal in self.automaton.iter(line)}
+        elif self.plain is not None:
+            found = ()
+            for literal in self.plain:
+                if literal in line:
+                    found = [literal for literal in self.plain if literal in line]
+                    break
+        elif self.finder is not None and self.literal_filter.search(line):
+            found = set()
+            for m in self.finder.finditer(line):
+                literal = m.group(1)
+                found.add(literal)
+                for longer in self.extensions[literal]:
+                    if line.startswith(longer, m.start()):
+                        found.add(longer)
+        else:
+            found = ()
+        if not found and not self.regexes:
+            return [] # the common case: nothing to extract
+
+        hits = [(sig, {}) for literal in found for sig in self.literals[literal]]
+        if self.prefilter is not None and self.prefilter.search(line):
+            hits.extend(self._regex_hits(line, self.regexes))
+        elif self.unfiltered:
+            hits.extend(self._regex_hits(line, self.unfiltered))
+        return [(sig, *self._key(sig, line, fields)) for sig, fields in hits]
+
+    def _regex_hits(self, line, regexes):
+        hits = []
+        for rx, sig in regexes:
+            m = rx.search(line)
+            if m:
+                hits.append((sig, {k: v for k, v in m.groupdict().items() if v is not None}))
+        return hits
+
+    def _key(self, sig, line, fields):
+        key_name = sig.get('key')
+        if key_name and key_name not in fields and key_name in FIELD_PATTERNS:
+            m = FIELD_PATTERNS[key_name].search(line)
+            if m:
+                fields = dict(fields, **{key_name: m.group(key_name)})
+        return (fields.get(key_name) if key_name else None), fields
+
+
+class WindowCounter:
+    """
+    Sliding-window hit counters per (signature, key).
+
+    hit() returns None or an alert dict:
+      {'kind': 'threshold', 'key': ...}  one key reached `threshold` within the window
+      {'kind': 'distinct', 'keys': n}     `distinct_threshold` different keys within the window
+    After an alert the counter involved is reset (simple cooldown).
+    """
+    def __init__(self, max_keys=MAX_KEYS_PER_SIGNATURE):
+        self.max_keys = max_keys
+        self.windows = {} # sig_id -> OrderedDict(key -> deque[timestamps])
+        self.spread = {} # sig_id -> (deque[(timestamp, key)], Counter(key))
+        self.window_seconds = {}
+
+    def hit(self, sig, key=None, timestamp=None):
+        timestamp = timestamp or time.time()
+        sig_id = sig['id']
+        window = self.window_seconds[sig_id] = sig.get('window_seconds', 60)
+        horizon = timestamp - window
+
+        per_key = self.windows.setdefault(sig_id, OrderedDict())
+        hits = per_key.get(key)
+        if hits is None:
+            hits = per_key[key] = deque()
+            if len(per_key) > self.max_keys:
+                per_key.popitem(last=False) # oldest key
+        else:
+            per_key.move_to_end(key)
+        hits.append(timestamp)
+        while hits and hits[0] < horizon:
+            hits.popleft()
+
+        if len(hits) >= sig.get('threshold', 1):
+            hits.clear()
+            return {'kind': 'threshold', 'key': key, 'count': sig.get('threshold', 1)}
+
+        distinct = sig.get('distinct_threshold')
+        if distinct and key is not None:
+            spread, counts = self.spread.setdefault(sig_id, (deque(), Counter()))
+            spread.append((timestamp, key))
+            counts[key] += 1
+            while spread and spread[0][0] < horizon:
+                _, old = spread.popleft()
+                counts[old] -= 1
+                if not counts[old]:
+                    del counts[old]
+            if len(counts) >= distinct:
+                keys = len(counts)
+                spread.clear()
+                counts.clear()
+                return {'kind': 'distinct', 'keys': keys}
+        return None
+
+    def prune(self, now=None):
+        """Drop keys with no hits inside their window (call now and then)."""
+        now = now or time.time()
+        for sig_id, per_key in self.windows.items():
+            horizon = now - self.window_seconds.get(sig_id, 60)
+            for key in [k for k, hits in per_key.items() if not hits or hits[-1] < horizon]:
+                del per_key[key]
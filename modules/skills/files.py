@@ -4,15 +4,20 @@ import threading
 import time
 from datetime import datetime
 
+from modules.file_indexer import FileIndexer, DEFAULT_EXCLUDES
+from modules.fs_watcher import FsWatcher
+
 class FilesSkill(BaseSkill):
-    def __init__(self, core):
+    def __init__(self, core, scan_on_start=True):
         super().__init__(core)
         self.scanning = False
         self.last_scan = None
-        self.last_scan = None
+        self.indexer = None
+        self.watcher = None
         
-        # Force initial scan on startup (in background)
-        threading.Thread(target=self.run_indexing, daemon=True).start()
+        # Initial scan in background (NeoCore defers it to the startup warm-up instead)
+        if scan_on_start:
+            threading.Thread(target=self.run_indexing, daemon=True).start()
         
         self.schedule_scan()
 
@@ -28,61 +33,69 @@ class FilesSkill(BaseSkill):
             self.core.app_logger.error(f"Error scheduling scan: {e}")
 
     def _scan_loop(self, interval):
+        # The initial scan is handled separately
         while True:
-            self.run_indexing()
             time.sleep(interval)
+            self.run_indexing(force=True)
+
+    def _get_indexer(self):
+        if self.indexer is None:
+            config = self.core.skills_config.get('files', {}).get('config', {})
+            self.indexer = FileIndexer(
+                self.core.db.db_path,
+                config.get('scan_paths', []),
+                config.get('scan_types', []),
+                exclude_dirs=config.get('exclude_dirs', DEFAULT_EXCLUDES)
+            )
+        return self.indexer
 
-    def run_indexing(self):
-        """Ejecuta el escaneo e indexación."""
+    def run_indexing(self, force=False):
+        """
+        Ejecuta el escaneo e indexación incremental (solo escribe lo que ha cambiado).
+        Sin force, se salta si el último escaneo completo es más reciente que scan_interval
+        (un escaneo interrumpido se reanuda siempre).
+        """
         if self.scanning: return
         self.scanning = True
-        self.core.app_logger.info("Starting file system scan...")
         
         try:
             config = self.core.skills_config.get('files', {}).get('config', {})
-            paths = config.get('scan_paths', [])
-            extensions = config.get('scan_types', [])
-            
-            # Clear old index? Maybe partial updates are better, but for now full re-index is safer
-            self.core.db.clear_file_index()
-            
-            count = 0
-            count = 0
-            for raw_path in paths:
-                path = os.path.expanduser(raw_path)
-                if not os.path.exists(path): continue
-                for root, dirs, files in os.walk(path):
-                    for file in files:
-                        ext = file.split('.')[-1].lower() if '.' in file else ''
-                        if not extensions or ext in extensions:
-                            full_path = os.path.join(root, file)
-                            try:
-                                stats = os.stat(full_path)
-                                self.core.db.index_file(
-                                    full_path, 
-                                    file, 
-                                    ext, 
-                                    stats.st_size, 
-                                    datetime.fromtimestamp(stats.st_mtime)
-                                )
-                                count += 1
-                            except Exception as e:
-                                pass # Permission error etc
-            
-            self.core.app_logger.info(f"Scan complete. Indexed {count} files.")
-            self.last_scan = datetime.now()
+            indexer = self._get_indexer()
+            max_age = config.get('scan_interval', 24) * 3600
+            if not force and time.time() - indexer.last_finished() < max_age:
+                self.core.app_logger.info("File index is recent, skipping startup scan.")
+                self._start_watcher(config)
+                return
+
+            self.core.app_logger.info("Starting file system scan...")
+            stats = indexer.run()
+            if stats:
+                self.core.app_logger.info(f"Scan complete. {stats['files']} files, {stats['added']} new, "
+                                          f"{stats['updated']} changed, {stats['deleted']} removed.")
+                self.last_scan = datetime.now()
+            self._start_watcher(config)
         except Exception as e:
             self.core.app_logger.error(f"Error during scan: {e}")
         finally:
             self.scanning = False
 
+    def _start_watcher(self, config):
+        """Mantiene el índice al día entre escaneos (inotify sobre scan_paths)."""
+        if self.watcher is not None or not config.get('enable_indexing', False) or not config.get('watch_changes', True):
+            return
+        self.watcher = FsWatcher(
+            self.indexer,
+            max_watches=config.get('max_watches', 100000),
+            coalesce=config.get('watch_coalesce', 2.0)
+        ).start()
+
     def scan_now(self, command, response, **kwargs):
         """Comando de voz para forzar escaneo."""
         self.speak("Iniciando escaneo del sistema. Esto puede tardar un poco.")
         threading.Thread(target=self._run_scan_async).start()
 
     def _run_scan_async(self):
-        self.run_indexing()
+        self.run_indexing(force=True)
         self.speak("Escaneo de archivos completado.")
 
     def search_file(self, command, response, **kwargs):
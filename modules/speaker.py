@@ -6,7 +6,12 @@ import hashlib
 import json
 import time
 import shlex
+import signal
+import wave
+import numpy as np
+from collections import OrderedDict
 from modules.logger import tts_logger
+from modules.tracing import tracer
 
 try:
     from piper import PiperVoice
@@ -15,6 +20,7 @@ except ImportError:
     PIPER_AVAILABLE = False
 
 CACHE_DIR = "tts_cache"
+WAV_LEVELS_MAX = 128 # niveles RMS recordados (LRU por ruta de la caché de TTS)
 if not os.path.exists(CACHE_DIR):
     os.makedirs(CACHE_DIR)
 
@@ -25,6 +31,10 @@ class Speaker:
         self._is_busy = False
         self.is_available = False
         self.voice = None # PiperVoice instance
+        self._current_proc = None # Proceso de reproducción en curso (interrumpible)
+        self._stop_event = threading.Event()
+        self.output_level = 0.0 # RMS de la salida actual (referencia para supresión de eco)
+        self._wav_levels = OrderedDict()
         
         # Load Config
         self.config = self._load_config()
@@ -118,6 +128,7 @@ class Speaker:
     def _process_queue(self):
         while True:
             item = self.speak_queue.get()
+            self._stop_event.clear()
             
             # Handle WAV file directly
             if isinstance(item, dict) and item.get('type') == 'wav':
@@ -126,17 +137,25 @@ class Speaker:
                 self._is_busy = True
                 try:
                     self.event_queue.put({'type': 'speaker_status', 'status': 'speaking'})
-                    subprocess.run(f'aplay -q "{file_path}"', shell=True, check=True, timeout=5)
+                    self.output_level = self._wav_level(file_path)
+                    self._play(f'aplay -q "{file_path}"', timeout=5)
                 except Exception as e:
                     tts_logger.error(f"Error reproduciendo WAV: {e}")
                 finally:
                     self._is_busy = False
+                    self.output_level = 0.0
                     self.event_queue.put({'type': 'speaker_status', 'status': 'idle'})
                     self.speak_queue.task_done()
                 continue
 
             # Handle Text
-            text = item
+            trace_id = None
+            if isinstance(item, dict):
+                trace_id = item.get('trace_id')
+                tracer.record('tts_queue', time.time() - item['queued'], trace_id)
+                text = item['text']
+            else:
+                text = item
             tts_logger.info(f"Speaker Queue recibió: '{text}'")
             self._is_busy = True
             try:
@@ -160,7 +179,9 @@ class Speaker:
                         command = f'aplay -q "{cache_file}"'
                         if command:
                             self.event_queue.put({'type': 'speaker_status', 'status': 'speaking'})
-                            subprocess.run(command, shell=True, capture_output=True, text=True, timeout=15)
+                            self.output_level = self._wav_level(cache_file)
+                            tracer.mark('first_audio', trace_id)
+                            self._play(command, timeout=15)
                     else:
                         # Generate Audio
 
@@ -171,19 +192,27 @@ class Speaker:
                                 # Python API Mode
                                 try:
                                     stream = self.voice.synthesize(text)
-                                    first_chunk = next(stream)
+                                    with tracer.span('tts_synth', trace_id, engine='piper'):
+                                        first_chunk = next(stream)
                                     rate = str(first_chunk.sample_rate)
                                     aplay_cmd = ['aplay', '-r', rate, '-f', 'S16_LE', '-t', 'raw', '-q']
-                                    with subprocess.Popen(aplay_cmd, stdin=subprocess.PIPE) as proc:
-                                        proc.stdin.write(first_chunk.audio_int16_bytes)
+                                    with subprocess.Popen(aplay_cmd, stdin=subprocess.PIPE, start_new_session=True) as proc:
+                                        self._current_proc = proc
+                                        tracer.mark('first_audio', trace_id)
+                                        self._write_chunk(proc, first_chunk.audio_int16_bytes)
                                         for chunk in stream:
-                                            proc.stdin.write(chunk.audio_int16_bytes)
+                                            if self._stop_event.is_set():
+                                                break
+                                            self._write_chunk(proc, chunk.audio_int16_bytes)
                                         proc.stdin.close()
                                         proc.wait(timeout=15)
                                 except StopIteration:
                                     pass
                                 except Exception as e:
-                                    tts_logger.error(f"Error crítico en Piper (Python): {e}")
+                                    if not self._stop_event.is_set():
+                                        tts_logger.error(f"Error crítico en Piper (Python): {e}")
+                                finally:
+                                    self._current_proc = None
                             
                             else:
                                 # Binary Mode
@@ -209,10 +238,12 @@ class Speaker:
                                         cmd = f'echo {safe_text} | "{piper_bin}" --model "{model_path}" --output_raw | aplay -r 22050 -f S16_LE -t raw -q'
                                         
                                         tts_logger.info(f"Ejecutando Piper Binary: {cmd}")
-                                        subprocess.run(cmd, shell=True, check=True, timeout=15)
+                                        # Síntesis y reproducción van en la misma tubería: sólo se mide el arranque
+                                        tracer.mark('first_audio', trace_id)
+                                        returncode = self._play(cmd, timeout=15)
+                                        if returncode != 0 and not self._stop_event.is_set():
+                                            tts_logger.error(f"Error ejecutando Piper Binary: código {returncode}")
                                         
-                                    except subprocess.CalledProcessError as e:
-                                        tts_logger.error(f"Error ejecutando Piper Binary: {e}")
                                     except Exception as e:
                                         tts_logger.error(f"Error general en Piper Binary: {e}")
                                 else:
@@ -222,12 +253,15 @@ class Speaker:
                             safe_text = shlex.quote(text)
                             bin_name = 'espeak-ng' if self.engine == 'espeak-ng' else 'espeak'
                             gen_cmd = f'{bin_name} {self.espeak_args} -w "{cache_file}" {safe_text}'
-                            subprocess.run(gen_cmd, shell=True, check=True, timeout=10)
+                            with tracer.span('tts_synth', trace_id, engine=bin_name):
+                                subprocess.run(gen_cmd, shell=True, check=True, timeout=10)
                             command = f'aplay -q "{cache_file}"'
                             
                             if command:
                                 self.event_queue.put({'type': 'speaker_status', 'status': 'speaking'})
-                                subprocess.run(command, shell=True, capture_output=True, text=True, timeout=15)
+                                self.output_level = self._wav_level(cache_file)
+                                tracer.mark('first_audio', trace_id)
+                                self._play(command, timeout=15)
                                 
             except subprocess.TimeoutExpired:
                 tts_logger.error(f"Timeout en Speaker ({self.engine}) procesando: '{text}'")
@@ -235,11 +269,84 @@ class Speaker:
                 tts_logger.error(f"Error en Speaker ({self.engine}): {e}")
             finally:
                 self._is_busy = False
+                self.output_level = 0.0
                 self.event_queue.put({'type': 'speaker_status', 'status': 'idle'})
                 self.speak_queue.task_done()
 
-    def speak(self, text):
-        if self.is_available: self.speak_queue.put(text)
+    def _play(self, command, timeout=15):
+        """Ejecuta un comando de reproducción en su propio grupo de procesos para poder cortarlo con stop()."""
+        proc = subprocess.Popen(command, shell=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                                start_new_session=True)
+        self._current_proc = proc
+        try:
+            proc.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            self._kill(proc)
+            raise
+        finally:
+            self._current_proc = None
+        return proc.returncode
+
+    def _write_chunk(self, proc, audio_bytes):
+        """Escribe PCM en aplay y actualiza el nivel de referencia de salida."""
+        samples = np.frombuffer(audio_bytes, dtype=np.int16).astype(np.float32)
+        if len(samples):
+            level = float(np.sqrt(np.dot(samples, samples) / len(samples)))
+            self.output_level = level if self.output_level == 0 else 0.7 * self.output_level + 0.3 * level
+        proc.stdin.write(audio_bytes)
+
+    def _wav_level(self, file_path):
+        """RMS de un WAV (cacheado por ruta) usado como referencia de eco."""
+        if file_path in self._wav_levels:
+            self._wav_levels.move_to_end(file_path)
+            return self._wav_levels[file_path]
+        level = 0.0
+        try:
+            with wave.open(file_path, 'rb') as wf:
+                if wf.getsampwidth() == 2:
+                    samples = np.frombuffer(wf.readframes(wf.getnframes()), dtype=np.int16).astype(np.float32)
+                    if len(samples):
+                        level = float(np.sqrt(np.dot(samples, samples) / len(samples)))
+        except Exception:
+            pass
+        self._wav_levels[file_path] = level
+        if len(self._wav_levels) > WAV_LEVELS_MAX:
+            self._wav_levels.popitem(last=False)
+        return level
+
+    def _kill(self, proc):
+        try:
+            # Sólo matar el grupo si el proceso es su líder (lanzado con start_new_session)
+            if os.getpgid(proc.pid) == proc.pid:
+                os.killpg(proc.pid, signal.SIGTERM)
+            else:
+                proc.kill()
+        except Exception:
+            try:
+                proc.kill()
+            except Exception:
+                pass
+
+    def stop(self):
+        """Corta la reproducción actual y vacía la cola (barge-in)."""
+        self._stop_event.set()
+        dropped = 0
+        while True:
+            try:
+                self.speak_queue.get_nowait()
+                self.speak_queue.task_done()
+                dropped += 1
+            except queue.Empty:
+                break
+
+        proc = self._current_proc
+        if proc and proc.poll() is None:
+            self._kill(proc)
+        tts_logger.info(f"Speaker detenido (barge-in). Mensajes descartados: {dropped}")
+
+    def speak(self, text, trace_id=None):
+        if self.is_available:
+            self.speak_queue.put({'type': 'text', 'text': text, 'trace_id': trace_id, 'queued': time.time()})
     
     def play_wav(self, file_path):
         """Reproduce un archivo WAV directamente."""
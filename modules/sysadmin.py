@@ -5,6 +5,11 @@ import socket
 import platform
 import time
 
+from modules.system_sampler import get_sampler
+from modules.systemd_client import get_systemd
+from modules.flag_index import get_flag_index
+from modules.command_runner import get_runner
+
 class SysAdminManager:
     """
     Gestor de administración del sistema.
@@ -17,47 +22,19 @@ class SysAdminManager:
     def get_cpu_temp(self):
         """
         Obtiene la temperatura de la CPU de forma compatible con múltiples sistemas.
-        Intenta usar psutil primero, luego fallback a ficheros de sistema (Raspberry Pi).
+        Se lee del muestreador en segundo plano (psutil con fallback a thermal_zone0).
         """
-        try:
-            # Método 1: psutil.sensors_temperatures() (Linux estándar)
-            temps = psutil.sensors_temperatures()
-            if temps:
-                # Busca sensores comunes
-                for name in ['cpu_thermal', 'coretemp', 'k10temp', 'acpitz']:
-                    if name in temps:
-                        # Devuelve la temperatura del primer núcleo/sensor encontrado
-                        return f"{temps[name][0].current:.1f}°C"
-                
-                # Si no coincide con nombres conocidos, devuelve el primero que encuentre
-                first_key = list(temps.keys())[0]
-                return f"{temps[first_key][0].current:.1f}°C"
-        except Exception as e:
-            logging.error(f"Error leyendo temperatura con psutil: {e}")
-
-        # Método 2: Fallback específico para Raspberry Pi
-        try:
-            with open("/sys/class/thermal/thermal_zone0/temp", "r") as f:
-                temp = int(f.read()) / 1000.0
-            return f"{temp:.1f}°C"
-        except FileNotFoundError:
-            pass
-
-        return "N/A"
+        temp = get_sampler().snapshot().get('temp')
+        return f"{temp:.1f}°C" if temp is not None else "N/A"
 
     def get_cpu_usage(self):
-        """Obtiene el porcentaje de uso de la CPU."""
-        try:
-            return f"{psutil.cpu_percent(interval=0.1)}%"
-        except Exception:
-            return "N/A"
+        """Obtiene el porcentaje de uso de la CPU (última muestra, no bloquea)."""
+        cpu = get_sampler().snapshot().get('cpu_percent')
+        return f"{cpu}%" if cpu is not None else "N/A"
 
     def get_disk_usage(self):
         """Devuelve el uso de disco en porcentaje."""
-        try:
-            return psutil.disk_usage('/').percent
-        except:
-            return 0
+        return get_sampler().snapshot().get('disk_percent') or 0
 
     def get_top_processes(self, limit=10):
         """Devuelve los procesos que más recursos consumen."""
@@ -79,11 +56,8 @@ class SysAdminManager:
 
     def get_ram_usage(self):
         """Obtiene el porcentaje de uso de la memoria RAM."""
-        try:
-            ram = psutil.virtual_memory()
-            return f"{ram.percent}%"
-        except Exception:
-            return "N/A"
+        ram = get_sampler().snapshot().get('ram_percent')
+        return f"{ram}%" if ram is not None else "N/A"
 
     def get_full_status(self):
         """Devuelve un resumen textual del estado del sistema (CPU, Disco, RAM)."""
@@ -97,15 +71,7 @@ class SysAdminManager:
     def is_service_installed(self, service_name):
         """Comprueba si un servicio existe en el sistema (instalado/loaded)."""
         try:
-            # Opción 1: Check unit file presence
-            # systemctl list-unit-files <name>*
-            cmd = subprocess.run(
-                ['systemctl', 'list-unit-files', f'{service_name}*', '--no-pager'], 
-                capture_output=True, text=True
-            )
-            # Si el servicio aparece en la salida, existe.
-            # Ojo: '0 unit files listed' indica que no existe.
-            return service_name in cmd.stdout
+            return get_systemd().is_installed(service_name)
         except Exception:
             return False
 
@@ -122,18 +88,9 @@ class SysAdminManager:
                 'mysql', 'mariadb', 'fail2ban', 'bluetooth'
             ]
             
-        status_list = []
-        
-        for srv in services:
-            try:
-                # systemctl is-active devuelve 0 si activo, otro si no
-                cmd = subprocess.run(['systemctl', 'is-active', srv], capture_output=True, text=True)
-                state = cmd.stdout.strip()
-                status_list.append({'name': srv, 'status': state})
-            except Exception:
-                status_list.append({'name': srv, 'status': 'unknown'})
-        
-        return status_list
+        # Una sola consulta (D-Bus o `systemctl show`) para todos los servicios
+        states = get_systemd().get_states(services)
+        return [{'name': srv, 'status': states[srv]['active']} for srv in services]
 
     def control_service(self, service_name, action):
         """
@@ -191,28 +148,33 @@ class SysAdminManager:
         """
         Ejecuta un comando de shell y devuelve la salida (stdout + stderr).
         Soporta timeout de 10 segundos y directorio de trabajo personalizado.
+        La salida se acota en memoria (cabeza y cola si es muy grande).
         """
+        runner = get_runner()
         try:
-            # Ejecutar comando con timeout de 10s
-            result = subprocess.run(
-                command, 
-                shell=True, 
-                capture_output=True, 
-                text=True, 
-                timeout=10,
-                cwd=cwd
-            )
-            
-            output = result.stdout + result.stderr
+            job = runner.run(command, cwd=cwd, timeout=10)
+        except Exception as e:
+            return False, str(e)
+        try:
+            output = job.output.text(limit=runner.max_memory)
+            if job.timed_out:
+                return False, "Error: El comando excedió el tiempo límite." + (f"\n{output}" if output else "")
+            if job.error:
+                return False, job.error
             if "sudo: a terminal is required" in output:
                 output += "\n(Error: sudo requiere contraseña. Configura 'visudo' o añade la contraseña en config.)"
                 return False, output
-                
+
             return True, output
-        except subprocess.TimeoutExpired:
-            return False, "Error: El comando excedió el tiempo límite."
-        except Exception as e:
-            return False, str(e)
+        finally:
+            runner.release(job.id)
+
+    def run_command_stream(self, command, cwd=None, owner=None, on_output=None, on_done=None):
+        """
+        Lanza un comando sin bloquear; la salida llega por trozos a on_output(job, stream, text)
+        y on_done(job) al terminar. Retorna (job, None) o (None, "Error msg") si hay demasiados en marcha.
+        """
+        return get_runner().start(command, cwd=cwd, owner=owner, on_output=on_output, on_done=on_done)
 
     def get_file_completions(self, partial_name, cwd):
         """
@@ -349,56 +311,12 @@ class SysAdminManager:
     def validate_command_flags(self, command):
         """
         Valida si los flags utilizados en un comando son válidos consultando la ayuda (--help) del ejecutable.
+        La ayuda se indexa una sola vez por binario (ruta + mtime) en data/flag_index.json,
+        así que normalmente no se lanza ningún proceso.
         Retorna: (True, None) si es válido, (False, "Error msg") si no.
         """
         try:
-            parts = command.strip().split()
-            if not parts:
-                return False, "Comando vacío"
-            
-            executable = parts[0]
-            # Solo validar flags que empiezan con -
-            flags = [p for p in parts[1:] if p.startswith('-')]
-            
-            if not flags:
-                return True, None
-                
-            # Obtener ayuda (limitado a 5s para no bloquear)
-            # Probamos --help primero, es el estándar más rápido
-            try:
-                help_proc = subprocess.run(
-                    [executable, '--help'], 
-                    capture_output=True, 
-                    text=True, 
-                    timeout=5
-                )
-                help_text = help_proc.stdout + help_proc.stderr
-            except (subprocess.TimeoutExpired, FileNotFoundError):
-                # Si falla --help o no encuentra el ejecutable, no podemos validar.
-                # Asumimos válido para no bloquear comandos legítimos sin --help.
-                # O podríamos devolver warning.
-                return True, None 
-            
-            invalid_flags = []
-            for flag in flags:
-                # Limpiar flag (ej. --sort=size -> --sort)
-                clean_flag = flag.split('=')[0]
-                
-                # Búsqueda simple: ¿Está el string del flag en el texto de ayuda?
-                # Esto puede dar falsos positivos pero reduce falsos negativos.
-                if clean_flag not in help_text:
-                    invalid_flags.append(flag)
-            
-            if invalid_flags:
-                return False, f"Flags posiblemente inválidos detectados: {', '.join(invalid_flags)} para el comando '{executable}'"
-            
-            return True, None
-
-            if invalid_flags:
-                return False, f"Flags posiblemente inválidos detectados: {', '.join(invalid_flags)} para el comando '{executable}'"
-            
-            return True, None
-
+            return get_flag_index().validate(command)
         except Exception as e:
             logging.error(f"Error validando flags: {e}")
             return True, None # Fail safe open
@@ -0,0 +1,212 @@
+"""
+Background system sampler: one thread reads CPU, per-core usage, RAM, temps,
+disk, network IO and load average every `interval` seconds.
+
+Each tick builds a new snapshot dict and swaps the reference, so readers
+(web_admin, HealthManager, Guard, SysAdminManager) never lock or block and
+never call psutil themselves. The last `history` snapshots are kept in a
+ring buffer for the dashboard charts.
+"""
+import os
+import time
+import logging
+import threading
+from collections import deque
+
+from modules.metrics import registry
+
+try:
+    import psutil
+    PSUTIL_AVAILABLE = True
+except ImportError:
+    PSUTIL_AVAILABLE = False
+
+logger = logging.getLogger("SystemSampler")
+
+# Preferred temperature sensors, in order
+TEMP_SENSORS = ['cpu_thermal', 'coretemp', 'k10temp', 'acpitz']
+THERMAL_ZONE = "/sys/class/thermal/thermal_zone0/temp"
+TEMP_RESCAN_SECONDS = 300 # Re-discover the sensor now and then (hotplug, driver load)
+
+
+class SystemSampler:
+    def __init__(self, interval=2.0, history=300, disk_path='/'):
+        self.interval = max(0.5, float(interval))
+        self.disk_path = disk_path
+        self.history_buffer = deque(maxlen=int(history))
+        self._snapshot = {}
+        self._last_net = None
+        self._temp_sensor = None
+        self._temp_scanned_at = 0
+        self._running = False
+        self._thread = None
+        self.listeners = [] # callables receiving each new snapshot
+
+    # --- Lifecycle ---
+
+    def start(self):
+        if self._running:
+            return self
+        self._running = True
+        if PSUTIL_AVAILABLE:
+            # First cpu_percent(interval=None) call only primes the counters
+            psutil.cpu_percent(interval=None, percpu=True)
+        self.sample()
+        self._thread = threading.Thread(target=self._loop, daemon=True, name="SystemSampler")
+        self._thread.start()
+        logger.info(f"System sampler started (every {self.interval}s, {self.history_buffer.maxlen} samples)")
+        return self
+
+    def stop(self):
+        self._running = False
+
+    def _loop(self):
+        while self._running:
+            time.sleep(self.interval)
+            try:
+                self.sample()
+            except Exception as e:
+                logger.error(f"Sampling failed: {e}")
+
+    def add_listener(self, callback):
+        """Called from the sampler thread with every new snapshot (keep it cheap)."""
+        self.listeners.append(callback)
+
+    # --- Readers ---
+
+    def snapshot(self):
+        """Latest sample (a dict that is never mutated after publication)."""
+        return self._snapshot
+
+    def history(self, seconds=None, fields=None):
+        """Samples from the last `seconds` (all by default), optionally reduced to `fields`."""
+        samples = list(self.history_buffer)
+        if seconds:
+            since = time.time() - seconds
+            samples = [s for s in samples if s['timestamp'] >= since]
+        if fields:
+            keys = ['timestamp'] + [f for f in fields if f != 'timestamp']
+            samples = [{k: s.get(k) for k in keys} for s in samples]
+        return samples
+
+    # --- Sampling ---
+
+    def sample(self):
+        now = time.time()
+        snapshot = {'timestamp': now}
+        if PSUTIL_AVAILABLE:
+            per_core = psutil.cpu_percent(interval=None, percpu=True)
+            snapshot['cpu_percent'] = round(sum(per_core) / len(per_core), 1) if per_core else 0.0
+            snapshot['per_core'] = per_core
+
+            ram = psutil.virtual_memory()
+            snapshot['ram_percent'] = ram.percent
+            snapshot['ram_used'] = ram.used
+            snapshot['ram_total'] = ram.total
+
+            try:
+                disk = psutil.disk_usage(self.disk_path)
+                snapshot['disk_percent'] = disk.percent
+                snapshot['disk_free'] = disk.free
+            except OSError:
+                snapshot['disk_percent'] = None
+
+            snapshot.update(self._sample_net(now))
+        snapshot['temp'] = self._read_temp(now)
+        try:
+            snapshot['load'] = [round(v, 2) for v in os.getloadavg()]
+        except OSError:
+            snapshot['load'] = None
+
+        self._snapshot = snapshot # atomic reference swap
+        self.history_buffer.append(snapshot)
+        for callback in self.listeners:
+            try:
+                callback(snapshot)
+            except Exception as e:
+                logger.error(f"Sampler listener failed: {e}")
+        return snapshot
+
+    def _sample_net(self, now):
+        try:
+            net = psutil.net_io_counters()
+        except Exception:
+            return {}
+        result = {'net_bytes_sent': net.bytes_sent, 'net_bytes_recv': net.bytes_recv}
+        if self._last_net:
+            last_time, last_sent, last_recv = self._last_net
+            elapsed = now - last_time
+            if elapsed > 0:
+                # Counters can go backwards when an interface is reset
+                result['net_sent_rate'] = max(0, round((net.bytes_sent - last_sent) / elapsed))
+                result['net_recv_rate'] = max(0, round((net.bytes_recv - last_recv) / elapsed))
+        self._last_net = (now, net.bytes_sent, net.bytes_recv)
+        return result
+
+    def _read_temp(self, now):
+        """CPU temperature (°C). The sensor name is resolved once and cached."""
+        if PSUTIL_AVAILABLE and hasattr(psutil, 'sensors_temperatures'):
+            if self._temp_sensor is None and now - self._temp_scanned_at > TEMP_RESCAN_SECONDS:
+                self._temp_scanned_at = now
+                self._temp_sensor = self._find_temp_sensor()
+            if self._temp_sensor:
+                try:
+                    entries = psutil.sensors_temperatures().get(self._temp_sensor)
+                    if entries:
+                        return round(entries[0].current, 1)
+                except Exception:
+                    pass
+                self._temp_sensor = None
+
+        try:
+            with open(THERMAL_ZONE) as f:
+                return round(int(f.read()) / 1000.0, 1)
+        except (OSError, ValueError):
+            return None
+
+    def _find_temp_sensor(self):
+        try:
+            temps = psutil.sensors_temperatures()
+        except Exception as e:
+            logger.error(f"Error reading temperature sensors: {e}")
+            return None
+        if not temps:
+            return None
+        for name in TEMP_SENSORS:
+            if name in temps:
+                return name
+        return next(iter(temps))
+
+
+_sampler = None
+_sampler_lock = threading.Lock()
+
+
+def get_sampler():
+    """Process-wide sampler, started on first use with the `system_sampler` config."""
+    global _sampler
+    if _sampler is None:
+        with _sampler_lock:
+            if _sampler is None:
+                try:
+                    from modules.config_manager import ConfigManager
+                    conf = ConfigManager().get('system_sampler', {}) or {}
+                except Exception:
+                    conf = {}
+                _sampler = SystemSampler(
+                    interval=conf.get('interval', 2),
+                    history=conf.get('history', 300),
+                    disk_path=conf.get('disk_path', '/')
+                ).start()
+    return _sampler
+
+
+def _current(field):
+    # Scrape-time gauges: only report while the sampler is running
+    return _sampler.snapshot().get(field) if _sampler else None
+
+
+registry.gauge('neo_system_cpu_percent', 'Host CPU usage (sampler).', callback=lambda: _current('cpu_percent'))
+registry.gauge('neo_system_ram_percent', 'Host RAM usage (sampler).', callback=lambda: _current('ram_percent'))
+registry.gauge('neo_system_disk_percent', 'Root filesystem usage (sampler).', callback=lambda: _current('disk_percent'))
+registry.gauge('neo_system_cpu_temp_celsius', 'CPU temperature (sampler).', callback=lambda: _current('temp'))
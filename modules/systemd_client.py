@@ -0,0 +1,210 @@
+"""
+Batched systemd unit state queries.
+
+get_states() answers for any number of units with one round trip: a
+ListUnitsByNames call over D-Bus when jeepney is installed, otherwise a
+single `systemctl show` invocation for all of them. watch() subscribes to
+unit PropertiesChanged signals (D-Bus only) so failures are reported as they
+happen instead of on the next poll.
+
+Results are matched to the requested names by position (both calls answer
+in argument order), not by unit Id: an alias such as `mysql` answers with
+the Id of its unit (`mariadb.service`).
+
+The systemctl binary is configurable (`systemd.systemctl`), which also lets a
+fake script stand in for it.
+"""
+import re
+import logging
+import threading
+import subprocess
+
+try:
+    from jeepney import DBusAddress, MatchRule, HeaderFields, new_method_call
+    from jeepney.bus_messages import message_bus
+    from jeepney.io.blocking import open_dbus_connection
+    DBUS_AVAILABLE = True
+except ImportError:
+    DBUS_AVAILABLE = False
+
+logger = logging.getLogger("SystemdClient")
+
+SYSTEMD_BUS_NAME = 'org.freedesktop.systemd1'
+SYSTEMD_PATH = '/org/freedesktop/systemd1'
+UNIT_PATH_PREFIX = '/org/freedesktop/systemd1/unit/'
+SHOW_PROPERTIES = 'Id,LoadState,ActiveState,SubState'
+UNKNOWN = {'load': 'unknown', 'active': 'unknown', 'sub': 'unknown'}
+UNIT_SUFFIXES = ('.service', '.socket', '.target', '.timer', '.path', '.mount', '.automount',
+                 '.swap', '.device', '.slice', '.scope')
+
+
+def unit_name(name):
+    """'nginx' -> 'nginx.service', 'php8.2-fpm' -> 'php8.2-fpm.service'; names with a unit suffix are kept."""
+    return name if name.endswith(UNIT_SUFFIXES) else f"{name}.service"
+
+
+def unescape_path(path):
+    """D-Bus object path of a unit to its name ('nginx_2eservice' -> 'nginx.service')."""
+    tail = path[len(UNIT_PATH_PREFIX):] if path.startswith(UNIT_PATH_PREFIX) else path
+    return re.sub(r'_([0-9a-f]{2})', lambda m: chr(int(m.group(1), 16)), tail)
+
+
+def parse_show(output):
+    """
+    Parse `systemctl show -p Id,...` output (blank-line separated blocks, one per
+    argument and in argument order) into [(unit Id, state)].
+    """
+    entries = []
+    for block in output.strip().split('\n\n'):
+        props = dict(line.split('=', 1) for line in block.splitlines() if '=' in line)
+        if props.get('Id'):
+            entries.append((props['Id'], {
+                'load': props.get('LoadState', 'unknown'),
+                'active': props.get('ActiveState', 'unknown'),
+                'sub': props.get('SubState', 'unknown')
+            }))
+    return entries
+
+
+def match_requested(units, entries):
+    """
+    {requested unit: (unit Id, state)}. By position when there is one answer per
+    unit (aliases answer with another Id); by Id otherwise.
+    """
+    if len(entries) == len(units):
+        return dict(zip(units, entries))
+    by_id = {entry[0]: entry for entry in entries}
+    return {unit: by_id[unit] for unit in units if unit in by_id}
+
+
+class SystemdClient:
+    def __init__(self, systemctl='systemctl', use_dbus=True, timeout=10):
+        self.systemctl = systemctl
+        self.timeout = timeout
+        self.use_dbus = use_dbus and DBUS_AVAILABLE
+        self._conn = None
+        self._conn_lock = threading.Lock()
+        self._manager = DBusAddress(SYSTEMD_PATH, bus_name=SYSTEMD_BUS_NAME,
+                                    interface='org.freedesktop.systemd1.Manager') if DBUS_AVAILABLE else None
+        self.watch_thread = None
+
+    # --- Queries ---
+
+    def get_states(self, names):
+        """
+        {name: {'load', 'active', 'sub'}} for every requested name, in one call.
+        Units that do not exist come back with load 'not-found'.
+        """
+        units = {unit_name(n): n for n in names}
+        resolved = self._resolve(list(units))
+        return {name: resolved[unit][1] if unit in resolved else UNKNOWN for unit, name in units.items()}
+
+    def _resolve(self, units):
+        """{unit: (unit Id, state)} for the units that answered."""
+        if not units:
+            return {}
+        entries = None
+        if self.use_dbus:
+            try:
+                entries = self._dbus_states(units)
+            except Exception as e:
+                logger.warning(f"D-Bus query failed, falling back to systemctl: {e}")
+                self.use_dbus = False
+                self._conn = None
+        if entries is None:
+            entries = self._systemctl_states(units)
+        return match_requested(units, entries)
+
+    def _systemctl_states(self, units):
+        try:
+            result = subprocess.run([self.systemctl, 'show', '--no-pager', '-p', SHOW_PROPERTIES, *units],
+                                    capture_output=True, text=True, timeout=self.timeout)
+        except (OSError, subprocess.TimeoutExpired) as e:
+            logger.error(f"systemctl show failed: {e}")
+            return []
+        return parse_show(result.stdout)
+
+    def _dbus_states(self, units):
+        with self._conn_lock:
+            if self._conn is None:
+                self._conn = open_dbus_connection(bus='SYSTEM')
+            reply = self._conn.send_and_get_reply(
+                new_method_call(self._manager, 'ListUnitsByNames', 'as', (units,)), timeout=self.timeout
+            )
+        # (name, description, load, active, sub, following, path, job_id, job_type, job_path)
+        return [(u[0], {'load': u[2], 'active': u[3], 'sub': u[4]}) for u in reply.body[0]]
+
+    def is_installed(self, name):
+        return self.get_states([name])[name]['load'] not in ('not-found', 'unknown')
+
+    # --- Signals ---
+
+    def watch(self, names, callback):
+        """
+        Call `callback(name, active_state, sub_state)` from a background thread
+        whenever one of `names` changes state. Returns False when signals are
+        not available (no jeepney / no system bus): callers keep polling.
+        """
+        if not self.use_dbus:
+            return False
+        units = {unit_name(n): n for n in names}
+        # Signals carry the object path of the unit Id: register the Id of aliases too
+        for unit, (unit_id, _) in self._resolve(list(units)).items():
+            units.setdefault(unit_id, units[unit])
+        self.watch_thread = threading.Thread(target=self._watch_loop, args=(units, callback), daemon=True, name="SystemdWatch")
+        self.watch_thread.start()
+        return True
+
+    def _watch_loop(self, units, callback):
+        try:
+            conn = open_dbus_connection(bus='SYSTEM')
+            # Without Subscribe systemd does not emit unit signals to this client
+            conn.send_and_get_reply(new_method_call(self._manager, 'Subscribe'), timeout=self.timeout)
+            rule = MatchRule(type='signal', sender=SYSTEMD_BUS_NAME,
+                             interface='org.freedesktop.DBus.Properties', member='PropertiesChanged',
+                             path_namespace=UNIT_PATH_PREFIX.rstrip('/'))
+            conn.send_and_get_reply(message_bus.AddMatch(rule), timeout=self.timeout)
+        except Exception as e:
+            logger.warning(f"Cannot subscribe to systemd signals: {e}")
+            return
+
+        logger.info(f"Watching {len(units)} units over D-Bus")
+        with conn.filter(rule, bufsize=256) as queue:
+            while True:
+                try:
+                    msg = conn.recv_until_filtered(queue)
+                except Exception as e:
+                    logger.error(f"systemd signal stream closed: {e}")
+                    return
+                interface, changed, _ = msg.body
+                if interface != 'org.freedesktop.systemd1.Unit' or 'ActiveState' not in changed:
+                    continue
+                name = units.get(unescape_path(msg.header.fields[HeaderFields.path]))
+                if name is None:
+                    continue
+                # Variants arrive as (signature, value)
+                active = changed['ActiveState'][1]
+                sub = changed['SubState'][1] if 'SubState' in changed else None
+                try:
+                    callback(name, active, sub)
+                except Exception as e:
+                    logger.error(f"Unit change handler failed for {name}: {e}")
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_systemd():
+    """Process-wide client configured from the `systemd` config section."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                try:
+                    from modules.config_manager import ConfigManager
+                    conf = ConfigManager().get('systemd', {}) or {}
+                except Exception:
+                    conf = {}
+                _client = SystemdClient(systemctl=conf.get('systemctl', 'systemctl'), use_dbus=conf.get('dbus', True))
+    return _client
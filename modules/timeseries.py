@@ -0,0 +1,383 @@
+"""
+Embedded time-series store (SQLite) for system metrics, agent telemetry and
+health incidents.
+
+Points are buffered in memory and flushed in one transaction every few
+seconds. The flush also folds them into 1-minute and 1-hour rollups
+(count/sum/min/max upserts), so long ranges are read from small tables and
+nothing is recomputed later. Raw points have 1 s resolution: several values
+of a series in the same second collapse to the last one before any tier is
+written, so the rollups count exactly the points kept in ts_raw. Each tier
+has its own retention.
+
+Series names are dotted: 'system.cpu_percent', 'agent.<host>.cpu', ...
+"""
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+
+from modules.metrics import registry
+
+logger = logging.getLogger("TimeSeries")
+
+FLUSHED_POINTS = registry.counter('neo_timeseries_points_total', 'Points written to the time-series store.')
+FLUSH_SECONDS = registry.histogram('neo_timeseries_flush_seconds', 'Time-series flush latency (insert + rollups).',
+                                   buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0))
+
+# Tier -> (table, bucket seconds)
+TIERS = {
+    'raw': ('ts_raw', 1),
+    '1m': ('ts_1m', 60),
+    '1h': ('ts_1h', 3600)
+}
+
+DEFAULT_RETENTION = {
+    'raw': 2 * 86400,     # 2 days
+    '1m': 14 * 86400,     # 2 weeks
+    '1h': 400 * 86400,    # ~13 months
+    'events': 365 * 86400
+}
+
+# Sampler fields persisted as system.* series
+SYSTEM_FIELDS = ['cpu_percent', 'ram_percent', 'disk_percent', 'temp', 'net_sent_rate', 'net_recv_rate']
+
+
+def flatten(data, prefix=''):
+    """{'cpu': 12, 'disk': {'/': 40}} -> {'cpu': 12.0, 'disk./': 40.0}. Non numeric values are dropped."""
+    points = {}
+    for key, value in (data or {}).items():
+        name = f"{prefix}.{key}" if prefix else str(key)
+        if isinstance(value, dict):
+            points.update(flatten(value, name))
+        elif isinstance(value, bool):
+            points[name] = float(value)
+        elif isinstance(value, (int, float)):
+            points[name] = float(value)
+        elif isinstance(value, str):
+            try:
+                points[name] = float(value.rstrip('%').replace('°C', ''))
+            except ValueError:
+                pass
+    return points
+
+
+class TimeSeriesStore:
+    def __init__(self, db_path="database/telemetry.db", retention=None, flush_interval=5, max_buffer=5000):
+        self.db_path = db_path
+        self.retention = dict(DEFAULT_RETENTION, **(retention or {}))
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self.buffer = [] # (series, ts, value)
+        self.lock = threading.Lock()
+        self.conn = None
+        self.last_prune = 0
+        self.running = False
+        self.init_db()
+
+    # --- Schema ---
+
+    def get_connection(self):
+        if self.conn is None:
+            os.makedirs(os.path.dirname(self.db_path) or '.', exist_ok=True)
+            self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self.conn.row_factory = sqlite3.Row
+            self.conn.execute("PRAGMA journal_mode=WAL;")
+            self.conn.execute("PRAGMA synchronous=NORMAL;")
+        return self.conn
+
+    def init_db(self):
+        conn = self.get_connection()
+        with self.lock:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS ts_raw (
+                    series TEXT NOT NULL,
+                    ts INTEGER NOT NULL,
+                    value REAL,
+                    PRIMARY KEY (series, ts)
+                ) WITHOUT ROWID
+            ''')
+            for table in ('ts_1m', 'ts_1h'):
+                conn.execute(f'''
+                    CREATE TABLE IF NOT EXISTS {table} (
+                        series TEXT NOT NULL,
+                        ts INTEGER NOT NULL,
+                        count INTEGER,
+                        sum REAL,
+                        min REAL,
+                        max REAL,
+                        PRIMARY KEY (series, ts)
+                    ) WITHOUT ROWID
+                ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS events (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    ts REAL NOT NULL,
+                    source TEXT,
+                    target TEXT,
+                    event TEXT,
+                    context TEXT
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_events_ts ON events(ts)')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_events_target ON events(target, ts)')
+            conn.commit()
+
+    def migrate_json_events(self, path, source='health'):
+        """One-off import of a JSON incident list (health_history.json). The file is renamed afterwards."""
+        if not os.path.exists(path):
+            return 0
+        try:
+            with open(path) as f:
+                entries = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error(f"Cannot migrate {path}: {e}")
+            return 0
+
+        rows = [(e.get('timestamp', 0), source, e.get('target'), e.get('event'), json.dumps(e.get('context') or {}))
+                for e in entries if isinstance(e, dict)]
+        with self.lock:
+            conn = self.get_connection()
+            conn.executemany('INSERT INTO events (ts, source, target, event, context) VALUES (?, ?, ?, ?, ?)', rows)
+            conn.commit()
+        os.replace(path, path + '.migrated')
+        logger.info(f"Migrated {len(rows)} events from {path}")
+        return len(rows)
+
+    # --- Writes ---
+
+    def record(self, series, value, ts=None):
+        if value is None:
+            return
+        self._append([(series, int(ts or time.time()), float(value))])
+
+    def record_many(self, values, ts=None, prefix=''):
+        """Record every numeric value of a (nested) dict as `prefix.key` series."""
+        ts = int(ts or time.time())
+        self._append([(series, ts, value) for series, value in flatten(values, prefix).items()])
+
+    def _append(self, points):
+        with self.lock:
+            self.buffer.extend(points)
+            overflow = len(self.buffer) > self.max_buffer
+        if overflow:
+            self.flush()
+
+    def log_event(self, target, event, context=None, source='health', ts=None):
+        with self.lock:
+            conn = self.get_connection()
+            conn.execute('INSERT INTO events (ts, source, target, event, context) VALUES (?, ?, ?, ?, ?)',
+                         (ts or time.time(), source, target, event, json.dumps(context or {})))
+            conn.commit()
+
+    def flush(self):
+        with self.lock:
+            points, self.buffer = self.buffer, []
+        if not points:
+            return 0
+        # ts_raw keeps one value per (series, second): the last one wins, as with INSERT OR REPLACE
+        points = [(series, ts, value) for (series, ts), value in
+                  {(series, ts): value for series, ts, value in points}.items()]
+
+        with FLUSH_SECONDS.time(), self.lock:
+            conn = self.get_connection()
+            try:
+                with conn:
+                    conn.executemany('INSERT OR REPLACE INTO ts_raw (series, ts, value) VALUES (?, ?, ?)', points)
+                    for tier in ('1m', '1h'):
+                        self._rollup(conn, tier, points)
+            except sqlite3.Error as e:
+                logger.error(f"Flush failed ({len(points)} points): {e}")
+                return 0
+        FLUSHED_POINTS.inc(len(points))
+        return len(points)
+
+    def _rollup(self, conn, tier, points):
+        table, bucket = TIERS[tier]
+        # Pre-aggregate the batch so each bucket is upserted once
+        buckets = {}
+        for series, ts, value in points:
+            key = (series, ts - ts % bucket)
+            acc = buckets.get(key)
+            if acc is None:
+                buckets[key] = [1, value, value, value]
+            else:
+                acc[0] += 1
+                acc[1] += value
+                acc[2] = min(acc[2], value)
+                acc[3] = max(acc[3], value)
+        conn.executemany(f'''
+            INSERT INTO {table} (series, ts, count, sum, min, max) VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(series, ts) DO UPDATE SET
+                count = count + excluded.count,
+                sum = sum + excluded.sum,
+                min = MIN(min, excluded.min),
+                max = MAX(max, excluded.max)
+        ''', [(s, t, c, total, lo, hi) for (s, t), (c, total, lo, hi) in buckets.items()])
+
+    def prune(self, now=None):
+        """Apply the retention of every tier and of the events table."""
+        now = now or time.time()
+        with self.lock:
+            conn = self.get_connection()
+            with conn:
+                for tier, (table, _) in TIERS.items():
+                    conn.execute(f'DELETE FROM {table} WHERE ts < ?', (int(now - self.retention[tier]),))
+                conn.execute('DELETE FROM events WHERE ts < ?', (now - self.retention['events'],))
+        self.last_prune = now
+
+    # --- Background writer ---
+
+    def start(self):
+        if self.running:
+            return self
+        self.running = True
+        threading.Thread(target=self._loop, daemon=True, name="TimeSeriesWriter").start()
+        return self
+
+    def stop(self):
+        self.running = False
+        self.flush()
+
+    def _loop(self):
+        while self.running:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+                if time.time() - self.last_prune > 3600:
+                    self.prune()
+            except Exception as e:
+                logger.error(f"Time-series writer error: {e}")
+
+    # --- Reads ---
+
+    def pick_tier(self, start, end, max_points=500):
+        """Finest tier whose point count for the range stays under `max_points` (per series)."""
+        span = max(1, end - start)
+        now = time.time()
+        for tier, (_, bucket) in TIERS.items():
+            if start < now - self.retention[tier]:
+                continue # older than this tier keeps
+            if span / bucket <= max_points * (10 if tier == 'raw' else 1):
+                return tier
+        return '1h'
+
+    def query(self, series, start=None, end=None, resolution='auto', max_points=500):
+        """
+        Points of one series between `start` and `end` (epoch seconds).
+        Returns {'series', 'resolution', 'points': [[ts, avg, min, max], ...]}.
+        Raw points are averaged into buckets when there are more than `max_points`.
+        """
+        end = end or time.time()
+        start = start or end - 3600
+        if resolution not in TIERS:
+            resolution = self.pick_tier(start, end, max_points)
+        table, bucket = TIERS[resolution]
+
+        # Points still in the write buffer are not visible until the next flush
+        step = max(bucket, int((end - start) / max_points) if max_points else bucket)
+        step -= step % bucket
+        with self.lock:
+            conn = self.get_connection()
+            if resolution == 'raw':
+                rows = conn.execute('''
+                    SELECT ts - ts % :step AS t, AVG(value), MIN(value), MAX(value)
+                    FROM ts_raw WHERE series = :series AND ts BETWEEN :start AND :end
+                    GROUP BY t ORDER BY t
+                ''', {'step': step, 'series': series, 'start': int(start), 'end': int(end)}).fetchall()
+            else:
+                rows = conn.execute(f'''
+                    SELECT ts - ts % :step AS t, SUM(sum) / SUM(count), MIN(min), MAX(max)
+                    FROM {table} WHERE series = :series AND ts BETWEEN :start AND :end
+                    GROUP BY t ORDER BY t
+                ''', {'step': step, 'series': series, 'start': int(start), 'end': int(end)}).fetchall()
+        return {
+            'series': series,
+            'resolution': resolution,
+            'step': step,
+            'points': [[r[0], round(r[1], 3), r[2], r[3]] for r in rows]
+        }
+
+    def list_series(self, prefix=''):
+        with self.lock:
+            rows = self.get_connection().execute(
+                'SELECT DISTINCT series FROM ts_1h WHERE series LIKE ? ORDER BY series', (prefix + '%',)
+            ).fetchall()
+        return [r[0] for r in rows]
+
+    def events(self, since=None, until=None, target=None, event=None, source=None, limit=200):
+        clauses, params = ['ts >= ?'], [since or 0]
+        if until:
+            clauses.append('ts <= ?')
+            params.append(until)
+        for column, value in (('target', target), ('event', event), ('source', source)):
+            if value:
+                clauses.append(f'{column} = ?')
+                params.append(value)
+        params.append(limit)
+        with self.lock:
+            rows = self.get_connection().execute(
+                f"SELECT ts, source, target, event, context FROM events WHERE {' AND '.join(clauses)} ORDER BY ts DESC LIMIT ?",
+                params
+            ).fetchall()
+        return [{
+            'timestamp': r['ts'], 'source': r['source'], 'target': r['target'],
+            'event': r['event'], 'context': json.loads(r['context'] or '{}')
+        } for r in rows]
+
+    def count_events(self, since=0, event=None):
+        sql, params = 'SELECT COUNT(*) FROM events WHERE ts >= ?', [since]
+        if event:
+            sql += ' AND event = ?'
+            params.append(event)
+        with self.lock:
+            return self.get_connection().execute(sql, params).fetchone()[0]
+
+    # --- Producers ---
+
+    def attach_sampler(self, sampler, every=10):
+        """Persist system.* series from the system sampler, at most once every `every` seconds."""
+        state = {'last': 0}
+
+        def on_sample(snapshot):
+            if snapshot['timestamp'] - state['last'] < every:
+                return
+            state['last'] = snapshot['timestamp']
+            ts = int(snapshot['timestamp'])
+            points = [(f"system.{f}", ts, float(snapshot[f])) for f in SYSTEM_FIELDS if snapshot.get(f) is not None]
+            if snapshot.get('load'):
+                points.append(('system.load1', ts, float(snapshot['load'][0])))
+            self._append(points)
+
+        sampler.add_listener(on_sample)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """Process-wide store, created (and its writer started) on first use with the `timeseries` config."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                try:
+                    from modules.config_manager import ConfigManager
+                    conf = ConfigManager().get('timeseries', {}) or {}
+                except Exception:
+                    conf = {}
+                retention = {k: v * 86400 for k, v in (conf.get('retention_days') or {}).items()}
+                store = TimeSeriesStore(
+                    db_path=conf.get('db_path', "database/telemetry.db"),
+                    retention=retention,
+                    flush_interval=conf.get('flush_interval', 5)
+                )
+                store.migrate_json_events('data/health_history.json')
+                if conf.get('record_system', True):
+                    from modules.system_sampler import get_sampler
+                    store.attach_sampler(get_sampler(), every=conf.get('system_interval', 10))
+                _store = store.start()
+    return _store
@@ -0,0 +1,151 @@
+import time
+import uuid
+import threading
+from collections import deque, OrderedDict
+from contextlib import contextmanager
+
+from modules.metrics import registry
+
+STAGE_SECONDS = registry.histogram('neo_pipeline_stage_seconds', 'Voice pipeline stage latency.', ['stage'])
+
+# Voice pipeline stages, in order (dashboard rows)
+STAGES = [
+    'asr',              # end of speech -> transcript
+    'intent',           # IntentManager.find_best_intent
+    'mango',            # MANGO T5 inference
+    'router',           # KeywordRouter
+    'rag',              # knowledge base query
+    'llm_prompt_eval',  # prompt submitted -> first token
+    'llm_generate',     # first token -> last token
+    'tts_queue',        # waiting in the speaker queue
+    'tts_synth',        # text -> first audio chunk
+    'first_audio'       # end of speech -> first audio out (end to end)
+]
+
+
+def _percentile(ordered, p):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+
+class Tracer:
+    """
+    Lightweight per-utterance tracing for the voice pipeline.
+
+    A trace id is created when an utterance is transcribed and follows the
+    command through the handling thread (thread-local) and the speak events.
+    Finished spans go to a ring buffer; stats() aggregates p50/p95 per stage.
+    """
+    def __init__(self, capacity=2000, max_traces=100):
+        self.spans = deque(maxlen=capacity)
+        self.traces = OrderedDict()
+        self.max_traces = max_traces
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    # --- Trace context ---
+
+    def start_trace(self, origin='voice', start=None, text=None):
+        """New trace, active in the calling thread. `start` is a time.time() timestamp."""
+        trace_id = uuid.uuid4().hex[:12]
+        with self._lock:
+            self.traces[trace_id] = {
+                'id': trace_id, 'origin': origin, 'text': text,
+                'start': start or time.time(), 'spans': [], 'marks': set()
+            }
+            while len(self.traces) > self.max_traces:
+                self.traces.popitem(last=False)
+        self.activate(trace_id)
+        return trace_id
+
+    def activate(self, trace_id):
+        """Make `trace_id` current in this thread (None clears it)."""
+        self._local.trace_id = trace_id
+
+    def current(self):
+        return getattr(self._local, 'trace_id', None)
+
+    # --- Spans ---
+
+    @contextmanager
+    def span(self, name, trace_id=None, **attrs):
+        start_wall = time.time()
+        start = time.perf_counter()
+        try:
+            yield attrs # the block may add attributes (e.g. tokens)
+        finally:
+            self.record(name, time.perf_counter() - start, trace_id, start=start_wall, **attrs)
+
+    def record(self, name, duration, trace_id=None, start=None, **attrs):
+        """Store a span measured elsewhere. `duration` in seconds."""
+        trace_id = trace_id or self.current()
+        span = {
+            'name': name, 'trace_id': trace_id,
+            'start': start or time.time() - duration,
+            'ms': round(duration * 1000, 2)
+        }
+        if attrs:
+            span['attrs'] = attrs
+        STAGE_SECONDS.observe(duration, stage=name)
+        with self._lock:
+            self.spans.append(span)
+            trace = self.traces.get(trace_id) if trace_id else None
+            if trace is not None:
+                trace['spans'].append(span)
+
+    def mark(self, name, trace_id=None):
+        """Span from the start of the trace to now, recorded once per trace (e.g. first audio)."""
+        trace_id = trace_id or self.current()
+        with self._lock:
+            trace = self.traces.get(trace_id) if trace_id else None
+            if trace is None or name in trace['marks']:
+                return
+            trace['marks'].add(name)
+            start = trace['start']
+        self.record(name, time.time() - start, trace_id, start=start)
+
+    # --- Aggregation ---
+
+    def stats(self, window=None):
+        """p50/p95/max (ms) per span name, optionally over the last `window` seconds."""
+        since = time.time() - window if window else 0
+        with self._lock:
+            grouped = {}
+            for span in self.spans:
+                if span['start'] >= since:
+                    grouped.setdefault(span['name'], []).append(span['ms'])
+
+        result = {}
+        for name, values in grouped.items():
+            ordered = sorted(values)
+            result[name] = {
+                'count': len(ordered),
+                'p50': _percentile(ordered, 0.5),
+                'p95': _percentile(ordered, 0.95),
+                'max': ordered[-1],
+                'last': values[-1]
+            }
+        return result
+
+    def recent_traces(self, limit=20):
+        with self._lock:
+            traces = list(self.traces.values())[-limit:]
+            return [
+                {
+                    'id': t['id'], 'origin': t['origin'], 'text': t['text'], 'start': t['start'],
+                    'spans': [{'name': s['name'], 'ms': s['ms'], 'offset_ms': round((s['start'] - t['start']) * 1000, 1)}
+                              for s in t['spans']]
+                } for t in reversed(traces)
+            ]
+
+    def snapshot(self, window=None, limit=20):
+        stats = self.stats(window)
+        ordered = [s for s in STAGES if s in stats] + sorted(s for s in stats if s not in STAGES)
+        return {
+            'stages': [dict(stats[name], name=name) for name in ordered],
+            'traces': self.recent_traces(limit),
+            'span_count': len(self.spans)
+        }
+
+
+# Process-wide tracer
+tracer = Tracer()
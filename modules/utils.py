@@ -57,6 +57,37 @@ def number_to_text(text):
             new_words.append(w)
     return " ".join(new_words)
 
+GRAMMAR_EXTRA_WORDS = ["uno", "dos", "tres", "cuatro", "cinco", "seis", "siete", "ocho", "nueve", "diez",
+                       "once", "doce", "trece", "catorce", "quince", "veinte", "treinta", "cuarenta", "cincuenta",
+                       "sesenta", "setenta", "ochenta", "noventa", "cien",
+                       "minuto", "minutos", "hora", "horas", "alarma", "recordatorio"]
+
+def build_vosk_grammar(intents, wake_words=None, include_unk=False):
+    """
+    Construye la gramática JSON para Vosk a partir de los triggers de los intents.
+    Con include_unk=True se añade "[unk]" para que lo que no encaja no se fuerce a una palabra conocida.
+    """
+    if not intents:
+        return None
+
+    words = set()
+    if isinstance(wake_words, str): wake_words = [wake_words]
+    for ww in wake_words or []:
+        words.add(ww.lower())
+
+    for intent in intents:
+        for trigger in intent.get('triggers', []):
+            norm = normalize_text(trigger)
+            for w in norm.split():
+                words.add(w)
+
+    words.update(GRAMMAR_EXTRA_WORDS)
+
+    grammar = list(words)
+    if include_unk:
+        grammar.append("[unk]")
+    return json.dumps(grammar, ensure_ascii=False)
+
 # --- ALSA Error Suppression ---
 ERROR_HANDLER_FUNC = CFUNCTYPE(None, c_char_p, c_int, c_char_p, c_int, c_char_p)
 
@@ -3,8 +3,7 @@ import json
 import time
 import threading
 import logging
-import pyaudio
-from modules.utils import no_alsa_error, normalize_text
+from modules.utils import build_vosk_grammar
 from modules.logger import vosk_logger, app_logger
 
 try:
@@ -22,22 +21,34 @@ except ImportError:
     WHISPER_DISPONIBLE = False
 
 import numpy as np
-import struct
 
 import base64
 from modules.bus_client import BusClient
+from modules.audio_frontend import AudioCapture, VoiceActivityDetector, EchoGate, VAD_SPEECH_START, VAD_SPEECH_END
+from modules.wake_word import create_wake_word_spotter
+from modules.tracing import tracer
 
 class VoiceManager:
-    def __init__(self, config_manager, speaker, on_command_detected, update_face_callback=None):
+    def __init__(self, config_manager, speaker, on_command_detected, update_face_callback=None, on_barge_in=None):
         self.config_manager = config_manager
         self.speaker = speaker
         self.on_command_detected = on_command_detected
         self.update_face = update_face_callback
+        self.on_barge_in = on_barge_in
         self.vosk_model = None
         self.whisper_model = None
         self.is_listening = False
         self.is_processing = False # Flag to pause listening during processing
         self.is_muted = False # Mute flag
+
+        stt_config = self.config_manager.get('stt', {})
+        # Barge-in: seguir escuchando la wake word mientras habla el Speaker
+        self.barge_in = bool(stt_config.get('barge_in', False))
+        # Dos etapas: spotter de wake word siempre activo, reconocedor completo sólo en la ventana de comando
+        self.two_stage = bool(stt_config.get('two_stage', True))
+        self.command_window_seconds = stt_config.get('command_window_seconds', 6)
+        self.command_window_end = 0
+        self.wake_spotter = None
         
         self.setup_vosk()
         self.setup_whisper()
@@ -46,7 +57,7 @@ class VoiceManager:
         self.bus = BusClient(name="VoiceManager")
         self.bus.on('recognizer_loop:audio', self.on_audio_data)
         self.bus.on('mic:toggle', self.on_mic_toggle)
-        self.bus.on('mic:get_status', self.on_mic_get_status)
+        self.bus.on_request('mic:get_status', self.on_mic_get_status)
         # self.bus.connect() <-- Deadlock Fix: Let run_forever handle it in thread
         # Start bus thread
         threading.Thread(target=self.bus.run_forever, daemon=True).start()
@@ -101,30 +112,8 @@ class VoiceManager:
 
     def get_grammar(self, intents):
         """Construye la gramática para Vosk basada en los intents."""
-        if not intents:
-            return None
-            
-        words = set()
-        # Wake words list
         wake_words = self.config_manager.get('wake_words', ['neo', 'tio', 'bro', 'hermano', 'colega', 'nen'])
-        if isinstance(wake_words, str): wake_words = [wake_words]
-        
-        for ww in wake_words:
-            words.add(ww.lower())
-            
-        for intent in intents:
-            for trigger in intent.get('triggers', []):
-                norm = normalize_text(trigger)
-                for w in norm.split():
-                    words.add(w)
-                    
-        numeros = ["uno", "dos", "tres", "cuatro", "cinco", "seis", "siete", "ocho", "nueve", "diez",
-                   "once", "doce", "trece", "catorce", "quince", "veinte", "treinta", "cuarenta", "cincuenta",
-                   "sesenta", "setenta", "ochenta", "noventa", "cien",
-                   "minuto", "minutos", "hora", "horas", "alarma", "recordatorio"]
-        words.update(numeros)
-        
-        return json.dumps(list(words), ensure_ascii=False)
+        return build_vosk_grammar(intents, wake_words)
 
     def start_listening(self, intents=None):
         """Inicia el bucle de escucha en un hilo separado."""
@@ -141,6 +130,18 @@ class VoiceManager:
         """Pausa o reanuda la escucha activa."""
         self.is_processing = processing
 
+    def open_command_window(self, seconds=None):
+        """Activa el reconocedor completo durante `seconds` (tras wake word o respuesta)."""
+        seconds = seconds if seconds is not None else self.command_window_seconds
+        self.command_window_end = max(self.command_window_end, time.time() + seconds)
+
+    def close_command_window(self):
+        self.command_window_end = 0
+
+    @property
+    def in_command_window(self):
+        return time.time() < self.command_window_end
+
     def _check_wake_word(self, text):
         """Verifica si el texto contiene alguna palabra de activación (Fuzzy)."""
         wake_words = self.config_manager.get('wake_words', ['neo', 'tio', 'bro', 'hermano', 'colega', 'nen'])
@@ -181,75 +182,224 @@ class VoiceManager:
         self.bus.emit('mic:status', {'muted': self.is_muted})
 
     def on_mic_get_status(self, message):
-        """Emit current status."""
-        self.bus.emit('mic:status', {'muted': self.is_muted})
+        """Devuelve el estado actual (respuesta RPC); a peticiones sin reply_to se responde con broadcast."""
+        status = {'muted': self.is_muted}
+        if not message.get('context', {}).get('reply_to'):
+            self.bus.emit('mic:status', status)
+        return status
+
+    def _create_recognizer(self, intents):
+        """Crea el KaldiRecognizer (con gramática de intents si está habilitada)."""
+        use_grammar = self.config_manager.get('stt', {}).get('use_grammar', True)
+        if use_grammar and intents:
+            grammar = self.get_grammar(intents)
+            return vosk.KaldiRecognizer(self.vosk_model, 16000, grammar)
+        return vosk.KaldiRecognizer(self.vosk_model, 16000)
+
+    def _create_vad(self, stt_config):
+        """Construye el VAD con los parámetros de config ('stt')."""
+        return VoiceActivityDetector(
+            rate=16000,
+            frame_ms=stt_config.get('vad_frame_ms', 30),
+            threshold=stt_config.get('vad_threshold', 500),
+            aggressiveness=stt_config.get('vad_aggressiveness', 2),
+            silence_ms=stt_config.get('vad_silence_ms', 600)
+        )
+
+    def _is_paused(self):
+        return self.speaker.is_busy or self.is_processing or self.is_muted
 
     def _continuous_voice_listener(self, intents):
-        """Bucle principal de escucha de voz (Local PyAudio)."""
+        """
+        Bucle principal de escucha de voz (Local PyAudio).
+        Un hilo de captura escribe en un ring buffer; este bucle espera tramas nuevas,
+        las pasa por el VAD y sólo alimenta al reconocedor (Vosk o Sherpa) con voz.
+        """
         try:
             stt_config = self.config_manager.get('stt', {})
             stt_engine = stt_config.get('engine', 'vosk')
-            
-            if not self.vosk_model:
-                vosk_logger.error("Modelo Vosk no cargado. No se puede iniciar escucha.")
-                return
+            use_sherpa = stt_engine == 'sherpa' and getattr(self, 'sherpa_recognizer', None) is not None
+
+            if not use_sherpa:
+                if not self.vosk_model:
+                    vosk_logger.error("Modelo Vosk no cargado. No se puede iniciar escucha.")
+                    return
+                if not hasattr(self, 'recognizer') or self.recognizer is None:
+                    self.recognizer = self._create_recognizer(intents)
+
+            vad = self._create_vad(stt_config)
+            frame_samples = vad.frame_samples
+
+            if self.barge_in or self.two_stage:
+                self._setup_wake_spotter(stt_config)
+            echo_gate = EchoGate(min_level=vad.threshold, margin=stt_config.get('barge_in_margin', 2.0))
+            preroll_samples = int(16000 * stt_config.get('vad_preroll_ms', 300) / 1000)
+
+            app_logger.info(f"Starting Local Audio Capture (VoiceManager, engine: {'sherpa' if use_sherpa else 'vosk'}, two-stage: {self.two_stage})...")
+            self.capture = AudioCapture(rate=16000, frame_samples=frame_samples,
+                                        device_index=stt_config.get('input_device_index', None))
+            self.capture.start()
+            ring = self.capture.ring
+
+            position = ring.position
+            segment = []
+            partial_texts = []
+            last_face_update = 0
+            was_paused = False
+            segment_start = position
+            decoding = False
+            wake_word = None
 
-            # Init Recognizer
-            if not hasattr(self, 'recognizer') or self.recognizer is None:
-                use_grammar = self.config_manager.get('stt', {}).get('use_grammar', True)
-                if use_grammar and intents:
-                    grammar = self.get_grammar(intents)
-                    self.recognizer = vosk.KaldiRecognizer(self.vosk_model, 16000, grammar)
+            while self.is_listening:
+                if not ring.wait_for(position + frame_samples, timeout=0.5):
+                    continue
+
+                # Si nos hemos quedado atrás más de lo que guarda el buffer, saltar al presente
+                if ring.position - position > ring.capacity:
+                    position = ring.position - frame_samples
+
+                frame = ring.read(position, frame_samples)
+                position += frame_samples
+
+                if self._is_paused():
+                    if vad.in_speech:
+                        segment, partial_texts = [], []
+                        if not use_sherpa:
+                            self.recognizer.Reset()
+                    vad.reset()
+                    # two_stage también crea el spotter: sólo hay barge-in si está activado
+                    if self.barge_in and self.wake_spotter and not self.is_muted:
+                        self._barge_in_frame(frame, echo_gate)
+                    was_paused = True
+                    continue
+
+                if was_paused:
+                    was_paused = False
+                    if self.wake_spotter:
+                        self.wake_spotter.reset()
+
+                event = vad.process(frame)
+                if event is None:
+                    continue
+
+                if event == VAD_SPEECH_START:
+                    # Pre-roll: incluir el audio previo al disparo del VAD para no cortar la primera sílaba
+                    segment_start = position - frame_samples * vad.min_speech_frames - preroll_samples
+                    chunk = ring.read(segment_start, position - segment_start)
+                    decoding = not self.two_stage or self.in_command_window
+                    wake_word = None
+                    show_listening = decoding
                 else:
-                    self.recognizer = vosk.KaldiRecognizer(self.vosk_model, 16000)
+                    chunk = frame
+                    show_listening = False
+
+                if not decoding:
+                    # Etapa 1: sólo el spotter. El reconocedor completo no gasta CPU.
+                    wake_word = self.wake_spotter.accept(chunk)
+                    if not wake_word:
+                        if event == VAD_SPEECH_END:
+                            self.wake_spotter.reset()
+                        continue
+
+                    vosk_logger.info(f"Wake word '{wake_word}' detectada. Abriendo ventana de comando.")
+                    self.open_command_window()
+                    decoding = True
+                    show_listening = True
+                    # Etapa 2: el reconocedor recibe el segmento completo (incluida la wake word)
+                    chunk = ring.read(segment_start, position - segment_start)
+
+                if show_listening:
+                    current_time = time.time()
+                    if self.update_face and current_time - last_face_update > 1.5:
+                        self.update_face('listening')
+                        last_face_update = current_time
 
-            app_logger.info("Starting Local PyAudio Stream (VoiceManager)...")
-            
-            with no_alsa_error():
-                p = pyaudio.PyAudio()
-                device_index = self.config_manager.get('stt', {}).get('input_device_index', None)
-                stream = p.open(format=pyaudio.paInt16, channels=1, rate=16000, input=True, 
-                                frames_per_buffer=4096, input_device_index=device_index)
-                stream.start_stream()
-                
-            last_face_update = 0
-            
-            while self.is_listening:
-                 # Pause logic
-                 if self.speaker.is_busy or self.is_processing or self.is_muted:
-                     time.sleep(0.1)
-                     continue
-                     
-                 try:
-                     data = stream.read(4096, exception_on_overflow=False)
-                     if self.recognizer.AcceptWaveform(data):
-                         result = json.loads(self.recognizer.Result())
-                         command = result.get('text', '')
-                         if command:
-                             ww = self._check_wake_word(command)
-                             self.on_command_detected(command, ww if ww else 'neo')
-                     else:
-                         # Partial
-                         partial = json.loads(self.recognizer.PartialResult())
-                         if partial.get('partial') and self.update_face:
-                             current_time = time.time()
-                             if current_time - last_face_update > 1.5:
-                                 self.update_face('listening')
-                                 last_face_update = current_time
-                                 
-                 except Exception as e:
-                     vosk_logger.error(f"Error reading audio stream: {e}")
-                     time.sleep(0.5)
-
-            # Cleanup
-            stream.stop_stream()
-            stream.close()
-            p.terminate()
+                if use_sherpa:
+                    segment.append(chunk)
+                elif self.recognizer.AcceptWaveform(chunk.tobytes()):
+                    text = json.loads(self.recognizer.Result()).get('text', '')
+                    if text:
+                        partial_texts.append(text)
+
+                if event == VAD_SPEECH_END:
+                    speech_end = time.time()
+                    if use_sherpa:
+                        if self.update_face: self.update_face('thinking')
+                        command = self._decode_sherpa(np.concatenate(segment))
+                    else:
+                        final_text = json.loads(self.recognizer.FinalResult()).get('text', '')
+                        command = " ".join(partial_texts + ([final_text] if final_text else []))
+                    segment, partial_texts = [], []
+                    decoding = False
+
+                    if command:
+                        # Traza de latencia: arranca al final del habla
+                        trace_id = tracer.start_trace('voice', start=speech_end, text=command)
+                        tracer.record('asr', time.time() - speech_end, trace_id, start=speech_end,
+                                      engine='sherpa' if use_sherpa else 'vosk')
+                        ww = wake_word or self._check_wake_word(command)
+                        wake_word = None
+                        self.close_command_window()
+                        if self.barge_in:
+                            # El comando se procesa fuera del hilo de escucha para poder interrumpirlo
+                            self.is_processing = True
+                            threading.Thread(target=self._dispatch_command, args=(command, ww, trace_id), daemon=True).start()
+                        else:
+                            self._dispatch_command(command, ww, trace_id)
+                            # El audio capturado mientras se procesaba el comando ya no es válido
+                            position = ring.position
+                    elif use_sherpa and self.update_face:
+                        self.update_face('idle')
+
+            self.capture.stop()
 
         except Exception as e:
             app_logger.error(f"Critical Error in Voice Loop: {e}")
+            if getattr(self, 'capture', None):
+                self.capture.stop()
 
+    def _dispatch_command(self, command, wake_word, trace_id=None):
+        self.is_processing = True
+        tracer.activate(trace_id)
+        try:
+            self.on_command_detected(command, wake_word)
+        finally:
+            tracer.activate(None)
+            self.is_processing = False
 
+    def _setup_wake_spotter(self, stt_config):
+        """Prepara el spotter de wake word (etapa 1 y barge-in). Sin spotter se usa sólo el reconocedor completo."""
+        wake_words = self.config_manager.get('wake_words', ['neo', 'tio', 'bro', 'hermano', 'colega', 'nen'])
+        self.wake_spotter = create_wake_word_spotter(stt_config, wake_words, self.vosk_model)
+        if not self.wake_spotter:
+            vosk_logger.warning("Spotter de wake word no disponible. Desactivando barge-in y modo dos etapas.")
+            self.barge_in = False
+            self.two_stage = False
+
+    def _barge_in_frame(self, frame, echo_gate):
+        """Durante la reproducción sólo se busca la wake word, descartando el eco del propio Speaker."""
+        if echo_gate.is_echo(VoiceActivityDetector.rms(frame), getattr(self.speaker, 'output_level', 0.0)):
+            return
+        hit = self.wake_spotter.accept(frame)
+        if hit:
+            vosk_logger.info(f"Barge-in: wake word '{hit}' detectada durante la respuesta.")
+            if self.on_barge_in:
+                self.on_barge_in(hit)
+
+    def _decode_sherpa(self, samples_int16):
+        """Decodifica un segmento completo con Sherpa-ONNX (Whisper offline)."""
+        try:
+            samples = samples_int16.astype(np.float32) / 32768.0
+            s = self.sherpa_recognizer.create_stream()
+            s.accept_waveform(16000, samples)
+            self.sherpa_recognizer.decode_stream(s)
+            text = s.result.text.strip()
+            if text:
+                vosk_logger.info(f"Sherpa escuchó: '{text}'")
+            return text
+        except Exception as e:
+            vosk_logger.error(f"Error en Sherpa Listener: {e}")
+            return ""
 
 
     def _whisper_listener(self):
@@ -285,86 +435,3 @@ class VoiceManager:
         except Exception as e:
             vosk_logger.error(f"Error cargando Sherpa-ONNX: {e}")
             self.sherpa_recognizer = None
-
-    def _sherpa_listener(self):
-        """Bucle de escucha para Sherpa-ONNX (Offline Whisper con VAD)."""
-        if not self.sherpa_recognizer:
-            vosk_logger.error("Sherpa Recognizer no inicializado.")
-            return
-
-        vosk_logger.info("Iniciando escucha con Sherpa-ONNX (Whisper)...")
-        
-        CHUNK = 1024
-        FORMAT = pyaudio.paInt16
-        CHANNELS = 1
-        RATE = 16000
-        THRESHOLD = 500 # Sensitivity (matched to debug script)
-        SILENCE_LIMIT = 20 # ~1s silence to trigger
-        
-        p = pyaudio.PyAudio()
-        device_index = self.config_manager.get('stt', {}).get('input_device_index', None)
-        
-        try:
-            stream = p.open(format=FORMAT, channels=CHANNELS, rate=RATE, input=True,
-                            frames_per_buffer=CHUNK, input_device_index=device_index)
-            stream.start_stream()
-        except Exception as e:
-            vosk_logger.error(f"Error abriendo stream PyAudio: {e}")
-            return
-
-        audio_buffer = []
-        silence_frames = 0
-        is_recording = False
-        last_face_update = 0
-        
-        while self.is_listening:
-            try:
-                if self.speaker.is_busy or self.is_processing:
-                    time.sleep(0.1)
-                    continue
-                
-                data = stream.read(CHUNK, exception_on_overflow=False)
-                shorts = struct.unpack("%dh" % (len(data) / 2), data)
-                rms = np.sqrt(np.mean(np.square(shorts)))
-                
-                if rms > THRESHOLD:
-                    is_recording = True
-                    silence_frames = 0
-                    
-                    current_time = time.time()
-                    if self.update_face and (current_time - last_face_update > 1.0):
-                        self.update_face('listening')
-                        last_face_update = current_time
-                else:
-                    if is_recording:
-                        silence_frames += 1
-                
-                if is_recording:
-                    audio_buffer.append(data)
-                    
-                    if silence_frames > SILENCE_LIMIT:
-                        # End of speech
-                        if self.update_face: self.update_face('thinking')
-                        
-                        raw_data = b''.join(audio_buffer)
-                        samples = np.frombuffer(raw_data, dtype=np.int16).astype(np.float32) / 32768.0
-                        
-                        s = self.sherpa_recognizer.create_stream()
-                        s.accept_waveform(RATE, samples)
-                        self.sherpa_recognizer.decode_stream(s)
-                        text = s.result.text.strip()
-                        
-                        if text:
-                            vosk_logger.info(f"Sherpa escuchó: '{text}'")
-                            ww = self._check_wake_word(text)
-                            self.on_command_detected(text, ww if ww else 'neo')
-                        
-                        audio_buffer = []
-                        is_recording = False
-                        silence_frames = 0
-                        if self.update_face: self.update_face('idle')
-                
-            except Exception as e:
-                vosk_logger.error(f"Error en Sherpa Listener: {e}")
-                time.sleep(1)
-
@@ -0,0 +1,149 @@
+import os
+import json
+import numpy as np
+from modules.logger import vosk_logger
+
+try:
+    import vosk
+    VOSK_DISPONIBLE = True
+except ImportError:
+    vosk = None
+    VOSK_DISPONIBLE = False
+
+try:
+    import sherpa_onnx
+    SHERPA_DISPONIBLE = True
+except ImportError:
+    sherpa_onnx = None
+    SHERPA_DISPONIBLE = False
+
+KWS_SHERPA_DIR = "models/sherpa-kws"
+KWS_VOSK_SMALL = "vosk-models/es-small"
+
+
+class WakeWordSpotter:
+    """
+    Detector de palabra de activación con Vosk, alimentado trama a trama.
+    La gramática mínima (wake words + [unk]) sólo reduce el grafo de búsqueda: el
+    modelo acústico se evalúa entero en cada trama. Con el modelo grande de Vosk
+    el ahorro frente al reconocedor completo viene casi todo del filtrado por VAD;
+    para que la etapa 1 sea barata de verdad usa un modelo pequeño
+    (stt.kws_vosk_model_path) o Sherpa KWS.
+    """
+    def __init__(self, model, wake_words, rate=16000):
+        if isinstance(wake_words, str): wake_words = [wake_words]
+        self.wake_words = [w.lower() for w in wake_words]
+        grammar = json.dumps(self.wake_words + ["[unk]"], ensure_ascii=False)
+        self.recognizer = vosk.KaldiRecognizer(model, rate, grammar)
+        vosk_logger.info(f"Wake word spotter (Vosk) listo: {self.wake_words}")
+
+    def accept(self, frame):
+        """Procesa una trama int16. Devuelve la wake word detectada o None."""
+        if self.recognizer.AcceptWaveform(frame.tobytes()):
+            text = json.loads(self.recognizer.Result()).get('text', '')
+        else:
+            text = json.loads(self.recognizer.PartialResult()).get('partial', '')
+
+        hit = self._match(text)
+        if hit:
+            self.reset()
+        return hit
+
+    def _match(self, text):
+        for word in text.split():
+            if word in self.wake_words:
+                return word
+        return None
+
+    def reset(self):
+        self.recognizer.Reset()
+
+
+class SherpaKeywordSpotter:
+    """
+    Spotter basado en el KeywordSpotter de Sherpa-ONNX (transducer de streaming).
+    Necesita un modelo KWS y un fichero de keywords ya tokenizado.
+    """
+    def __init__(self, model_dir, keywords_file, rate=16000, num_threads=1):
+        self.rate = rate
+        self.kws = sherpa_onnx.KeywordSpotter(
+            tokens=os.path.join(model_dir, "tokens.txt"),
+            encoder=os.path.join(model_dir, "encoder.onnx"),
+            decoder=os.path.join(model_dir, "decoder.onnx"),
+            joiner=os.path.join(model_dir, "joiner.onnx"),
+            keywords_file=keywords_file,
+            num_threads=num_threads
+        )
+        self.stream = self.kws.create_stream()
+        vosk_logger.info(f"Wake word spotter (Sherpa KWS) listo: {keywords_file}")
+
+    def accept(self, frame):
+        self.stream.accept_waveform(self.rate, frame.astype(np.float32) / 32768.0)
+        while self.kws.is_ready(self.stream):
+            self.kws.decode_stream(self.stream)
+
+        result = self.kws.get_result(self.stream)
+        if result:
+            self.reset()
+            return result.strip().lower()
+        return None
+
+    def reset(self):
+        if hasattr(self.kws, 'reset_stream'):
+            self.kws.reset_stream(self.stream)
+        else:
+            self.stream = self.kws.create_stream()
+
+
+def small_vosk_model_path(stt_config):
+    """Ruta del modelo Vosk pequeño para la etapa 1, o None si no está instalado."""
+    path = stt_config.get('kws_vosk_model_path', KWS_VOSK_SMALL)
+    return path if path and os.path.isdir(path) else None
+
+
+def sherpa_keywords_file(stt_config):
+    """Fichero de keywords de Sherpa KWS, o None si Sherpa no se puede usar."""
+    model_dir = stt_config.get('kws_model_path', KWS_SHERPA_DIR)
+    keywords_file = stt_config.get('kws_keywords_file', os.path.join(model_dir, "keywords.txt"))
+    return keywords_file if SHERPA_DISPONIBLE and os.path.isfile(keywords_file) else None
+
+
+def create_wake_word_spotter(stt_config, wake_words, vosk_model=None):
+    """
+    Construye el spotter configurado en stt.kws_engine:
+    - 'auto' (por defecto): Sherpa KWS si está instalado, si no Vosk.
+    - 'sherpa' / 'vosk': fuerza el motor (Vosk sigue siendo el respaldo).
+    Con Vosk se prefiere el modelo pequeño (stt.kws_vosk_model_path); `vosk_model`
+    (el modelo completo ya cargado) sólo se usa si no existe.
+    Devuelve None si no hay backend disponible.
+    """
+    engine = stt_config.get('kws_engine', 'auto')
+
+    if engine in ('sherpa', 'auto'):
+        keywords_file = sherpa_keywords_file(stt_config)
+        if keywords_file:
+            try:
+                return SherpaKeywordSpotter(stt_config.get('kws_model_path', KWS_SHERPA_DIR), keywords_file)
+            except Exception as e:
+                vosk_logger.error(f"Error cargando Sherpa KWS: {e}")
+        elif engine == 'sherpa':
+            vosk_logger.warning("Sherpa KWS no disponible. Usando Vosk.")
+
+    if not VOSK_DISPONIBLE:
+        return None
+    small_path = small_vosk_model_path(stt_config)
+    if small_path:
+        try:
+            vosk_model = vosk.Model(small_path)
+        except Exception as e:
+            vosk_logger.error(f"Error cargando modelo Vosk pequeño ({small_path}): {e}")
+    elif vosk_model:
+        vosk_logger.warning("Spotter con el modelo Vosk completo: la etapa 1 sólo ahorra lo que filtra el VAD. "
+                            f"Instala un modelo pequeño en {KWS_VOSK_SMALL} o Sherpa KWS.")
+
+    if vosk_model:
+        try:
+            return WakeWordSpotter(vosk_model, wake_words)
+        except Exception as e:
+            vosk_logger.error(f"Error creando wake word spotter: {e}")
+    return None
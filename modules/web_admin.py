@@ -1,13 +1,15 @@
-from flask import Flask, render_template, request, redirect, url_for, session, jsonify, flash, send_file, send_from_directory, abort
+from flask import Flask, render_template, request, redirect, url_for, session, jsonify, flash, send_file, send_from_directory, abort, Response
 import base64
 from flask_socketio import SocketIO, emit
 import functools
+import hmac
 import os
 import json
 import subprocess
 import time
 from werkzeug.security import generate_password_hash, check_password_hash
-from flask_wtf.csrf import CSRFProtect
+from flask_wtf.csrf import CSRFProtect, validate_csrf
+from wtforms.validators import ValidationError
 
 # Import brain module explicitly to access learn_alias if needed via direct import or ensure db has it
 from modules.brain import Brain
@@ -20,8 +22,13 @@ from modules.ssh_manager import SSHManager
 from modules.file_manager import FileManager
 from modules.wifi_manager import WifiManager
 from modules.dashboard_data import DashboardDataManager
-from modules.knowledge_base import KnowledgeBase
+from modules.lazy_loader import LazyProxy
+from modules.tracing import tracer
+from modules.system_sampler import get_sampler
+from modules.timeseries import get_store
+from modules.metrics import registry as metrics_registry, CONTENT_TYPE as METRICS_CONTENT_TYPE
 from modules.scheduler_manager import SchedulerManager
+from modules.command_runner import get_runner
 
 app = Flask(__name__, template_folder='../web_client/templates', static_folder='../web_client/static')
 
@@ -40,7 +47,10 @@ csrf = CSRFProtect(app)
 
 # Initialize SocketIO
 # Revert to threading for compatibility with PyAudio/Voice Threads
-socketio = SocketIO(app, async_mode='threading', cors_allowed_origins="*")
+# Solo el mismo origen por defecto: con '*' cualquier web abierta en el navegador del admin
+# podría usar su sesión (terminal:run ejecuta comandos). Orígenes extra en web_admin.cors_allowed_origins.
+socketio = SocketIO(app, async_mode='threading',
+                    cors_allowed_origins=(config_manager.get('web_admin', {}) or {}).get('cors_allowed_origins'))
 
 # Global System Status
 AUDIO_STATUS = {'output': False, 'input': False}
@@ -63,7 +73,11 @@ file_manager = FileManager()
 wifi_manager = WifiManager()
 dashboard_manager = DashboardDataManager(config_manager)
 dashboard_manager = DashboardDataManager(config_manager)
-knowledge_base = KnowledgeBase() # RAG System
+def _create_knowledge_base():
+    from modules.knowledge_base import KnowledgeBase
+    return KnowledgeBase()
+
+knowledge_base = LazyProxy('knowledge_base', _create_knowledge_base) # RAG System (chromadb loads on first use)
 scheduler_manager = SchedulerManager(app) # Task Scheduler
 brain = Brain() # Initialize independent Brain instance for Web Admin operations
 
@@ -438,22 +452,108 @@ def api_audio_toggle():
 @login_required
 def api_audio_status():
     """Returns current audio status."""
-    # Force refresh request only if connected to avoid log spam
+    # Fresh state in one round trip (falls back to the last known value on timeout)
     if bus.connected:
-        bus.emit('mic:get_status', {})
+        status = bus.request('mic:get_status', {}, timeout=1.0)
+        if status is not None:
+            AUDIO_STATUS['input'] = not status.get('muted', False)
     return jsonify(AUDIO_STATUS)
 
+@app.route('/api/bus/stats', methods=['GET'])
+@login_required
+def api_bus_stats():
+    """Estadísticas del bus: contadores por topic del broker y latencias de las peticiones RPC."""
+    return jsonify({
+        'connected': bus.connected,
+        'broker': bus.request('bus:get_stats', {}, timeout=1.0) if bus.connected else None,
+        'requests': bus.request_stats()
+    })
+
+@app.route('/api/metrics/latency', methods=['GET'])
+@login_required
+def api_metrics_latency():
+    """Latencias del pipeline de voz (p50/p95 por etapa) y últimas trazas."""
+    window = request.args.get('window', type=float)
+    limit = request.args.get('limit', 20, type=int)
+    return jsonify(tracer.snapshot(window=window, limit=limit))
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Exposición de métricas en formato texto de Prometheus/OpenMetrics."""
+    # Prometheus hace scrape sin sesión: con metrics.token configurado se exige 'Bearer <token>'.
+    # Sin token solo se sirve a localhost o a una sesión iniciada (el servidor escucha en 0.0.0.0
+    # y el registro incluye servicios, firmas de Guard y eventos de salud).
+    token = config_manager.get('metrics', {}).get('token')
+    if token:
+        if not hmac.compare_digest(request.headers.get('Authorization', ''), f"Bearer {token}"):
+            abort(401)
+    elif not session.get('logged_in') and request.remote_addr not in ('127.0.0.1', '::1'):
+        abort(403)
+    return Response(metrics_registry.render(), content_type=METRICS_CONTENT_TYPE)
+
 @app.route('/api/stats')
 @login_required
 def api_stats():
     """API que devuelve estadísticas del sistema en JSON."""
+    # Todo sale de la misma muestra; varios navegadores no multiplican el coste de psutil
+    sample = get_sampler().snapshot()
     return jsonify({
         'cpu_temp': sys_admin.get_cpu_temp(),
         'cpu_usage': sys_admin.get_cpu_usage(),
         'ram_usage': sys_admin.get_ram_usage(),
-        'disk_usage': sys_admin.get_disk_usage()
+        'disk_usage': sys_admin.get_disk_usage(),
+        'per_core': sample.get('per_core'),
+        'load': sample.get('load'),
+        'net_sent_rate': sample.get('net_sent_rate'),
+        'net_recv_rate': sample.get('net_recv_rate'),
+        'timestamp': sample.get('timestamp')
     })
 
+@app.route('/api/stats/history')
+@login_required
+def api_stats_history():
+    """Serie temporal del muestreador: ?seconds=600&fields=cpu_percent,ram_percent"""
+    seconds = request.args.get('seconds', type=float)
+    fields = [f for f in request.args.get('fields', '').split(',') if f] or None
+    return jsonify(get_sampler().history(seconds=seconds, fields=fields))
+
+@app.route('/api/timeseries/series')
+@login_required
+def api_timeseries_series():
+    """Series disponibles (?prefix=agent.)."""
+    return jsonify(get_store().list_series(request.args.get('prefix', '')))
+
+@app.route('/api/timeseries/query')
+@login_required
+def api_timeseries_query():
+    """
+    Consulta de rango: ?series=system.cpu_percent,system.ram_percent&start=<epoch>&end=<epoch>
+    &resolution=auto|raw|1m|1h&max_points=500. Por defecto, la última hora.
+    """
+    series = [s for s in request.args.get('series', '').split(',') if s]
+    if not series:
+        return jsonify({'error': 'series required'}), 400
+    end = request.args.get('end', type=float) or time.time()
+    start = request.args.get('start', type=float) or end - 3600
+    resolution = request.args.get('resolution', 'auto')
+    max_points = min(request.args.get('max_points', 500, type=int), 5000)
+    store = get_store()
+    store.flush() # include the latest buffered points
+    return jsonify([store.query(name, start, end, resolution, max_points) for name in series[:10]])
+
+@app.route('/api/timeseries/events')
+@login_required
+def api_timeseries_events():
+    """Incidentes registrados (?since=<epoch>&target=nginx&event=CRASH_DETECTED&limit=200)."""
+    return jsonify(get_store().events(
+        since=request.args.get('since', type=float),
+        until=request.args.get('until', type=float),
+        target=request.args.get('target'),
+        event=request.args.get('event'),
+        source=request.args.get('source'),
+        limit=min(request.args.get('limit', 200, type=int), 5000)
+    ))
+
 @app.route('/api/logs')
 @login_required
 def api_logs():
@@ -617,10 +717,36 @@ def api_config_save():
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)})
 
+INTERACTIVE_COMMANDS = {'nano', 'vim', 'vi', 'top', 'htop', 'less', 'more', 'man', 'watch'}
+
+def _terminal_builtin(cmd, cwds, term_id):
+    """
+    Resuelve lo que no debe llegar al shell: 'cd' (cambia el cwd de la sesión)
+    y los comandos interactivos. Retorna el dict de respuesta o None si hay que ejecutar.
+    """
+    current_cwd = cwds[term_id]
+
+    # Seguridad básica
+    if cmd.split() and cmd.split()[0] in INTERACTIVE_COMMANDS:
+        return {'success': False, 'output': 'Comandos interactivos no soportados.', 'cwd': current_cwd}
+
+    # Manejo especial para 'cd'
+    if cmd.strip().startswith('cd '):
+        target_dir = cmd.strip()[3:].strip()
+        # Resolver ruta relativa
+        new_path = os.path.abspath(os.path.join(current_cwd, os.path.expanduser(target_dir)))
+
+        if os.path.isdir(new_path):
+            cwds[term_id] = new_path
+            return {'success': True, 'output': '', 'cwd': new_path}
+        else:
+            return {'success': False, 'output': f"cd: {target_dir}: No such file or directory", 'cwd': current_cwd}
+    return None
+
 @app.route('/api/terminal', methods=['POST'])
 @login_required
 def api_terminal():
-    """API para ejecutar comandos de terminal con estado (cwd) por sesión."""
+    """API para ejecutar comandos de terminal con estado (cwd) por sesión (sin streaming)."""
     data = request.json
     cmd = data.get('command')
     term_id = str(data.get('term_session', '1')) # Default to session 1
@@ -636,27 +762,106 @@ def api_terminal():
         
     current_cwd = session['term_cwds'][term_id]
 
-    # Seguridad básica
-    if 'nano' in cmd or 'vim' in cmd or 'top' in cmd:
-        return jsonify({'success': False, 'output': 'Comandos interactivos no soportados.', 'cwd': current_cwd})
-    
-    # Manejo especial para 'cd'
-    if cmd.strip().startswith('cd '):
-        target_dir = cmd.strip()[3:].strip()
-        # Resolver ruta relativa
-        new_path = os.path.abspath(os.path.join(current_cwd, target_dir))
-        
-        if os.path.isdir(new_path):
-            session['term_cwds'][term_id] = new_path
-            session.modified = True
-            return jsonify({'success': True, 'output': '', 'cwd': new_path})
-        else:
-            return jsonify({'success': False, 'output': f"cd: {target_dir}: No such file or directory", 'cwd': current_cwd})
+    builtin = _terminal_builtin(cmd, session['term_cwds'], term_id)
+    if builtin is not None:
+        session.modified = True
+        return jsonify(builtin)
     
     # Ejecutar comando normal en el CWD actual
     success, output = sys_admin.run_command(cmd, cwd=current_cwd)
     return jsonify({'success': success, 'output': output, 'cwd': current_cwd})
 
+# --- Terminal con streaming (Socket.IO) ---
+# terminal:run -> ack {job_id} + terminal:output {job_id, stream, data}* + terminal:done {info}
+# terminal:cancel {job_id}. La salida completa se pagina en /api/terminal/output/<job_id>.
+TERMINAL_CWDS = {} # socket sid -> {term_id: cwd}
+
+def _terminal_conf(key, default):
+    return (config_manager.get('terminal', {}) or {}).get(key, default)
+
+def _ws_authorized(data):
+    """Sesión iniciada y token CSRF en el payload (CSRFProtect no cubre los eventos Socket.IO)."""
+    if not session.get('logged_in'):
+        return False
+    try:
+        validate_csrf((data or {}).get('csrf_token'))
+        return True
+    except ValidationError:
+        return False
+
+@socketio.on('terminal:run')
+def ws_terminal_run(data):
+    if not _ws_authorized(data):
+        return {'success': False, 'output': 'No autenticado o token CSRF inválido (recarga la página).'}
+    data = data or {}
+    sid = request.sid
+    cmd = (data.get('command') or '').strip()
+    term_id = str(data.get('term_session', '1'))
+    cwds = TERMINAL_CWDS.setdefault(sid, dict(session.get('term_cwds', {})))
+    cwds.setdefault(term_id, os.path.expanduser('~'))
+    if not cmd:
+        return {'success': True, 'output': '', 'cwd': cwds[term_id]}
+
+    builtin = _terminal_builtin(cmd, cwds, term_id)
+    if builtin is not None:
+        return builtin
+
+    # Más allá de este volumen se deja de emitir en vivo (el resto se pagina)
+    live_limit = _terminal_conf('live_limit_kb', 1024) * 1024
+    streamed = {'bytes': 0, 'truncated': False}
+
+    def on_output(job, stream, text):
+        if streamed['truncated']:
+            return
+        streamed['bytes'] += len(text)
+        if streamed['bytes'] > live_limit:
+            streamed['truncated'] = True
+            socketio.emit('terminal:truncated', {'job_id': job.id}, to=sid)
+            return
+        socketio.emit('terminal:output', {'job_id': job.id, 'stream': stream, 'data': text}, to=sid)
+
+    def on_done(job):
+        socketio.emit('terminal:done', dict(job.info(), truncated=streamed['truncated']), to=sid)
+
+    job, error = sys_admin.run_command_stream(cmd, cwd=cwds[term_id], owner=sid, on_output=on_output, on_done=on_done)
+    if job is None:
+        return {'success': False, 'output': error, 'cwd': cwds[term_id]}
+    return {'success': True, 'job_id': job.id, 'cwd': cwds[term_id]}
+
+@socketio.on('terminal:cancel')
+def ws_terminal_cancel(data):
+    if not _ws_authorized(data):
+        return {'success': False}
+    return {'success': get_runner().cancel((data or {}).get('job_id'), owner=request.sid)}
+
+@socketio.on('terminal:complete')
+def ws_terminal_complete(data):
+    """Autocompletado (Tab) con el mismo cwd que terminal:run (un 'cd' cambia TERMINAL_CWDS, no la sesión)."""
+    if not _ws_authorized(data):
+        return {'matches': [], 'partial': ''}
+    cwds = TERMINAL_CWDS.setdefault(request.sid, dict(session.get('term_cwds', {})))
+    cwd = cwds.get(str(data.get('term_session', '1')), os.path.expanduser('~'))
+    return _terminal_completions(data.get('command', ''), cwd)
+
+@socketio.on('disconnect')
+def ws_terminal_disconnect():
+    # Sin el socket nadie podría cancelarlos (cancel exige el mismo sid): se cancelan para no dejar
+    # huérfanos ocupando los huecos de max_jobs. La salida de lo ya terminado sigue paginable.
+    get_runner().cancel_owner(request.sid)
+    TERMINAL_CWDS.pop(request.sid, None)
+
+@app.route('/api/terminal/output/<job_id>')
+@login_required
+def api_terminal_output(job_id):
+    """Página de la salida completa de un comando (offset/limit en bytes)."""
+    page_size = _terminal_conf('page_size_kb', 64) * 1024
+    offset = request.args.get('offset', 0, type=int)
+    limit = min(request.args.get('limit', page_size, type=int), 1024 * 1024)
+    page = get_runner().read(job_id, offset, limit)
+    if page is None:
+        return jsonify({'success': False, 'message': 'Comando no encontrado o expirado.'}), 404
+    return jsonify(dict(page, success=True))
+
 @app.route('/api/terminal/complete', methods=['POST'])
 @login_required
 def api_terminal_complete():
@@ -670,12 +875,15 @@ def api_terminal_complete():
         current_cwd = os.path.expanduser('~')
     else:
         current_cwd = session['term_cwds'][term_id]
-    
+    return jsonify(_terminal_completions(full_command, current_cwd))
+
+def _terminal_completions(full_command, current_cwd):
+    """{'matches', 'partial'} para completar la última palabra de full_command en current_cwd."""
     # Extraer la última palabra (token) que es lo que se está completando
     # Ejemplo: "ls Doc" -> "Doc"
     # Ejemplo: "cd /etc/sys" -> "/etc/sys"
     if not full_command:
-        return jsonify({'matches': []})
+        return {'matches': [], 'partial': ''}
         
     tokens = full_command.split()
     if full_command.endswith(' '):
@@ -685,7 +893,7 @@ def api_terminal_complete():
         partial = tokens[-1]
         
     matches = sys_admin.get_file_completions(partial, current_cwd)
-    return jsonify({'matches': matches, 'partial': partial})
+    return {'matches': matches, 'partial': partial}
 
 @app.route('/api/actions', methods=['POST'])
 @login_required
@@ -935,26 +1143,19 @@ def api_nlu_train_alias():
 @login_required
 def api_health_status():
     """Devuelve el estado del sistema de autocuración y últimos incidentes."""
-    history_path = 'data/health_history.json'
     recent_incidents = 0
     last_event = "System Normal"
     status = "Active"
-    
-    if os.path.exists(history_path):
-        try:
-            with open(history_path, 'r') as f:
-                data = json.load(f)
-                # Filter last 24h
-                now = time.time()
-                recent = [i for i in data if now - i['timestamp'] < 86400]
-                recent_incidents = len(recent)
-                
-                if data:
-                    last = data[-1]
-                    last_event = f"{last['event']} on {last['target']}"
-        except:
-             pass
-             
+
+    try:
+        store = get_store()
+        recent_incidents = store.count_events(since=time.time() - 86400)
+        last = store.events(source='health', limit=1)
+        if last:
+            last_event = f"{last[0]['event']} on {last[0]['target']}"
+    except Exception:
+        pass
+
     return jsonify({
         'status': status,
         'recent_incidents': recent_incidents,
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Message bus benchmark: round-trip latency and one-way throughput.
+
+  python resources/tools/bench_bus.py --transport ipc
+  python resources/tools/bench_bus.py --transport socketio --host localhost --port 8181
+  python resources/tools/bench_bus.py --transport both --payloads 64,4096,32000
+
+The IPC run starts an in-process stand-in broker on a temporary socket unless
+--socket points at a running one. The Socket.IO run needs modules/message_bus.py up.
+"""
+import os
+import sys
+import time
+import json
+import argparse
+import tempfile
+import threading
+
+# Add root to path
+if os.path.exists('modules'):
+    sys.path.append(os.getcwd())
+else:
+    sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+from modules.bus_client import BusClient
+from modules.ipc_bus import IPCBroker, MSGPACK_AVAILABLE
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+
+def make_clients(transport, args):
+    kwargs = {'transport': transport}
+    if transport == 'ipc':
+        kwargs['socket_path'] = args.socket
+    else:
+        kwargs.update(host=args.host, port=args.port)
+    return BusClient(name="BenchProducer", **kwargs), BusClient(name="BenchConsumer", **kwargs)
+
+
+def run_latency(producer, consumer, payload, count):
+    pong = threading.Event()
+    consumer.on('bench.ping', lambda msg: consumer.emit('bench.pong', msg.get('data')))
+    producer.on('bench.pong', lambda msg: pong.set())
+    time.sleep(0.3) # let subscriptions reach the broker
+
+    samples = []
+    for i in range(count):
+        pong.clear()
+        start = time.perf_counter()
+        producer.emit('bench.ping', {'seq': i, 'blob': payload})
+        if not pong.wait(5):
+            print(f"  timeout waiting for pong #{i}")
+            break
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def run_throughput(producer, consumer, payload, count):
+    done = threading.Event()
+    received = [0]
+
+    def on_flood(msg):
+        received[0] += 1
+        if received[0] >= count:
+            done.set()
+
+    consumer.on('bench.flood', on_flood)
+    time.sleep(0.3)
+
+    start = time.perf_counter()
+    for i in range(count):
+        producer.emit('bench.flood', {'seq': i, 'blob': payload})
+    done.wait(60)
+    elapsed = time.perf_counter() - start
+    return received[0], elapsed
+
+
+def bench_transport(transport, args):
+    broker = None
+    if transport == 'ipc' and not args.socket:
+        args.socket = os.path.join(tempfile.mkdtemp(), "bench_bus.sock")
+        broker = IPCBroker(args.socket)
+        broker.start()
+
+    producer, consumer = make_clients(transport, args)
+    for client in (consumer, producer):
+        threading.Thread(target=client.run_forever, daemon=True).start()
+    deadline = time.time() + 10
+    while not (producer.connected and consumer.connected) and time.time() < deadline:
+        time.sleep(0.05)
+    if not (producer.connected and consumer.connected):
+        print(f"[{transport}] could not connect to the bus")
+        return []
+
+    results = []
+    for size in args.payloads:
+        payload = os.urandom(size)
+        lat = run_latency(producer, consumer, payload, args.pings)
+        received, elapsed = run_throughput(producer, consumer, payload, args.messages)
+        row = {
+            'transport': transport,
+            'payload': size,
+            'rtt_p50_ms': round(percentile(lat, 0.5), 3) if lat else None,
+            'rtt_p95_ms': round(percentile(lat, 0.95), 3) if lat else None,
+            'msgs_per_s': round(received / elapsed, 1) if elapsed else 0,
+            'mb_per_s': round(received * size / elapsed / 1e6, 2) if elapsed else 0,
+            'lost': args.messages - received
+        }
+        results.append(row)
+        print(f"[{transport:8}] {size:>7} B  rtt p50 {row['rtt_p50_ms']} ms  p95 {row['rtt_p95_ms']} ms  "
+              f"{row['msgs_per_s']} msg/s  {row['mb_per_s']} MB/s  lost {row['lost']}")
+
+    producer.close()
+    consumer.close()
+    if broker:
+        broker.stop()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Neo message bus transports")
+    parser.add_argument('--transport', choices=['ipc', 'socketio', 'both'], default='ipc')
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=8181)
+    parser.add_argument('--socket', default=None, help="IPC socket of a running broker")
+    parser.add_argument('--payloads', default='64,4096,32000', help="comma separated payload sizes in bytes")
+    parser.add_argument('--messages', type=int, default=2000)
+    parser.add_argument('--pings', type=int, default=200)
+    parser.add_argument('--json', help="write results to this file")
+    args = parser.parse_args()
+    args.payloads = [int(p) for p in args.payloads.split(',')]
+
+    print(f"msgpack: {'yes' if MSGPACK_AVAILABLE else 'no (JSON fallback)'}")
+    transports = ['ipc', 'socketio'] if args.transport == 'both' else [args.transport]
+    results = []
+    for transport in transports:
+        results.extend(bench_transport(transport, args))
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
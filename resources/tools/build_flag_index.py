@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Pre-indexes the flags of the common admin tools into data/flag_index.json,
+so validating Mango commands never has to run `<tool> --help` at runtime.
+
+  python resources/tools/build_flag_index.py              # common toolset
+  python resources/tools/build_flag_index.py nmap rsync   # extra tools
+  python resources/tools/build_flag_index.py --check "ls -lah /tmp"
+"""
+import os
+import sys
+import time
+import argparse
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../'))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from modules.flag_index import FlagIndex, COMMON_TOOLS
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the command flag index")
+    parser.add_argument('tools', nargs='*', help="extra tools to index")
+    parser.add_argument('--check', help="validate a command against the index and exit")
+    args = parser.parse_args()
+
+    index = FlagIndex()
+    if args.check:
+        start = time.perf_counter()
+        ok, message = index.validate(args.check)
+        print(f"{'OK' if ok else 'INVALID'} ({(time.perf_counter() - start) * 1000:.1f} ms){': ' + message if message else ''}")
+        return
+
+    start = time.perf_counter()
+    summary = index.build(COMMON_TOOLS + args.tools)
+    for tool, count in sorted(summary.items()):
+        print(f"  {tool:<24} {count:>4} flags")
+    print(f"Indexed {len(summary)} entries in {time.perf_counter() - start:.1f}s -> {index.path}")
+
+
+if __name__ == "__main__":
+    main()
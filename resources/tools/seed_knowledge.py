@@ -71,6 +71,12 @@ relations = [
     ("disco lleno", "ncdu", "ejecutar"),
     ("fallo ssh", "service ssh status", "revisar"),
     ("fallo ssh", "firewall", "revisar"),
+
+    # --- Dependencias de diagnóstico (Sherlock) ---
+    ("internet", "router", "needs"),
+    ("dns", "internet", "needs"),
+    ("nginx", "disk", "needs"),
+    ("docker", "disk", "needs"),
     
     # --- Componentes ---
     ("nginx", "servidor web", "es_un"),
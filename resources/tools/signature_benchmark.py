@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Guard signature matching benchmark: replays a synthetic auth.log through the
+old per-signature substring loop and through the compiled SignatureMatcher,
+with a growing number of signatures.
+
+  python resources/tools/signature_benchmark.py                  # 200k lines, 4..1000 signatures
+  python resources/tools/signature_benchmark.py --lines 1000000 --signatures 4,100
+  python resources/tools/signature_benchmark.py --log /var/log/auth.log   # replay a real file
+  python resources/tools/signature_benchmark.py --write-log /tmp/auth.log # keep the synthetic log
+
+Besides lines/s it reports the alerts raised with per-IP windows, so one
+noisy attacker and a distributed attack show up as different alerts.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../'))
+sys.path.insert(0, ROOT)
+
+from modules.signature_matcher import SignatureMatcher, WindowCounter, AHOCORASICK_AVAILABLE
+
+USERS = ['root', 'admin', 'pi', 'ubuntu', 'test', 'oracle', 'git', 'postgres']
+BENIGN = [
+    "CRON[{pid}]: pam_unix(cron:session): session opened for user root(uid=0) by (uid=0)",
+    "CRON[{pid}]: pam_unix(cron:session): session closed for user root",
+    "sshd[{pid}]: Accepted publickey for pi from 192.168.1.{n} port {port} ssh2: ED25519 SHA256:abc",
+    "sshd[{pid}]: pam_unix(sshd:session): session opened for user pi(uid=1000) by (uid=0)",
+    "systemd-logind[{pid}]: New session {n} of user pi.",
+    "sudo:       pi : TTY=pts/0 ; PWD=/home/pi ; USER=root ; COMMAND=/usr/bin/apt update",
+]
+ATTACK = "sshd[{pid}]: Failed password for {invalid}{user} from {ip} port {port} ssh2"
+SUDO_FAIL = "sudo: pam_unix(sudo:auth): authentication failure; logname=pi uid=1000 euid=0 tty=/dev/pts/0 ruser=pi rhost=  user=pi"
+
+
+def synthetic_log(lines, attack_ratio=0.05, seed=42):
+    """auth.log-like lines: mostly benign, one noisy attacker plus a botnet of many IPs."""
+    rnd = random.Random(seed)
+    botnet = [f"203.0.{rnd.randint(0, 255)}.{rnd.randint(1, 254)}" for _ in range(500)]
+    noisy = "198.51.100.7"
+    out = []
+    for i in range(lines):
+        stamp = f"Jan {1 + i // 86400 % 28:2d} {i // 3600 % 24:02d}:{i // 60 % 60:02d}:{i % 60:02d} host "
+        r = rnd.random()
+        fields = {'pid': rnd.randint(100, 65000), 'n': rnd.randint(1, 254), 'port': rnd.randint(1024, 65535)}
+        if r < attack_ratio:
+            ip = noisy if rnd.random() < 0.5 else rnd.choice(botnet)
+            user = rnd.choice(USERS)
+            out.append(stamp + ATTACK.format(invalid='invalid user ' if user != 'root' else '', user=user, ip=ip, **fields))
+        elif r < attack_ratio * 1.1:
+            out.append(stamp + SUDO_FAIL)
+        else:
+            out.append(stamp + rnd.choice(BENIGN).format(**fields))
+    return out
+
+
+def signature_set(count):
+    """The shipped signatures plus synthetic literal ones up to `count`."""
+    with open(os.path.join(ROOT, 'data/attack_signatures.json')) as f:
+        base = [s for s in json.load(f) if s.get('pattern') or s.get('regex')]
+    rnd = random.Random(7)
+    extra = [{
+        'id': f'synthetic_{i}', 'name': f'Synthetic {i}', 'source': 'log_auth',
+        'pattern': f"{rnd.choice(['kernel', 'sshd', 'su', 'polkitd'])}: event-{i:05d} {rnd.choice(['denied', 'refused', 'blocked'])}",
+        'window_seconds': 60, 'threshold': 3
+    } for i in range(max(0, count - len(base)))]
+    return base + extra
+
+
+def naive(lines, signatures):
+    """Previous Guard behaviour: every signature for every line."""
+    hits = 0
+    for line in lines:
+        for sig in signatures:
+            pattern = sig.get('pattern')
+            if pattern and pattern in line:
+                hits += 1
+    return hits
+
+
+def compiled(lines, matcher):
+    hits = 0
+    for line in lines:
+        hits += len(matcher.match(line))
+    return hits
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def alerts(lines, matcher):
+    """Replay with per-key windows, one simulated second per 100 lines."""
+    windows = WindowCounter()
+    summary = {}
+    for i, line in enumerate(lines):
+        for sig, key, _ in matcher.match(line):
+            alert = windows.hit(sig, key, timestamp=i / 100)
+            if alert:
+                label = f"{sig['id']}:{alert['kind']}"
+                entry = summary.setdefault(label, {'count': 0, 'keys': set(), 'max_spread': 0})
+                entry['count'] += 1
+                if alert['kind'] == 'distinct':
+                    entry['max_spread'] = max(entry['max_spread'], alert['keys'])
+                elif alert.get('key'):
+                    entry['keys'].add(alert['key'])
+    return {label: {'alerts': e['count'], 'distinct_keys': len(e['keys']) or e['max_spread']} for label, e in summary.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Guard log signature matching")
+    parser.add_argument('--lines', type=int, default=200000, help="synthetic lines to generate")
+    parser.add_argument('--signatures', default='4,50,200,1000', help="signature counts to test")
+    parser.add_argument('--log', help="replay this file instead of a synthetic log")
+    parser.add_argument('--write-log', help="save the synthetic log to this path")
+    args = parser.parse_args()
+
+    if args.log:
+        with open(args.log, errors='replace') as f:
+            lines = f.read().splitlines()
+    else:
+        lines = synthetic_log(args.lines)
+        if args.write_log:
+            with open(args.write_log, 'w') as f:
+                f.write('\n'.join(lines) + '\n')
+    print(f"{len(lines)} lines, pyahocorasick {'available' if AHOCORASICK_AVAILABLE else 'NOT installed (substring checks, trie regex above PLAIN_LITERALS_MAX)'}\n")
+
+    engines = [('no-ac', False)] + ([('aho-corasick', True)] if AHOCORASICK_AVAILABLE else [])
+    header = f"{'SIGNATURES':>10}  {'naive l/s':>12}" + ''.join(f"  {name + ' l/s':>18}" for name, _ in engines)
+    print(header)
+    for count in [int(c) for c in args.signatures.split(',')]:
+        signatures = signature_set(count)
+        expected, naive_s = timed(naive, lines, signatures)
+        row = f"{len(signatures):>10}  {len(lines) / naive_s:>12,.0f}"
+        for _, use_ac in engines:
+            matcher = SignatureMatcher(signatures, use_ahocorasick=use_ac)
+            hits, elapsed = timed(compiled, lines, matcher)
+            flag = '' if hits == expected else ' !'
+            row += f"  {len(lines) / elapsed:>16,.0f}{flag:2}"
+        print(row)
+
+    print("\nAlerts with per-key windows (shipped signatures):")
+    matcher = SignatureMatcher(signature_set(0))
+    for label, entry in sorted(alerts(lines, matcher).items()):
+        print(f"  {label:<32} {entry['alerts']:>6} alerts  {entry['distinct_keys']:>4} distinct keys")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+Startup benchmark: import cost, manager construction time and peak RSS.
+
+  python resources/tools/startup_benchmark.py                      # entrypoints + managers
+  python resources/tools/startup_benchmark.py --output logs/startup_bench.json
+  python resources/tools/startup_benchmark.py --compare old.json --threshold 15
+  python resources/tools/startup_benchmark.py --only stt_service,mango --repeat 3
+
+Every measurement runs in a fresh interpreter started with `-X importtime`, so
+results don't share the module cache. Import times are aggregated per
+top-level package (self time) and the heaviest modules are listed by
+cumulative time. With --compare the run is diffed against a previous report
+and the exit code is 1 when something regressed past the threshold.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import statistics
+import subprocess
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../'))
+
+RESULT_MARKER = '@@STARTUP_BENCH@@'
+
+# Import-only entrypoints: name -> module
+ENTRYPOINTS = {
+    'neocore': 'NeoCore',
+    'message_bus': 'modules.message_bus',
+    'ipc_bus': 'modules.ipc_bus',
+    'audio_service': 'modules.services.audio_service',
+    'stt_service': 'modules.services.stt_service',
+    'nlu_service': 'modules.services.nlu_service',
+    'skills_service': 'modules.services.skills_service',
+    'tts_service': 'modules.services.tts_service',
+    'web_service': 'modules.services.web_service'
+}
+
+# Managers built in isolation: name -> (module, setup statement, constructor expression)
+MANAGERS = {
+    'speaker': ('modules.speaker', 'import queue', 'Speaker(queue.Queue())'),
+    'ai_engine': ('modules.ai_engine', '', 'AIEngine()'),
+    'mango': ('modules.mango_manager', '', 'MangoManager()'),
+    'knowledge_base': ('modules.knowledge_base', '', 'KnowledgeBase()'),
+    'chat': ('modules.chat', '', 'ChatManager(None)'),
+    'intent_manager': ('modules.intent_manager', 'from modules.config_manager import ConfigManager', 'IntentManager(ConfigManager())'),
+    'brain': ('modules.brain', '', 'Brain()'),
+    'health_manager': ('modules.health_manager', 'from modules.config_manager import ConfigManager', 'HealthManager(ConfigManager())'),
+    'sysadmin': ('modules.sysadmin', '', 'SysAdminManager()'),
+    'ssh_manager': ('modules.ssh_manager', '', 'SSHManager()'),
+    'cast_discovery': ('modules.cast_manager', '', 'CastManager().start_discovery()')
+}
+
+# Service constructors (load models, create the bus client; the bus is not needed)
+SERVICES = {
+    'audio_service:init': ('modules.services.audio_service', '', 'AudioService()'),
+    'stt_service:init': ('modules.services.stt_service', '', 'STTService()'),
+    'nlu_service:init': ('modules.services.nlu_service', '', 'NLUService()'),
+    'skills_service:init': ('modules.services.skills_service', '', 'SkillsService()'),
+    'tts_service:init': ('modules.services.tts_service', '', 'TTSService()')
+}
+
+# Runs inside the measured interpreter
+PROBE = r'''
+import os, sys, json, time, resource, importlib
+sys.path.insert(0, os.getcwd())
+target, setup, expr = sys.argv[1], sys.argv[2], sys.argv[3]
+
+def vm(field):
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+result = {}
+start = time.perf_counter()
+try:
+    module = importlib.import_module(target)
+    result['import_s'] = time.perf_counter() - start
+    result['rss_after_import_kb'] = vm('VmRSS')
+    if expr:
+        namespace = dict(vars(module))
+        exec(setup, namespace)
+        start = time.perf_counter()
+        eval(expr, namespace)
+        result['construct_s'] = time.perf_counter() - start
+except BaseException as e:
+    result['error'] = f"{type(e).__name__}: {e}"
+result['peak_rss_kb'] = vm('VmHWM') or resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+sys.stdout.write('\n' + MARKER + json.dumps(result) + '\n')
+sys.stdout.flush()
+os._exit(0) # skip daemon threads and atexit hooks of the managers
+'''.replace('MARKER', repr(RESULT_MARKER))
+
+
+def parse_importtime(stderr):
+    """Parse `-X importtime` output into {module: (self_us, cumulative_us)}."""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        try:
+            _, self_us, cumulative_us, name = [p.strip() for p in line.replace('import time:', '|', 1).split('|')]
+            modules[name] = (int(self_us), int(cumulative_us))
+        except ValueError:
+            continue
+    return modules
+
+
+def run_probe(module, setup='', expr='', timeout=600):
+    cmd = [sys.executable, '-X', 'importtime', '-c', PROBE, module, setup, expr]
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE='1')
+    try:
+        proc = subprocess.run(cmd, cwd=ROOT, capture_output=True, text=True, timeout=timeout, env=env)
+    except subprocess.TimeoutExpired:
+        return {'error': f'timeout after {timeout}s'}, {}
+
+    result = {'error': f'no result (exit code {proc.returncode})'}
+    for line in proc.stdout.splitlines():
+        if line.startswith(RESULT_MARKER):
+            result = json.loads(line[len(RESULT_MARKER):])
+    return result, parse_importtime(proc.stderr)
+
+
+def measure(module, setup, expr, repeat, top):
+    runs, imports = [], []
+    for _ in range(repeat):
+        result, modules = run_probe(module, setup, expr)
+        runs.append(result)
+        imports.append(modules)
+
+    entry = {}
+    errors = [r['error'] for r in runs if 'error' in r]
+    if errors:
+        entry['error'] = errors[0]
+    for key in ('import_s', 'construct_s'):
+        values = [r[key] for r in runs if key in r]
+        if values:
+            entry[key] = round(statistics.median(values), 4)
+    for key in ('peak_rss_kb', 'rss_after_import_kb'):
+        values = [r[key] for r in runs if r.get(key)]
+        if values:
+            entry[key.replace('_kb', '_mb')] = round(max(values) / 1024, 1)
+
+    # Average the importtime numbers over the runs
+    merged = {}
+    for modules in imports:
+        for name, (self_us, cumulative_us) in modules.items():
+            acc = merged.setdefault(name, [0, 0, 0])
+            acc[0] += self_us
+            acc[1] += cumulative_us
+            acc[2] += 1
+    averaged = {name: (s / n, c / n) for name, (s, c, n) in merged.items()}
+
+    packages = {}
+    for name, (self_us, _) in averaged.items():
+        package = name.split('.')[0]
+        packages[package] = packages.get(package, 0) + self_us
+    entry['modules_imported'] = len(averaged)
+    entry['packages_ms'] = {p: round(us / 1000, 1) for p, us in sorted(packages.items(), key=lambda kv: -kv[1])[:top]}
+    entry['top_modules_ms'] = [
+        [name, round(c / 1000, 1), round(s / 1000, 1)]
+        for name, (s, c) in sorted(averaged.items(), key=lambda kv: -kv[1][1])[:top]
+    ]
+    return entry
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return None
+
+
+def print_entry(name, entry):
+    if 'error' in entry and 'import_s' not in entry:
+        print(f"  {name:<22} ERROR {entry['error']}")
+        return
+    construct = f"{entry['construct_s']:.2f}s" if 'construct_s' in entry else '-'
+    heaviest = ', '.join(f"{p} {ms:.0f}ms" for p, ms in list(entry['packages_ms'].items())[:3])
+    print(f"  {name:<22} import {entry.get('import_s', 0):6.2f}s  init {construct:>7}  "
+          f"peak {entry.get('peak_rss_mb', 0):7.1f} MB  [{heaviest}]")
+    if 'error' in entry:
+        print(f"  {'':<22} error: {entry['error']}")
+
+
+def compare(report, baseline, threshold):
+    """Print deltas against a previous report. Returns the list of regressions."""
+    regressions = []
+    print(f"\nComparison with {baseline.get('meta', {}).get('git_revision') or 'baseline'} (threshold {threshold}%):")
+    for section in ('entrypoints', 'managers', 'services'):
+        for name, entry in report.get(section, {}).items():
+            old = baseline.get(section, {}).get(name)
+            if not old:
+                continue
+            for key in ('import_s', 'construct_s', 'peak_rss_mb'):
+                if key not in entry or key not in old or not old[key]:
+                    continue
+                delta = (entry[key] - old[key]) / old[key] * 100
+                flag = ''
+                if delta > threshold:
+                    flag = '  <-- REGRESSION'
+                    regressions.append((section, name, key, delta))
+                if abs(delta) >= 1:
+                    print(f"  {section}/{name:<22} {key:<12} {old[key]:>9} -> {entry[key]:<9} ({delta:+.1f}%){flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure Neo startup: imports, construction time and memory")
+    parser.add_argument('--output', default='logs/startup_benchmark.json', help="JSON report path")
+    parser.add_argument('--compare', help="previous report to diff against")
+    parser.add_argument('--threshold', type=float, default=10.0, help="regression threshold in percent")
+    parser.add_argument('--repeat', type=int, default=1, help="runs per target (median time, max RSS)")
+    parser.add_argument('--top', type=int, default=15, help="packages/modules listed per target")
+    parser.add_argument('--only', help="comma separated target names")
+    parser.add_argument('--skip-managers', action='store_true', help="only measure entrypoint imports")
+    parser.add_argument('--services', action='store_true', help="also construct each service class (loads models)")
+    args = parser.parse_args()
+
+    only = set(args.only.split(',')) if args.only else None
+    sections = {'entrypoints': {name: (module, '', '') for name, module in ENTRYPOINTS.items()}}
+    if not args.skip_managers:
+        sections['managers'] = MANAGERS
+    if args.services:
+        sections['services'] = SERVICES
+
+    report = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'git_revision': git_revision(),
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'cpus': os.cpu_count(),
+            'repeat': args.repeat
+        }
+    }
+    for section, targets in sections.items():
+        print(f"\n{section.upper()}")
+        report[section] = {}
+        for name, (module, setup, expr) in targets.items():
+            if only and name not in only:
+                continue
+            entry = measure(module, setup, expr, args.repeat, args.top)
+            report[section][name] = entry
+            print_entry(name, entry)
+
+    output = os.path.join(ROOT, args.output) if not os.path.isabs(args.output) else args.output
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nReport written to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) above {args.threshold}%")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+import sys
+import os
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+from modules.signature_matcher import SignatureMatcher
+
+SSH_FAIL = "sshd[811]: Failed password for root from 203.0.113.7 port 52144 ssh2"
+SSH_INVALID = "sshd[812]: Invalid user oracle from 198.51.100.23 port 40022"
+
+
+def check(label, ok):
+    print(f"{'PASS' if ok else 'FAIL'}: {label}")
+    return ok
+
+
+def test_shared_group_names():
+    print("--- Testing regex signatures that share a group name ---")
+    signatures = [
+        {'id': 'ssh_fail', 'regex': r'Failed password for \S+ from (?P<ip>[0-9.]+)', 'key': 'ip'},
+        {'id': 'ssh_invalid', 'regex': r'Invalid user (?P<user>\S+) from (?P<ip>[0-9.]+)', 'key': 'ip'},
+        {'id': 'sudo', 'pattern': 'sudo: pam_unix'}
+    ]
+    try:
+        matcher = SignatureMatcher(signatures)
+    except Exception as e:
+        return check(f"matcher built ({e})", False)
+
+    ok = check("matcher built", matcher.prefilter is not None)
+    hits = matcher.match(SSH_FAIL)
+    ok &= check("first signature keyed by its ip", [(s['id'], k) for s, k, _ in hits] == [('ssh_fail', '203.0.113.7')])
+    hits = matcher.match(SSH_INVALID)
+    ok &= check("second signature keeps both fields",
+                [(s['id'], k, f) for s, k, f in hits] ==
+                [('ssh_invalid', '198.51.100.23', {'user': 'oracle', 'ip': '198.51.100.23'})])
+    ok &= check("unrelated line ignored", matcher.match("kernel: eth0 link up") == [])
+    return ok
+
+
+def test_uncombinable_regex():
+    print("\n--- Testing regexes left out of the prefilter ---")
+    signatures = [
+        {'id': 'repeat', 'regex': r'(?P<word>\w+) (?P=word) again'},
+        {'id': 'flags', 'regex': r'(?i)segfault at'},
+        {'id': 'ssh_fail', 'regex': r'Failed password for \S+ from (?P<ip>[0-9.]+)', 'key': 'ip'}
+    ]
+    matcher = SignatureMatcher(signatures)
+    ok = check("backreference matched", [s['id'] for s, _, _ in matcher.match("error error again")] == ['repeat'])
+    ok &= check("global flag matched", [s['id'] for s, _, _ in matcher.match("app[1]: SEGFAULT AT 0x0")] == ['flags'])
+    ok &= check("prefiltered regex still matched", [s['id'] for s, _, _ in matcher.match(SSH_FAIL)] == ['ssh_fail'])
+    return ok
+
+
+if __name__ == "__main__":
+    results = [test_shared_group_names(), test_uncombinable_regex()]
+    sys.exit(0 if all(results) else 1)
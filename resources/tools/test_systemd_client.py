@@ -0,0 +1,73 @@
+import sys
+import os
+import stat
+import tempfile
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+from modules.systemd_client import SystemdClient, parse_show, unit_name
+
+# Fake systemctl: answers `show` like Debian with MariaDB (mysql is an alias of mariadb.service)
+FAKE_SYSTEMCTL = """#!/bin/sh
+shift 4 # show --no-pager -p <properties>
+first=1
+for unit in "$@"; do
+    [ $first -eq 1 ] || echo
+    first=0
+    case "$unit" in
+        mysql.service|mariadb.service) printf 'Id=mariadb.service\\nLoadState=loaded\\nActiveState=active\\nSubState=running\\n' ;;
+        sshd.service) printf 'Id=ssh.service\\nLoadState=loaded\\nActiveState=active\\nSubState=running\\n' ;;
+        php8.2-fpm.service) printf 'Id=php8.2-fpm.service\\nLoadState=loaded\\nActiveState=failed\\nSubState=failed\\n' ;;
+        *) printf 'Id=%s\\nLoadState=not-found\\nActiveState=inactive\\nSubState=dead\\n' "$unit" ;;
+    esac
+done
+"""
+
+
+def check(label, ok):
+    print(f"{'PASS' if ok else 'FAIL'}: {label}")
+    return ok
+
+
+def test_unit_name():
+    print("--- Testing unit names ---")
+    ok = check("plain name", unit_name('nginx') == 'nginx.service')
+    ok &= check("name with dots", unit_name('php8.2-fpm') == 'php8.2-fpm.service')
+    ok &= check("explicit suffix kept", unit_name('docker.socket') == 'docker.socket')
+    return ok
+
+
+def test_parse_show():
+    print("\n--- Testing parse_show ---")
+    output = ("Id=mariadb.service\nLoadState=loaded\nActiveState=active\nSubState=running\n\n"
+              "Id=foo.service\nLoadState=not-found\nActiveState=inactive\nSubState=dead\n")
+    entries = parse_show(output)
+    return check("blocks in argument order", entries == [
+        ('mariadb.service', {'load': 'loaded', 'active': 'active', 'sub': 'running'}),
+        ('foo.service', {'load': 'not-found', 'active': 'inactive', 'sub': 'dead'})
+    ])
+
+
+def test_aliases():
+    print("\n--- Testing aliases through a fake systemctl ---")
+    with tempfile.TemporaryDirectory() as tmp:
+        fake = os.path.join(tmp, 'systemctl')
+        with open(fake, 'w') as f:
+            f.write(FAKE_SYSTEMCTL)
+        os.chmod(fake, os.stat(fake).st_mode | stat.S_IEXEC)
+
+        client = SystemdClient(systemctl=fake, use_dbus=False)
+        states = client.get_states(['mysql', 'sshd', 'php8.2-fpm', 'nginx'])
+        print(f"States: {states}")
+        ok = check("mysql alias is active", states['mysql']['active'] == 'active')
+        ok &= check("sshd alias is active", states['sshd']['active'] == 'active')
+        ok &= check("php8.2-fpm resolved", states['php8.2-fpm']['active'] == 'failed')
+        ok &= check("missing unit not-found", states['nginx']['load'] == 'not-found')
+        ok &= check("is_installed through alias", client.is_installed('mysql'))
+    return ok
+
+
+if __name__ == "__main__":
+    results = [test_unit_name(), test_parse_show(), test_aliases()]
+    sys.exit(0 if all(results) else 1)
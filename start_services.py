@@ -1,60 +1,270 @@
 import subprocess
+import threading
+import socket
 import time
 import sys
 import os
 import signal
+import json
 
-# Services to start
+# Services to start: (bus client name, script). The bus itself has no client name.
+BUS_SCRIPT = "modules/message_bus.py"
+IPC_BUS_SCRIPT = "modules/ipc_bus.py"
 SERVICES = [
-    "modules/message_bus.py",
-    "modules/services/audio_service.py",
-    "modules/services/stt_service.py",
-    "modules/services/nlu_service.py",
-    "modules/services/skills_service.py",
-    "modules/services/tts_service.py",
-    "modules/services/web_service.py"
+    ("AudioService", "modules/services/audio_service.py"),
+    ("STTService", "modules/services/stt_service.py"),
+    ("NLUService", "modules/services/nlu_service.py"),
+    ("SkillsService", "modules/services/skills_service.py"),
+    ("TTSService", "modules/services/tts_service.py"),
+    ("WebService", "modules/services/web_service.py")
 ]
 
-processes = []
+LOG_DIR = "logs/services"
+REPORT_FILE = "logs/startup_report.json"
+BUS_TIMEOUT = 30
+READY_TIMEOUT = 180
+BACKOFF_START = 1
+BACKOFF_MAX = 60
+STABLE_SECONDS = 60 # Uptime after which the restart backoff is reset
 
-def main():
-    print("Starting TIO AI (OVOS Architecture)...")
-    
-    # Ensure logs directory exists
-    if not os.path.exists("logs"):
-        os.makedirs("logs")
-        
-    # Open log file
-    log_file = open("logs/app.log", "a")
-    
-    # Helper to start service
-    def start_service(script):
-        print(f"Starting {script}...")
-        # Redirect stdout and stderr to log file
-        p = subprocess.Popen([sys.executable, script], stdout=log_file, stderr=log_file, bufsize=0)
-        processes.append(p)
-        return p
-
-    # 1. Start Bus first
-    bus_p = start_service(SERVICES[0])
-    time.sleep(2) # Wait for bus
-    
-    # 2. Start other services
-    for script in SERVICES[1:]:
-        start_service(script)
-        time.sleep(1)
-        
-    print("All services started. Logs are being written to logs/app.log")
-    
+
+def read_rss_mb(pid):
+    """Current and peak RSS (MB) from /proc."""
+    rss, peak = None, None
     try:
-        bus_p.wait()
-    except KeyboardInterrupt:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    rss = int(line.split()[1]) / 1024
+                elif line.startswith("VmHWM:"):
+                    peak = int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return rss, peak
+
+
+class ManagedService:
+    def __init__(self, name, script):
+        self.name = name
+        self.script = script
+        self.proc = None
+        self.log = None
+        self.started_at = None
+        self.connected_at = None
+        self.ready_at = None
+        self.ready_info = {}
+        self.restarts = 0
+        self.backoff = BACKOFF_START
+        self.restart_at = None
+
+    def start(self):
+        os.makedirs(LOG_DIR, exist_ok=True)
+        if self.log is None:
+            self.log = open(os.path.join(LOG_DIR, f"{self.name}.log"), "a", buffering=1)
+        self.log.write(f"\n--- {time.strftime('%Y-%m-%d %H:%M:%S')} starting {self.script} ---\n")
+        env = dict(os.environ, PYTHONUNBUFFERED="1")
+        self.proc = subprocess.Popen([sys.executable, self.script], stdout=self.log, stderr=subprocess.STDOUT, env=env)
+        self.started_at = time.time()
+        self.connected_at = None
+        self.ready_at = None
+        self.restart_at = None
+        print(f"Starting {self.name} ({self.script}) pid {self.proc.pid}")
+
+    @property
+    def running(self):
+        return self.proc is not None and self.proc.poll() is None
+
+    def stop(self, timeout=5):
+        if not self.running:
+            return
+        self.proc.terminate()
+        try:
+            self.proc.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+
+    def report(self):
+        rss, peak = read_rss_mb(self.proc.pid) if self.running else (None, None)
+        return {
+            'script': self.script,
+            'pid': self.proc.pid if self.proc else None,
+            'running': self.running,
+            'connected_s': round(self.connected_at - self.started_at, 2) if self.connected_at else None,
+            'ready_s': round(self.ready_at - self.started_at, 2) if self.ready_at else None,
+            'rss_mb': round(rss, 1) if rss else None,
+            'peak_rss_mb': round(peak, 1) if peak else None,
+            'restarts': self.restarts,
+            'ready_info': self.ready_info
+        }
+
+
+class Supervisor:
+    """
+    Starts the bus, waits until it accepts connections, then starts every
+    service in parallel. Readiness comes from the services themselves
+    ('{name}.connected' and '{name}.ready' on the bus). Crashed processes are
+    restarted with exponential backoff.
+    """
+    def __init__(self):
+        self.bus_config = self._load_bus_config()
+        self.ipc = self.bus_config.get('transport') == 'ipc'
+        self.bus = ManagedService("MessageBus", IPC_BUS_SCRIPT if self.ipc else BUS_SCRIPT)
+        self.services = {name: ManagedService(name, script) for name, script in SERVICES}
+        self.boot_started = None
+        self.reported = False
+        self.running = True
+        self.client = None
+
+    def _load_bus_config(self):
+        try:
+            with open("config/config.json") as f:
+                return json.load(f).get('bus', {})
+        except Exception:
+            return {}
+
+    # --- Bus ---
+
+    def bus_accepting(self):
+        """Readiness probe: the bus accepts connections."""
+        try:
+            if self.ipc:
+                s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                s.connect(self.bus_config.get('socket_path', "/tmp/neo_bus.sock"))
+            else:
+                s = socket.create_connection(("localhost", self.bus_config.get('port', 8181)), timeout=1)
+            s.close()
+            return True
+        except OSError:
+            return False
+
+    def wait_for_bus(self):
+        deadline = time.time() + BUS_TIMEOUT
+        while time.time() < deadline:
+            if self.bus_accepting():
+                self.bus.connected_at = self.bus.ready_at = time.time()
+                print(f"Bus ready in {self.bus.ready_at - self.bus.started_at:.2f}s")
+                return True
+            if not self.bus.running:
+                break
+            time.sleep(0.1)
+        print("Bus did not become ready.")
+        return False
+
+    def connect_observer(self):
+        """Bus client that listens for the services' connected/ready announcements."""
+        sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+        try:
+            from modules.bus_client import BusClient
+        except ImportError as e:
+            print(f"Readiness tracking disabled ({e}). Falling back to process liveness.")
+            return
+        # Same endpoint as the bus probe (bus_accepting)
+        self.client = BusClient(host='localhost', port=self.bus_config.get('port', 8181), name="Supervisor",
+                                socket_path=self.bus_config.get('socket_path'))
+        self.client.on('*.connected', lambda msg: self._on_event(msg, 'connected'))
+        self.client.on('*.ready', lambda msg: self._on_event(msg, 'ready'))
+        threading.Thread(target=self.client.run_forever, daemon=True).start()
+
+    def _on_event(self, message, kind):
+        name = message.get('type', '').rsplit('.', 1)[0]
+        service = self.services.get(name)
+        if not service or not service.running:
+            return
+        now = time.time()
+        if kind == 'connected' and not service.connected_at:
+            service.connected_at = now
+        elif kind == 'ready':
+            service.connected_at = service.connected_at or now
+            if not service.ready_at:
+                service.ready_at = now
+                service.ready_info = message.get('data', {})
+                print(f"{name} ready in {now - service.started_at:.2f}s")
+
+    # --- Lifecycle ---
+
+    def start(self):
+        print("Starting TIO AI (OVOS Architecture)...")
+        self.boot_started = time.time()
+        self.bus.start()
+        if not self.wait_for_bus():
+            print(f"Check {LOG_DIR}/MessageBus.log")
+        self.connect_observer()
+
+        # Independent services: start all at once, boot time = slowest model load
+        for service in self.services.values():
+            service.start()
+
+    def supervise(self):
+        while self.running:
+            now = time.time()
+            for service in [self.bus] + list(self.services.values()):
+                self._check(service, now)
+
+            if not self.reported:
+                all_ready = all(s.ready_at for s in self.services.values())
+                if all_ready or now - self.boot_started > READY_TIMEOUT:
+                    self.write_report(all_ready)
+            time.sleep(0.5)
+
+    def _check(self, service, now):
+        if service.running:
+            if service.started_at and now - service.started_at > STABLE_SECONDS:
+                service.backoff = BACKOFF_START
+            return
+
+        if service.restart_at is None:
+            code = service.proc.returncode if service.proc else None
+            service.restart_at = now + service.backoff
+            print(f"{service.name} exited (code {code}). Restarting in {service.backoff}s")
+            service.backoff = min(service.backoff * 2, BACKOFF_MAX)
+        elif now >= service.restart_at:
+            service.restarts += 1
+            service.start()
+            if service is self.bus:
+                self.wait_for_bus()
+
+    def write_report(self, all_ready):
+        self.reported = True
+        total = time.time() - self.boot_started
+        report = {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'boot_seconds': round(total, 2),
+            'all_ready': all_ready,
+            'transport': 'ipc' if self.ipc else 'socketio',
+            'services': {s.name: s.report() for s in [self.bus] + list(self.services.values())}
+        }
+        print(f"\nStartup {'complete' if all_ready else 'TIMED OUT'} in {total:.2f}s")
+        print(f"{'SERVICE':<15}{'READY (s)':>10}{'RSS (MB)':>10}{'RESTARTS':>10}")
+        for name, entry in report['services'].items():
+            print(f"{name:<15}{str(entry['ready_s'] or '-'):>10}{str(entry['rss_mb'] or '-'):>10}{entry['restarts']:>10}")
+        try:
+            with open(REPORT_FILE, 'w') as f:
+                json.dump(report, f, indent=4)
+        except OSError as e:
+            print(f"Could not write {REPORT_FILE}: {e}")
+        print(f"Logs: {LOG_DIR}/<service>.log")
+
+    def shutdown(self, *args):
+        if not self.running:
+            return
+        self.running = False
         print("\nStopping services...")
-        for p in processes:
-            p.terminate()
+        for service in self.services.values():
+            service.stop()
+        self.bus.stop()
         print("Done.")
+
+
+def main():
+    supervisor = Supervisor()
+    signal.signal(signal.SIGTERM, lambda *a: (supervisor.shutdown(), sys.exit(0)))
+    try:
+        supervisor.start()
+        supervisor.supervise()
+    except KeyboardInterrupt:
+        pass
     finally:
-        log_file.close()
+        supervisor.shutdown()
 
 if __name__ == "__main__":
     main()